@@ -5,8 +5,10 @@ from fastapi import WebSocketException, status
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 from passlib.context import CryptContext
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dao import BlockDao, UsersDao
+from app.auth.dto import BlockedDTO, UserDTO, UserTokenDTO
 from app.auth.shemas import STokenInfo, SUserAuth
 from app.core.config import settings
 from app.core.exceptions import (
@@ -124,12 +126,19 @@ def create_refresh_token(user: SUserAuth):
 
 
 # Валидация пользователя из полезной нагрузки токена
-async def validate_user_from_payload(payload: dict, websocket_mode: bool = False):
+async def validate_user_from_payload(
+    payload: dict,
+    websocket_mode: bool = False,
+    session: AsyncSession | None = None,
+    dto: type[UserDTO] | type[UserTokenDTO] = UserDTO,
+):
     """
     Проверяет, существует ли пользователь из полезной нагрузки токена и не заблокирован ли он.
     :param payload: Полезная нагрузка токена
     :param websocket_mode: Режим WebSocket для передачи исключений как WebSocketException
-    :return: Объект пользователя, если пользователь существует и не заблокирован
+    :param session: Сессия текущего запроса, если есть
+    :param dto: DTO, определяющий загружаемые колонки пользователя
+    :return: DTO пользователя, если пользователь существует и не заблокирован
     """
     user_id: str = payload.get("sub")
     if not user_id:
@@ -137,14 +146,16 @@ async def validate_user_from_payload(payload: dict, websocket_mode: bool = False
             raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
         raise UserIsNotPresentException
 
-    user = await UsersDao.find_by_id(user_id)
+    user = await UsersDao.find_one_as(dto, session=session, id=user_id)
     if not user:
         if websocket_mode:
             raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
         raise UserIsNotPresentException
 
     # Проверка, заблокирован ли пользователь
-    block = await BlockDao.find_one_or_none(blocked_user_id=user_id)
+    block = await BlockDao.find_one_as(
+        BlockedDTO, session=session, blocked_user_id=user_id
+    )
     if block:
         if websocket_mode:
             raise WebSocketException(
@@ -176,33 +187,39 @@ def validate_token_type(
 
 
 # Аутентификация пользователя по email и паролю
-async def authentication(email: EmailStr, password: str):
+async def authentication(
+    email: EmailStr, password: str, session: AsyncSession | None = None
+):
     """
     Проверяет существование пользователя по email и корректность пароля.
     :param email: Email пользователя
     :param password: Пароль пользователя
+    :param session: Сессия текущего запроса, если есть
     :return: Объект пользователя, если аутентификация успешна, иначе None
     """
-    user = await UsersDao.find_one_or_none(email=email)
+    user = await UsersDao.find_one_or_none(session=session, email=email)
     if user is None or not verify_password(password, user.hashed_password):
         return None
-    if await BlockDao.find_one_or_none():
+    if await BlockDao.find_one_or_none(session=session, blocked_user_id=user.id):
         raise UserIsBlockedException
     return user
 
 
 # Обновление токенов с использованием refresh токена
-async def refresh(refresh_token: str):
+async def refresh(refresh_token: str, session: AsyncSession | None = None):
     """
     Обновляет access и refresh токены для пользователя.
     :param refresh_token: Текущий refresh токен пользователя
+    :param session: Сессия текущего запроса, если есть
     :return: Новый объект STokenInfo с новыми access и refresh токенами
     """
     try:
         # Расшифровка токена и проверка его валидности
         payload = decode_jwt(refresh_token)
         validate_token_type(payload, REFRESH_TOKEN_TYPE)
-        user = await validate_user_from_payload(payload)
+        user = await validate_user_from_payload(
+            payload, session=session, dto=UserTokenDTO
+        )
 
         # Проверка, что refresh токен совпадает с тем, что хранится в БД
         if user.refresh_token != refresh_token:
@@ -213,7 +230,7 @@ async def refresh(refresh_token: str):
         new_refresh_token = create_refresh_token(user)
 
         # Обновление refresh токена в БД
-        await UsersDao.update_refresh_token(user.id, new_refresh_token)
+        await UsersDao.update_refresh_token(user.id, new_refresh_token, session=session)
 
         return STokenInfo(
             access_token=new_access_token,
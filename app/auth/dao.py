@@ -1,12 +1,23 @@
 from operator import or_
+from typing import List
 
 from pydantic import UUID4, EmailStr
-from sqlalchemy import select
+from sqlalchemy import Integer, String, bindparam, delete, select, update
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.dto import UserShortDTO
 from app.auth.models import Blocked, User
 from app.core.dao import BaseDao
-from app.core.database import async_session_maker
+
+# Шаблон поиска пользователей по части username: строится один раз при импорте,
+# значения передаются именованными параметрами при выполнении
+USERS_BY_USERNAME_QUERY = BaseDao._replica(
+    select(*UserShortDTO.columns(User))
+    .where(User.username.ilike(bindparam("pattern", type_=String)))
+    .limit(bindparam("limit", type_=Integer))
+    .offset(bindparam("offset", type_=Integer))
+)
 
 
 # DAO-класс для работы с пользователями в базе данных
@@ -15,41 +26,47 @@ class UsersDao(BaseDao):
 
     # Метод для обновления refresh-токена пользователя
     @classmethod
-    async def update_refresh_token(cls, user_id: UUID4, token: str):
+    async def update_refresh_token(
+        cls, user_id: UUID4, token: str, session: AsyncSession | None = None
+    ):
         """
         Обновляет refresh-токен для указанного пользователя.
         :param user_id: UUID4 идентификатор пользователя
         :param token: Новый refresh-токен
+        :param session: Сессия текущего запроса, если есть
         """
         try:
-            async with async_session_maker() as session:
-                # Находим пользователя по ID
-                query = select(cls.model).filter_by(id=user_id)
-                result = await session.execute(query)
-                user = result.scalar_one_or_none()
-
-                # Обновляем refresh-токен и сохраняем изменения
-                user.refresh_token = token
-                await session.commit()
+            async with cls._transaction(session) as session:
+                # Обновляем refresh-токен одним UPDATE без предварительного SELECT
+                query = (
+                    update(cls.model)
+                    .where(cls.model.id == user_id)
+                    .values(refresh_token=token)
+                )
+                await session.execute(query)
         except (SQLAlchemyError, Exception) as e:
             # Логируем ошибку, если обновление не удалось
             cls._log_error(
                 e,
                 error_message=f"Cannot update refresh token, model {cls.model.__name__}",
                 extra={"user_id": user_id, "token": token},
+                session=session,
             )
 
     # Метод для поиска пользователя по email или имени пользователя
     @classmethod
-    async def find_by_email_or_username(cls, email: EmailStr, username: str):
+    async def find_by_email_or_username(
+        cls, email: EmailStr, username: str, session: AsyncSession | None = None
+    ):
         """
         Ищет пользователя по email или username.
         :param email: Email пользователя
         :param username: Username пользователя
+        :param session: Сессия текущего запроса, если есть
         :return: Объект пользователя, если найден, иначе None
         """
         try:
-            async with async_session_maker() as session:
+            async with cls._session(session) as session:
                 # Выполняем поиск по email или username
                 query = select(cls.model).where(
                     or_(cls.model.email == email, cls.model.username == username)
@@ -63,25 +80,30 @@ class UsersDao(BaseDao):
                 e,
                 error_message=f"Cannot find by email or username, model {cls.model.__name__}",
                 extra={"email": email, "username": username},
+                session=session,
             )
 
     # Метод для получения пользователей, участвующих в одном чате
     @classmethod
-    async def find_users_for_chat(cls, user_1_id: UUID4, user_2_id: UUID4):
+    async def find_users_for_chat(
+        cls, user_1_id: UUID4, user_2_id: UUID4, session: AsyncSession | None = None
+    ):
         """
         Находит двух пользователей по их ID для чата.
         :param user_1_id: ID первого пользователя
         :param user_2_id: ID второго пользователя
-        :return: Список из найденных пользователей (до двух пользователей)
+        :param session: Сессия текущего запроса, если есть
+        :return: Список DTO найденных пользователей (до двух пользователей)
         """
         try:
-            async with async_session_maker() as session:
-                # Находим пользователей, чьи ID совпадают с указанными
-                query = select(cls.model).where(
+            async with cls._session(session) as session:
+                # Находим пользователей, чьи ID совпадают с указанными,
+                # выбирая только идентификатор и имя
+                query = select(*UserShortDTO.columns(cls.model)).where(
                     or_(cls.model.id == user_1_id, cls.model.id == user_2_id)
                 )
-                result = await session.execute(query)
-                users = result.scalars().all()
+                result = await session.execute(cls._replica(query))
+                users = [UserShortDTO(*row) for row in result]
                 return users
         except (SQLAlchemyError, Exception) as e:
             # Логируем ошибку, если поиск не удался
@@ -89,29 +111,34 @@ class UsersDao(BaseDao):
                 e,
                 error_message=f"Cannot find users for chat, model {cls.model.__name__}",
                 extra={"user_1_id": user_1_id, "user_2_id": user_2_id},
+                session=session,
             )
 
     # Метод для поиска пользователей по username с пагинацией
     @classmethod
-    async def find_by_username(cls, username: str, limit: int, offset: int):
+    async def find_by_username(
+        cls,
+        username: str,
+        limit: int,
+        offset: int,
+        session: AsyncSession | None = None,
+    ):
         """
         Ищет пользователей, чьи username соответствуют шаблону.
         :param username: Часть или полный username для поиска
         :param limit: Ограничение на количество результатов
         :param offset: Смещение для пагинации
-        :return: Список найденных пользователей
+        :param session: Сессия текущего запроса, если есть
+        :return: Список найденных пользователей (UserShortDTO)
         """
         try:
-            async with async_session_maker() as session:
+            async with cls._session(session) as session:
                 # Выполняем поиск пользователей с username, соответствующим шаблону
-                query = (
-                    select(cls.model)
-                    .where(cls.model.username.ilike(f"%{username}%"))
-                    .limit(limit)
-                    .offset(offset)
+                result = await session.execute(
+                    USERS_BY_USERNAME_QUERY,
+                    {"pattern": f"%{username}%", "limit": limit, "offset": offset},
                 )
-                result = await session.execute(query)
-                users = result.scalars().all()
+                users = [UserShortDTO(*row) for row in result]
                 return users
         except (SQLAlchemyError, Exception) as e:
             # Логируем ошибку, если поиск не удался
@@ -119,9 +146,91 @@ class UsersDao(BaseDao):
                 e,
                 error_message=f"Cannot find {cls.model.__name__} by username",
                 extra={"username": username, "limit": limit, "offset": offset},
+                session=session,
+            )
+
+    # Метод для проверки существования пользователей
+    @classmethod
+    async def find_existing_ids(
+        cls, user_ids: List[UUID4], session: AsyncSession | None = None
+    ):
+        """
+        Возвращает ID тех пользователей из списка, которые существуют.
+        :param user_ids: Список ID пользователей
+        :param session: Сессия текущего запроса, если есть
+        :return: Множество найденных ID
+        """
+        try:
+            async with cls._session(session) as session:
+                query = select(cls.model.id).where(cls.model.id.in_(user_ids))
+                result = await session.execute(query)
+                return set(result.scalars())
+        except (SQLAlchemyError, Exception) as e:
+            # Логируем ошибку, если поиск не удался
+            cls._log_error(
+                e,
+                error_message=f"Cannot find existing {cls.model.__name__} ids",
+                extra={"users": len(user_ids)},
+                session=session,
             )
 
 
 # DAO-класс для работы с заблокированными пользователями
 class BlockDao(BaseDao):
     model = Blocked
+
+    # Метод для поиска заблокированных среди указанных пользователей
+    @classmethod
+    async def find_blocked_user_ids(
+        cls, user_ids: List[UUID4], session: AsyncSession | None = None
+    ):
+        """
+        Возвращает ID заблокированных пользователей из списка.
+        :param user_ids: Список ID пользователей
+        :param session: Сессия текущего запроса, если есть
+        :return: Множество ID заблокированных пользователей
+        """
+        try:
+            async with cls._session(session) as session:
+                query = select(cls.model.blocked_user_id).where(
+                    cls.model.blocked_user_id.in_(user_ids)
+                )
+                result = await session.execute(query)
+                return set(result.scalars())
+        except (SQLAlchemyError, Exception) as e:
+            # Логируем ошибку, если поиск не удался
+            cls._log_error(
+                e,
+                error_message=f"Cannot find blocked users, model {cls.model.__name__}",
+                extra={"users": len(user_ids)},
+                session=session,
+            )
+
+    # Метод для снятия блокировки со многих пользователей одним запросом
+    @classmethod
+    async def unblock_many(
+        cls, user_ids: List[UUID4], session: AsyncSession | None = None
+    ):
+        """
+        Удаляет блокировки указанных пользователей одним DELETE.
+        :param user_ids: Список ID пользователей
+        :param session: Сессия текущего запроса, если есть
+        :return: Список ID пользователей, с которых снята блокировка
+        """
+        try:
+            async with cls._transaction(session) as session:
+                query = (
+                    delete(cls.model)
+                    .where(cls.model.blocked_user_id.in_(user_ids))
+                    .returning(cls.model.blocked_user_id)
+                )
+                result = await session.execute(query)
+                return list(result.scalars())
+        except (SQLAlchemyError, Exception) as e:
+            # Логируем ошибку, если удаление не удалось
+            cls._log_error(
+                e,
+                error_message=f"Cannot unblock users, model {cls.model.__name__}",
+                extra={"users": len(user_ids)},
+                session=session,
+            )
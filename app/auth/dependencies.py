@@ -2,6 +2,7 @@ from fastapi import Depends, WebSocket, status
 from fastapi.exceptions import WebSocketException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.auth_utilits import (
     ACCESS_TOKEN_TYPE,
@@ -10,6 +11,8 @@ from app.auth.auth_utilits import (
     validate_user_from_payload,
 )
 from app.auth.models import User
+from app.core.config import settings
+from app.core.database import get_session, session_scope
 from app.core.exceptions import (
     IncorrectTokenFormatException,
     TokenExpiredException,
@@ -43,17 +46,21 @@ def get_current_payload(
 
 
 # Функция для получения текущего пользователя на основе полезной нагрузки JWT
-async def get_current_user(payload: dict = Depends(get_current_payload)):
+async def get_current_user(
+    payload: dict = Depends(get_current_payload),
+    session: AsyncSession = Depends(get_session),
+):
     """
     Возвращает объект пользователя, декодируя и проверяя полезную нагрузку токена.
     :param payload: Полезная нагрузка токена, полученная из get_current_payload.
+    :param session: Сессия текущего запроса.
     :raises NotValidTokenTypeException: Если тип токена не соответствует ожидаемому.
     :return: Объект пользователя.
     """
     # Проверка типа токена (требуется токен доступа)
     validate_token_type(payload, ACCESS_TOKEN_TYPE)
     # Валидация пользователя на основе данных в payload
-    user = await validate_user_from_payload(payload)
+    user = await validate_user_from_payload(payload, session=session)
     return user
 
 
@@ -78,8 +85,11 @@ async def get_current_user_websocket(websocket: WebSocket):
         # Декодирование и проверка токена
         payload = decode_jwt(token=token)
         validate_token_type(payload, ACCESS_TOKEN_TYPE, websocket_mode=True)
-        # Валидация пользователя на основе полезной нагрузки
-        user = await validate_user_from_payload(payload, websocket_mode=True)
+        # Валидация пользователя на основе полезной нагрузки в отдельной единице работы
+        async with session_scope(settings.QUERY_BUDGET_MS) as session:
+            user = await validate_user_from_payload(
+                payload, websocket_mode=True, session=session
+            )
         return user
     except ExpiredSignatureError:
         # Обработка истекшего токена
@@ -0,0 +1,21 @@
+from app.core.dto import BaseDTO
+
+
+class UserDTO(BaseDTO):
+    # Данные пользователя, нужные при каждом аутентифицированном запросе
+    __slots__ = ("id", "username", "is_moderator")
+
+
+class UserTokenDTO(BaseDTO):
+    # Данные пользователя для обновления токенов
+    __slots__ = ("id", "username", "is_moderator", "refresh_token")
+
+
+class UserShortDTO(BaseDTO):
+    # Участник чата: только идентификатор и имя
+    __slots__ = ("id", "username")
+
+
+class BlockedDTO(BaseDTO):
+    # Факт блокировки: достаточно идентификатора записи
+    __slots__ = ("id",)
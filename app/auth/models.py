@@ -38,6 +38,6 @@ class Blocked(Base):
     __tablename__ = "blocked_users"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    blocked_user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    blocked_user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), unique=True)
     reason: Mapped[str] = mapped_column(String(256))
     moderator_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
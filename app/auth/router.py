@@ -1,4 +1,5 @@
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.services import AuthService
 from app.auth.shemas import (
@@ -9,6 +10,7 @@ from app.auth.shemas import (
     SUserRegisterResponse,
 )
 from app.core.config import settings
+from app.core.database import get_session
 from app.core.logger import logger
 
 router = APIRouter(
@@ -48,7 +50,9 @@ router = APIRouter(
         }
     }
 )
-async def register_user(user_data: SUserRegister):
+async def register_user(
+    user_data: SUserRegister, session: AsyncSession = Depends(get_session)
+):
     """
     Регистрация нового пользователя.
 
@@ -58,14 +62,16 @@ async def register_user(user_data: SUserRegister):
 
     Возвращает сообщение об успешной регистрации.
     """
-    return await AuthService.register_user(user_data)
+    return await AuthService.register_user(user_data, session=session)
 
 
 @router.post(
     "/login/",
     response_model=STokenInfo,
 )
-async def jwt_login_user(user_data: SUserAuth):
+async def jwt_login_user(
+    user_data: SUserAuth, session: AsyncSession = Depends(get_session)
+):
     """
     Авторизация пользователя.
 
@@ -76,11 +82,13 @@ async def jwt_login_user(user_data: SUserAuth):
     Возвращает объект с access и refresh токенами.
     """
     logger.info(f"{settings.MODE}", exc_info=True)
-    return await AuthService.jwt_login_user(user_data)
+    return await AuthService.jwt_login_user(user_data, session=session)
 
 
 @router.post("/refresh/", response_model=STokenInfo)
-async def jwt_refresh_token(refresh_token: SRefreshToken):
+async def jwt_refresh_token(
+    refresh_token: SRefreshToken, session: AsyncSession = Depends(get_session)
+):
     """
     Обновление JWT токенов.
 
@@ -90,4 +98,4 @@ async def jwt_refresh_token(refresh_token: SRefreshToken):
 
     Возвращает обновленные access и refresh токены.
     """
-    return await AuthService.jwt_refresh_token(refresh_token)
+    return await AuthService.jwt_refresh_token(refresh_token, session=session)
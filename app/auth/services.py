@@ -1,4 +1,8 @@
+from typing import List
+
 from pydantic import UUID4
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.auth_utilits import (
     authentication,
@@ -9,6 +13,7 @@ from app.auth.auth_utilits import (
 )
 from app.auth.dao import BlockDao, UsersDao
 from app.auth.shemas import SRefreshToken, STokenInfo, SUserAuth, SUserRegister
+from app.chat.websocket import publish_users_blocked
 from app.core.exceptions import (
     IncorrectEmailOrPasswordException,
     PasswordsDoesNotMatchException,
@@ -20,10 +25,13 @@ from app.core.exceptions import (
 
 class AuthService:
     @classmethod
-    async def register_user(cls, user_data: SUserRegister):
+    async def register_user(
+        cls, user_data: SUserRegister, session: AsyncSession | None = None
+    ):
         """
         Регистрирует нового пользователя в системе, проверяя наличие email и username в БД.
         :param user_data: Данные пользователя для регистрации (email, username, password).
+        :param session: Сессия текущего запроса, если есть.
         :raises UserEmailExistsException: Если email уже используется.
         :raises UserUsernameExistsException: Если username уже используется.
         :raises PasswordsDoesNotMatchException: Если пароль и его повторение не совпадают.
@@ -31,7 +39,7 @@ class AuthService:
         """
         # Проверка на наличие пользователя с таким же email или username
         existing_user = await UsersDao.find_by_email_or_username(
-            email=user_data.email, username=user_data.username
+            email=user_data.email, username=user_data.username, session=session
         )
         if existing_user:
             if existing_user.email == user_data.email:
@@ -45,23 +53,34 @@ class AuthService:
 
         # Хеширование пароля и добавление пользователя в БД
         hashed_password = get_password_hash(user_data.password)
-        await UsersDao.add(
-            email=user_data.email,
-            username=user_data.username,
-            hashed_password=hashed_password,
-        )
+        try:
+            await UsersDao.add(
+                session=session,
+                email=user_data.email,
+                username=user_data.username,
+                hashed_password=hashed_password,
+            )
+        except IntegrityError as e:
+            # Пользователь с тем же email или username зарегистрирован параллельно
+            constraint = getattr(e.orig.__cause__, "constraint_name", None) or ""
+            if "email" in constraint:
+                raise UserEmailExistsException
+            raise UserUsernameExistsException
         return {"detail": "The user has been registered successfully."}
 
     @classmethod
-    async def jwt_login_user(cls, user_data: SUserAuth) -> STokenInfo:
+    async def jwt_login_user(
+        cls, user_data: SUserAuth, session: AsyncSession | None = None
+    ) -> STokenInfo:
         """
         Авторизует пользователя и выдает JWT access и refresh токены.
         :param user_data: Данные пользователя для авторизации (email, password).
+        :param session: Сессия текущего запроса, если есть.
         :raises IncorrectEmailOrPasswordException: Если email или пароль неверны.
         :return: Объект с access и refresh токенами.
         """
         # Аутентификация пользователя
-        user = await authentication(user_data.email, user_data.password)
+        user = await authentication(user_data.email, user_data.password, session)
         if user is None:
             raise IncorrectEmailOrPasswordException
 
@@ -70,7 +89,9 @@ class AuthService:
         refresh_token: str = create_refresh_token(user)
 
         # Обновление refresh токена в БД
-        await UsersDao.update_refresh_token(user_id=user.id, token=refresh_token)
+        await UsersDao.update_refresh_token(
+            user_id=user.id, token=refresh_token, session=session
+        )
 
         return STokenInfo(
             access_token=access_token,
@@ -78,28 +99,120 @@ class AuthService:
         )
 
     @classmethod
-    async def jwt_refresh_token(cls, refresh_token_data: SRefreshToken) -> STokenInfo:
+    async def jwt_refresh_token(
+        cls, refresh_token_data: SRefreshToken, session: AsyncSession | None = None
+    ) -> STokenInfo:
         """
         Обновляет access и refresh токены, используя refresh токен.
         :param refresh_token_data: Объект с данными refresh токена.
+        :param session: Сессия текущего запроса, если есть.
         :return: Обновленный объект с access и refresh токенами.
         """
         # Обновление токенов на основе переданного refresh токена
-        result = await refresh(refresh_token=refresh_token_data.refresh_token)
+        result = await refresh(
+            refresh_token=refresh_token_data.refresh_token, session=session
+        )
         return result
 
 
 class BlockService:
     @classmethod
-    async def block_user(cls, user_id: UUID4, moderator_id: UUID4, reason: str):
-        user = await BlockDao.find_one_or_none(blocked_user_id=user_id)
-        if user:
-            raise UserIsAlreadyBlockedException
-        await BlockDao.add(
-            blocked_user_id=user_id, reason=reason, moderator_id=moderator_id
+    async def block_user(
+        cls,
+        user_id: UUID4,
+        moderator_id: UUID4,
+        reason: str,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Блокирует пользователя и закрывает его WebSocket-соединения на всех воркерах.
+        :param user_id: ID блокируемого пользователя.
+        :param moderator_id: ID модератора.
+        :param reason: Причина блокировки.
+        :param session: Сессия текущего запроса, если есть.
+        :raises UserIsAlreadyBlockedException: Если пользователь уже заблокирован.
+        :return: Словарь с результатом блокировки.
+        """
+        # Вставка с ON CONFLICT DO NOTHING вместо проверки и вставки:
+        # уникальность blocked_user_id исключает гонку двух блокировок
+        inserted = await BlockDao.upsert_many(
+            [
+                {
+                    "blocked_user_id": user_id,
+                    "reason": reason,
+                    "moderator_id": moderator_id,
+                }
+            ],
+            index_elements=["blocked_user_id"],
+            session=session,
         )
+        if inserted == []:
+            raise UserIsAlreadyBlockedException
+        if inserted:
+            await publish_users_blocked(session, [user_id])
         response_data = {
             "detail": "The user has been blocked.",
             "blocked_user_id": user_id,
         }
         return response_data
+
+    @classmethod
+    async def block_users(
+        cls,
+        user_ids: List[UUID4],
+        moderator_id: UUID4,
+        reason: str,
+        session: AsyncSession,
+    ):
+        """
+        Блокирует многих пользователей одним INSERT ... ON CONFLICT DO NOTHING
+        и закрывает их WebSocket-соединения на всех воркерах после фиксации.
+        :param user_ids: ID блокируемых пользователей.
+        :param moderator_id: ID модератора.
+        :param reason: Причина блокировки.
+        :param session: Сессия текущего запроса.
+        :return: Словарь с заблокированными, уже заблокированными и ненайденными ID.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        existing = await UsersDao.find_existing_ids(user_ids, session=session) or set()
+        inserted = await BlockDao.upsert_many(
+            [
+                {
+                    "blocked_user_id": user_id,
+                    "reason": reason,
+                    "moderator_id": moderator_id,
+                }
+                for user_id in user_ids
+                if user_id in existing
+            ],
+            index_elements=["blocked_user_id"],
+            session=session,
+        )
+        blocked = {row.blocked_user_id for row in inserted or []}
+        if blocked:
+            await publish_users_blocked(session, blocked)
+        return {
+            "detail": "The users have been blocked.",
+            "blocked_user_ids": [u for u in user_ids if u in blocked],
+            "already_blocked_user_ids": [
+                u for u in user_ids if u in existing and u not in blocked
+            ],
+            "not_found_user_ids": [u for u in user_ids if u not in existing],
+        }
+
+    @classmethod
+    async def unblock_users(
+        cls, user_ids: List[UUID4], session: AsyncSession | None = None
+    ):
+        """
+        Снимает блокировку с многих пользователей одним DELETE.
+        :param user_ids: ID пользователей.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Словарь с ID пользователей, с которых снята блокировка.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        unblocked = set(await BlockDao.unblock_many(user_ids, session=session) or [])
+        return {
+            "detail": "The users have been unblocked.",
+            "unblocked_user_ids": [u for u in user_ids if u in unblocked],
+        }
@@ -1,3 +1,5 @@
+from typing import List
+
 from annotated_types import MaxLen, MinLen
 from pydantic import UUID4, BaseModel, EmailStr, Field
 from typing_extensions import Annotated
@@ -103,3 +105,32 @@ class SBlock(BaseModel):
         example="Spamming and violating community guidelines",
         description="Причина блокировки, длиной от 10 до 256 символов.",
     )
+
+
+class SBulkBlock(BaseModel):
+    """
+    Данные для блокировки многих пользователей одним запросом.
+    """
+
+    user_ids: Annotated[List[UUID4], MinLen(1), MaxLen(1000)] = Field(
+        ...,
+        example=["123e4567-e89b-12d3-a456-426614174000"],
+        description="ID пользователей для блокировки (от 1 до 1000).",
+    )
+    reason_of_block: Annotated[str, MinLen(10), MaxLen(256)] = Field(
+        ...,
+        example="Spamming and violating community guidelines",
+        description="Причина блокировки, длиной от 10 до 256 символов.",
+    )
+
+
+class SBulkUnblock(BaseModel):
+    """
+    Данные для снятия блокировки с многих пользователей одним запросом.
+    """
+
+    user_ids: Annotated[List[UUID4], MinLen(1), MaxLen(1000)] = Field(
+        ...,
+        example=["123e4567-e89b-12d3-a456-426614174000"],
+        description="ID пользователей для разблокировки (от 1 до 1000).",
+    )
@@ -0,0 +1,119 @@
+"""
+Затраты CPU на сжатие ответов против сэкономленных байтов на страницах,
+похожих на реальные: тексты сообщений из генератора набора данных
+(app.core.generate_dataset), предельно длинные сообщения (4096 символов)
+и список чатов модерации.
+
+    python -m app.benchmarks.compression --limit 100 --repeat 200
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+
+from app.core.generate_dataset import WORDS, make_texts
+from app.core.middleware import brotli, make_compressor
+
+
+def history_page(rng: random.Random, texts: list, limit: int) -> dict:
+    users = [uuid.uuid4(), uuid.uuid4()]
+    started = datetime(2026, 1, 1)
+    messages = [
+        {
+            "id": 1_000_000_000_000 + number * 4096,
+            "sender_id": users[number % 2],
+            "username": f"user_{number % 2}",
+            "message_text": rng.choice(texts),
+            "created_at": started - timedelta(seconds=rng.random() * 86400 * number),
+        }
+        for number in range(limit)
+    ]
+    return {
+        "participants": [
+            {"participant_id": users[0], "is_current_user": True},
+            {"participant_id": users[1], "is_current_user": False},
+        ],
+        "messages": messages,
+        "cursor_time": messages[-1]["created_at"],
+        "cursor_message_id": messages[-1]["id"],
+    }
+
+
+def moderation_chats_page(rng: random.Random, limit: int) -> dict:
+    return {
+        "chats": [
+            {
+                "chat": {
+                    "participants": [
+                        {
+                            "user_id": uuid.uuid4(),
+                            "username": f"user_{rng.randrange(10**6)}",
+                        },
+                        {
+                            "user_id": uuid.uuid4(),
+                            "username": f"user_{rng.randrange(10**6)}",
+                        },
+                    ],
+                    "last_message_time": datetime(2026, 1, 1)
+                    - timedelta(seconds=rng.random() * 10**6),
+                }
+            }
+            for _ in range(limit)
+        ],
+        "pagination": {
+            "limit": limit,
+            "current_offset": 0,
+            "new_offset": limit,
+            "is_end": False,
+        },
+    }
+
+
+def measure(body: bytes, encoding: str, level: int, repeat: int) -> tuple:
+    gzip_level, brotli_quality = (level, 0) if encoding == "gzip" else (6, level)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        compress, _, finish = make_compressor(encoding, gzip_level, brotli_quality)
+        compressed = compress(body) + finish()
+    elapsed = (time.perf_counter() - started) / repeat
+    return len(compressed), elapsed * 1_000_000
+
+
+def main(limit: int, repeat: int, seed: int):
+    rng = random.Random(seed)
+    texts = make_texts(rng)
+    long_texts = [" ".join(rng.choices(WORDS, k=800))[:4096] for _ in range(50)]
+    pages = {
+        f"history, {limit} messages": history_page(rng, texts, limit),
+        f"history, {limit} x 4096 chars": history_page(rng, long_texts, limit),
+        f"moderation chats, {limit}": moderation_chats_page(rng, limit),
+    }
+    settings = [("gzip", level) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings += [("br", quality) for quality in (1, 4, 11)]
+    for name, page in pages.items():
+        body = orjson.dumps(page)
+        print(f"{name}: {len(body):,} bytes")
+        for encoding, level in settings:
+            size, micros = measure(body, encoding, level, repeat)
+            saved = len(body) - size
+            print(
+                f"    {encoding:<4} level {level:<2}  {size:>9,} bytes "
+                f"({size / len(body):6.1%})  {micros:9.1f} us  "
+                f"{saved / micros:8.1f} bytes saved/us"
+            )
+    if brotli is None:
+        print("brotli is not installed, only gzip was measured")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    main(args.limit, args.repeat, args.seed)
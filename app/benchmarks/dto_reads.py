@@ -0,0 +1,69 @@
+"""
+Сравнение чтения пользователя через ORM (find_by_id) и через DTO (find_one_as):
+задержка на вызов и пиковый объём памяти, выделяемой за вызов.
+
+    python -m app.benchmarks.dto_reads --iterations 5000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import select
+
+from app.auth.dao import UsersDao
+from app.auth.dto import UserDTO
+from app.auth.models import User
+from app.core.database import async_session_maker
+
+
+async def measure(name: str, call, iterations: int):
+    # Прогрев: кэш компиляции SQLAlchemy и подготовленные выражения asyncpg
+    for _ in range(50):
+        await call()
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    elapsed = time.perf_counter() - started
+
+    # Пиковый объём памяти, выделяемой за один вызов
+    tracemalloc.start()
+    peaks = []
+    for _ in range(200):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        await call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    print(
+        f"{name:<6} {elapsed / iterations * 1e6:10.1f} us/call"
+        f" {statistics.median(peaks):10.0f} B peak/call"
+    )
+
+
+async def main(iterations: int):
+    async with async_session_maker() as session:
+        user_id = (await session.execute(select(User.id).limit(1))).scalar_one()
+
+        # Одна сессия на всю серию, как в запросе с единицей работы
+        await measure(
+            "orm",
+            lambda: UsersDao.find_by_id(user_id, session=session),
+            iterations,
+        )
+        session.expunge_all()
+        await measure(
+            "dto",
+            lambda: UsersDao.find_one_as(UserDTO, session=session, id=user_id),
+            iterations,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2_000)
+    asyncio.run(main(parser.parse_args().iterations))
@@ -0,0 +1,92 @@
+"""
+Время сериализации страницы истории сообщений разного размера:
+путь FastAPI для response_model (проверка схемой, преобразование в JSON-совместимые
+объекты, json.dumps) против render_model с проверкой (вне PROD) и без неё (PROD).
+
+    python -m app.benchmarks.response_serialization --sizes 10 50 100 500 --repeat 2000
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+from pydantic import TypeAdapter
+
+from app.chat.shemas import SGetMessagesBetweenUsersResponse
+from app.core.responses import render_model
+
+
+def build_page(size: int) -> dict:
+    """
+    Словарь страницы в той форме, в которой его собирает ChatService.
+    """
+    users = [uuid.uuid4(), uuid.uuid4()]
+    started = datetime(2026, 1, 1)
+    messages = [
+        {
+            "id": str(1_000_000_000_000 + number),
+            "sender_id": users[number % 2],
+            "username": f"user_{number % 2}",
+            "message_text": f"Сообщение номер {number}, " + "текст " * 10,
+            "created_at": started - timedelta(seconds=number, microseconds=number),
+            "attachment_id": None,
+        }
+        for number in range(size)
+    ]
+    return {
+        "participants": [
+            {"participant_id": users[0], "is_current_user": True},
+            {"participant_id": users[1], "is_current_user": False},
+        ],
+        "messages": messages,
+        "cursor_time": messages[-1]["created_at"] if messages else None,
+        "cursor_message_id": messages[-1]["id"] if messages else None,
+    }
+
+
+def fastapi_path(adapter: TypeAdapter):
+    # То же, что serialize_response и JSONResponse.render в FastAPI
+    def render(content: dict) -> bytes:
+        value = adapter.dump_python(adapter.validate_python(content), mode="json")
+        return json.dumps(
+            value, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+
+    return render
+
+
+def measure(render, content: dict, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render(content)
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+def main(sizes: list, repeat: int):
+    adapter = TypeAdapter(SGetMessagesBetweenUsersResponse)
+    paths = {
+        "response_model": fastapi_path(adapter),
+        "render_model (validated)": lambda content: render_model(
+            SGetMessagesBetweenUsersResponse, content
+        ),
+        "render_model (PROD)": orjson.dumps,
+    }
+    print(f"{'messages':>8}  " + "  ".join(f"{name:>26}" for name in paths))
+    for size in sizes:
+        content = build_page(size)
+        # Все пути дают одинаковый JSON
+        decoded = {json.dumps(json.loads(render(content))) for render in paths.values()}
+        assert len(decoded) == 1, "serialized pages differ"
+        timings = [measure(render, content, repeat) for render in paths.values()]
+        print(f"{size:>8}  " + "  ".join(f"{timing:>23.1f} us" for timing in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 500])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
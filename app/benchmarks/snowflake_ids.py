@@ -0,0 +1,98 @@
+"""
+Пропускная способность генератора ID сообщений и проверка уникальности:
+несколько потоков одного воркера и несколько воркеров с разными номерами,
+в том числе с часами, которые периодически переводятся назад.
+
+    python -m app.benchmarks.snowflake_ids --ids 1000000 --threads 4 --workers 8
+"""
+
+import argparse
+import threading
+import time
+
+from app.core.snowflake import SnowflakeGenerator
+
+
+class SkewedClock:
+    """
+    Часы, которые каждые period вызовов отстают на skew_ms миллисекунд.
+    """
+
+    def __init__(self, period: int, skew_ms: int):
+        self.period = period
+        self.skew_ns = skew_ms * 1_000_000
+        self.calls = 0
+
+    def __call__(self) -> int:
+        self.calls += 1
+        now = time.time_ns()
+        if self.calls % (2 * self.period) >= self.period:
+            return now - self.skew_ns
+        return now
+
+
+def generate(generator: SnowflakeGenerator, count: int, threads: int) -> list:
+    chunks = [[] for _ in range(threads)]
+
+    def run(chunk: list):
+        next_id = generator.next_id
+        for _ in range(count // threads):
+            chunk.append(next_id())
+
+    workers = [threading.Thread(target=run, args=(chunk,)) for chunk in chunks]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for chunk in chunks:
+        # Внутри потока ID строго возрастают
+        assert all(a < b for a, b in zip(chunk, chunk[1:])), "ids are not monotonic"
+    return [value for chunk in chunks for value in chunk]
+
+
+def measure(name: str, generators: list, count: int, threads: int):
+    started = time.perf_counter()
+    ids = []
+    for generator in generators:
+        ids.extend(generate(generator, count // len(generators), threads))
+    elapsed = time.perf_counter() - started
+    unique = len(set(ids))
+    skew_events = sum(generator.clock_skew_events for generator in generators)
+    print(
+        f"{name:<28} {len(ids) / elapsed:12,.0f} ids/s  "
+        f"unique {unique}/{len(ids)}  clock skew events {skew_events}"
+    )
+    assert unique == len(ids), "duplicate ids"
+
+
+def main(count: int, threads: int, workers: int):
+    measure("single worker", [SnowflakeGenerator(1)], count, 1)
+    measure(
+        f"single worker, {threads} threads", [SnowflakeGenerator(1)], count, threads
+    )
+    measure(
+        f"{workers} workers",
+        [SnowflakeGenerator(worker_id) for worker_id in range(workers)],
+        count,
+        threads,
+    )
+    measure(
+        "clock moving backwards",
+        [
+            SnowflakeGenerator(
+                worker_id, max_clock_skew_ms=1, clock=SkewedClock(50_000, 5)
+            )
+            for worker_id in range(workers)
+        ],
+        count,
+        threads,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snowflake id generator benchmark")
+    parser.add_argument("--ids", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    main(args.ids, args.threads, args.workers)
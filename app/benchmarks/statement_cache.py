@@ -0,0 +1,90 @@
+"""
+Накладные расходы Python на подготовку «горячих» запросов DAO без обращения к базе:
+построение выражения при каждом вызове против заранее построенного шаблона.
+Для каждого вызова выполняется тот же путь, что и при session.execute():
+вычисление ключа кэша и поиск скомпилированного выражения в кэше компиляции.
+
+    python -m app.benchmarks.statement_cache --iterations 20000
+"""
+
+import argparse
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql.asyncpg import PGDialect_asyncpg
+
+from app.auth.dao import USERS_BY_USERNAME_QUERY
+from app.auth.dto import UserShortDTO
+from app.auth.models import User
+from app.chat.dao import (
+    CHATS_OF_USER_CURSOR_QUERY,
+    MESSAGES_BETWEEN_USERS_CURSOR_QUERY,
+    build_chats_of_user_query,
+    build_messages_between_users_query,
+)
+from app.core.dao import BaseDao
+
+
+def build_users_by_username_query(username: str, limit: int, offset: int):
+    # Прежний вариант: выражение с литералами строится на каждый вызов
+    return BaseDao._replica(
+        select(*UserShortDTO.columns(User))
+        .where(User.username.ilike(f"%{username}%"))
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def measure(name: str, make_statement, iterations: int):
+    dialect = PGDialect_asyncpg(paramstyle="numeric_dollar")
+    compiled_cache = {}
+
+    def prepare():
+        # Повторяет подготовку выражения в Connection._execute_clauseelement
+        make_statement()._compile_w_cache(
+            dialect, compiled_cache=compiled_cache, column_keys=[]
+        )
+
+    # Прогрев: первая компиляция попадает в кэш
+    for _ in range(100):
+        prepare()
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        prepare()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<34} {elapsed / iterations * 1e6:10.1f} us/call")
+
+
+def main(iterations: int):
+    print("before (expression built per call):")
+    measure(
+        "  get_messages_between_users",
+        lambda: build_messages_between_users_query(with_cursor=True),
+        iterations,
+    )
+    measure(
+        "  get_chats_of_user",
+        lambda: build_chats_of_user_query(with_cursor=True),
+        iterations,
+    )
+    measure(
+        "  find_by_username",
+        lambda: build_users_by_username_query("user_1", 10, 0),
+        iterations,
+    )
+
+    print("after (prebuilt template):")
+    measure(
+        "  get_messages_between_users",
+        lambda: MESSAGES_BETWEEN_USERS_CURSOR_QUERY,
+        iterations,
+    )
+    measure("  get_chats_of_user", lambda: CHATS_OF_USER_CURSOR_QUERY, iterations)
+    measure("  find_by_username", lambda: USERS_BY_USERNAME_QUERY, iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statement preparation overhead")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    main(parser.parse_args().iterations)
@@ -0,0 +1,621 @@
+"""
+Холодный архив сообщений на локальном диске.
+
+Задание архивации выгружает сообщения старше заданной даты в сегмент:
+файл, в котором каждая переписка записана gzip-блоками строк JSON не больше
+BLOCK_MESSAGES сообщений (от новых к старым), и индекс сегмента со смещениями
+блоков, границами ID и времени. После записи сегмента на диск выгруженные
+строки удаляются из базы порциями по их ключам.
+
+    python -m app.chat.archive --older-than-days 365
+"""
+
+import argparse
+import asyncio
+import gzip
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from pydantic import UUID4
+from sqlalchemy import desc, func, select
+
+from app.chat.cache import publish_history_pages_changed
+from app.chat.dao import MessageDAO
+from app.chat.models import Message
+from app.core.config import settings
+from app.core.database import async_session_maker, engine, session_scope
+from app.core.logger import logger
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".index.json"
+# Размер порции сжатых данных при потоковом чтении блока
+READ_CHUNK_SIZE = 64 * 1024
+# Максимальное количество сообщений в одном блоке сегмента
+BLOCK_MESSAGES = 1000
+# Количество ключей в одном запросе удаления (по два параметра на ключ)
+DELETE_BATCH_SIZE = 5_000
+
+# Сообщение из архива; поля совпадают с сообщениями MessageDAO.get_conversation_page
+ArchivedMessage = namedtuple(
+    "ArchivedMessage",
+    ["id", "message_text", "sender_id", "created_at", "attachment_id"],
+)
+
+
+def conversation_key(user_1_id, user_2_id) -> str:
+    """
+    Ключ переписки, не зависящий от порядка участников.
+    """
+    return ":".join(sorted((str(user_1_id), str(user_2_id))))
+
+
+def read_indexes(directory: Path) -> List[Tuple[Path, dict]]:
+    """
+    Индексы всех сегментов каталога.
+    В индексах, записанных до разбиения переписок на блоки, переписка
+    описана одним блоком; они приводятся к списку блоков.
+    :return: Пары (путь к индексу, индекс).
+    """
+    indexes = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(INDEX_SUFFIX):
+            continue
+        with open(directory / name, "r") as file:
+            index = json.load(file)
+        for key, blocks in index["conversations"].items():
+            if isinstance(blocks, dict):
+                index["conversations"][key] = [blocks]
+        indexes.append((directory / name, index))
+    return indexes
+
+
+def read_block(segment: Path, entry: dict) -> bytes:
+    """
+    Распакованный блок сегмента.
+    """
+    with open(segment, "rb") as file:
+        file.seek(entry["offset"])
+        return gzip.decompress(file.read(entry["length"]))
+
+
+def iter_block_lines(segment: Path, entry: dict) -> Iterator[bytes]:
+    """
+    Строки JSON блока сегмента с потоковой распаковкой.
+    """
+    decompressor = zlib.decompressobj(wbits=31)
+    pending = b""
+    with open(segment, "rb") as file:
+        file.seek(entry["offset"])
+        remaining = entry["length"]
+        while remaining > 0:
+            data = file.read(min(READ_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            *lines, pending = (pending + decompressor.decompress(data)).split(b"\n")
+            for line in lines:
+                yield line + b"\n"
+    pending += decompressor.flush()
+    if pending:
+        yield pending + b"\n"
+
+
+def decode_message(line: bytes) -> ArchivedMessage:
+    """
+    Сообщение из строки JSON блока.
+    """
+    row = json.loads(line)
+    return ArchivedMessage(
+        row["id"],
+        row["message_text"],
+        uuid.UUID(row["sender_id"]),
+        datetime.fromisoformat(row["created_at"]),
+        # В сегментах, выгруженных до появления вложений, поля нет
+        uuid.UUID(row["attachment_id"]) if row.get("attachment_id") else None,
+    )
+
+
+class ArchiveStore:
+    """
+    Чтение архива: индексы сегментов держатся в памяти и перечитываются,
+    когда меняется время изменения каталога (появился или заменён сегмент).
+    Распакованные блоки кэшируются в LRU, ограниченном суммарным размером.
+    """
+
+    def __init__(self, directory: Path, cache_bytes: int):
+        self.directory = Path(directory)
+        self.cache_bytes = cache_bytes
+        self._mtime: int | None = None
+        # Ключ переписки -> список (сегмент, запись блока), от новых к старым
+        self._conversations: Dict[str, List[Tuple[Path, dict]]] = {}
+        # (сегмент, смещение) -> (размер распакованного блока, сообщения)
+        self._blocks: "OrderedDict[Tuple[Path, int], Tuple[int, tuple]]" = OrderedDict()
+        self._cache_size = 0
+        # Чтение идёт из потоков asyncio.to_thread
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        conversations: Dict[str, List[Tuple[Path, dict]]] = {}
+        for _, index in read_indexes(self.directory):
+            segment = self.directory / index["segment"]
+            for key, blocks in index["conversations"].items():
+                for entry in blocks:
+                    entry["min_time"] = datetime.fromisoformat(entry["min_time"])
+                    entry["max_time"] = datetime.fromisoformat(entry["max_time"])
+                    conversations.setdefault(key, []).append((segment, entry))
+        for entries in conversations.values():
+            entries.sort(key=lambda item: item[1]["max_id"], reverse=True)
+        segments = {
+            segment for entries in conversations.values() for segment, _ in entries
+        }
+        with self._lock:
+            self._conversations = conversations
+            # Блоки удалённых или заменённых сегментов больше не нужны
+            for key in [key for key in self._blocks if key[0] not in segments]:
+                self._cache_size -= self._blocks.pop(key)[0]
+            self._mtime = mtime
+
+    def _read_block(self, segment: Path, entry: dict) -> tuple:
+        key = (segment, entry["offset"])
+        with self._lock:
+            cached = self._blocks.get(key)
+            if cached is not None:
+                self._blocks.move_to_end(key)
+                return cached[1]
+        data = read_block(segment, entry)
+        messages = tuple(map(decode_message, data.splitlines()))
+        if len(data) <= self.cache_bytes:
+            with self._lock:
+                if key not in self._blocks:
+                    self._blocks[key] = (len(data), messages)
+                    self._cache_size += len(data)
+                while self._cache_size > self.cache_bytes:
+                    self._cache_size -= self._blocks.popitem(last=False)[1][0]
+        return messages
+
+    def _entries(self, user_1_id: UUID4, user_2_id: UUID4) -> List[Tuple[Path, dict]]:
+        self._refresh()
+        return self._conversations.get(conversation_key(user_1_id, user_2_id), [])
+
+    def get_messages(
+        self,
+        user_1_id: UUID4,
+        user_2_id: UUID4,
+        cursor_message_id: int | None,
+        limit: int,
+    ) -> List[ArchivedMessage]:
+        """
+        Страница архивных сообщений переписки старше курсора, от новых к старым.
+        Сообщение, попавшее в несколько сегментов, возвращается один раз.
+        :param user_1_id: UUID первого участника.
+        :param user_2_id: UUID второго участника.
+        :param cursor_message_id: ID сообщения курсора (None — с самого нового).
+        :param limit: Максимальное количество сообщений.
+        """
+        messages: Dict[int, ArchivedMessage] = {}
+        # ID последнего сообщения страницы, когда она уже набрана
+        lowest = None
+        for segment, entry in self._entries(user_1_id, user_2_id):
+            if cursor_message_id is not None and entry["min_id"] >= cursor_message_id:
+                continue
+            # Блоки отсортированы по max_id: в следующих нет сообщений новее страницы
+            if lowest is not None and entry["max_id"] < lowest:
+                break
+            for message in self._read_block(segment, entry):
+                if cursor_message_id is None or message.id < cursor_message_id:
+                    messages.setdefault(message.id, message)
+            if len(messages) >= limit:
+                lowest = heapq.nlargest(limit, messages)[-1]
+        return [messages[id] for id in heapq.nlargest(limit, messages)]
+
+    def max_message_id(self, user_1_id: UUID4, user_2_id: UUID4) -> int:
+        """
+        Наибольший ID архивного сообщения переписки (0, если в архиве её нет).
+        """
+        entries = self._entries(user_1_id, user_2_id)
+        return entries[0][1]["max_id"] if entries else 0
+
+    def iter_lines(self, user_1_id: UUID4, user_2_id: UUID4) -> Iterator[bytes]:
+        """
+        Строки JSON всех архивных сообщений переписки, от новых к старым.
+        Блоки распаковываются потоково и не кэшируются, поэтому память
+        не зависит от размера переписки. Блоки разных сегментов, пересекающиеся
+        по ID, сливаются по ID без повторов.
+        :param user_1_id: UUID первого участника.
+        :param user_2_id: UUID второго участника.
+        """
+        entries = self._entries(user_1_id, user_2_id)
+        start = 0
+        while start < len(entries):
+            # Группа блоков, пересекающихся по диапазонам ID
+            end, lowest = start + 1, entries[start][1]["min_id"]
+            while end < len(entries) and entries[end][1]["max_id"] >= lowest:
+                lowest = min(lowest, entries[end][1]["min_id"])
+                end += 1
+            group = entries[start:end]
+            start = end
+            if len(group) == 1:
+                yield from iter_block_lines(*group[0])
+                continue
+            last_id = None
+            for message_id, line in heapq.merge(
+                *(
+                    ((json.loads(line)["id"], line) for line in iter_block_lines(*item))
+                    for item in group
+                ),
+                key=lambda pair: -pair[0],
+            ):
+                if message_id != last_id:
+                    last_id = message_id
+                    yield line
+
+
+archive_store = ArchiveStore(settings.ARCHIVE_DIR, settings.ARCHIVE_CACHE_BYTES)
+
+
+def encode_message(row) -> bytes:
+    """
+    Строка JSON сообщения (формат блоков архива и выгрузки переписки).
+    """
+    return (
+        json.dumps(
+            {
+                "id": row.id,
+                "message_text": row.message_text,
+                "sender_id": str(row.sender_id),
+                "recipient_id": str(row.recipient_id),
+                "created_at": row.created_at.isoformat(),
+                "attachment_id": str(row.attachment_id) if row.attachment_id else None,
+            },
+            ensure_ascii=False,
+        ).encode()
+        + b"\n"
+    )
+
+
+def fsync_directory(directory: Path):
+    """
+    Фиксирует на диске записи каталога (созданные и переименованные файлы).
+    """
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def segment_name(cutoff: datetime) -> str:
+    """
+    Уникальное имя нового сегмента (без расширения).
+    """
+    return f"messages-{cutoff:%Y%m%dT%H%M%S}-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+
+def write_index(index_path: Path, index: dict):
+    """
+    Записывает индекс сегмента атомарно: через временный файл и fsync.
+    """
+    tmp_index = index_path.with_suffix(".tmp")
+    with open(tmp_index, "w") as file:
+        json.dump(index, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_index, index_path)
+    fsync_directory(index_path.parent)
+
+
+async def export_segment(cutoff: datetime, directory: Path) -> Tuple[Path, dict] | None:
+    """
+    Выгружает сообщения старше cutoff в новый сегмент, сгруппированные по перепискам.
+    Переписка делится на блоки не больше BLOCK_MESSAGES сообщений, чтобы чтение
+    страницы не распаковывало всю переписку.
+    Сегмент и индекс сначала пишутся во временные файлы и переименовываются
+    только после fsync, поэтому неполный сегмент никогда не виден читателям.
+    Индекс помечается pending_delete, пока выгруженные строки не удалены из базы.
+    :return: Путь к индексу и индекс сегмента или None, если выгружать нечего.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    name = segment_name(cutoff)
+    segment_path = directory / f"{name}{SEGMENT_SUFFIX}"
+    index_path = directory / f"{name}{INDEX_SUFFIX}"
+    tmp_segment = segment_path.with_suffix(".tmp")
+
+    user_1 = func.least(Message.sender_id, Message.recipient_id)
+    user_2 = func.greatest(Message.sender_id, Message.recipient_id)
+    query = (
+        select(
+            Message.id,
+            Message.message_text,
+            Message.sender_id,
+            Message.recipient_id,
+            Message.created_at,
+            Message.attachment_id,
+        )
+        .where(Message.created_at < cutoff)
+        .order_by(user_1, user_2, desc(Message.id))
+    )
+
+    conversations: Dict[str, List[dict]] = {}
+    total = 0
+
+    def flush(file, key, block, ids, times):
+        offset = file.tell()
+        file.write(gzip.compress(b"".join(block)))
+        conversations.setdefault(key, []).append(
+            {
+                "offset": offset,
+                "length": file.tell() - offset,
+                "count": len(block),
+                "min_id": min(ids),
+                "max_id": max(ids),
+                "min_time": min(times).isoformat(),
+                "max_time": max(times).isoformat(),
+            }
+        )
+
+    async with async_session_maker() as session:
+        rows = await session.stream(query.execution_options(yield_per=5_000))
+        with open(tmp_segment, "wb") as file:
+            key, block, ids, times = None, [], [], []
+            async for row in rows:
+                row_key = conversation_key(row.sender_id, row.recipient_id)
+                if block and (row_key != key or len(block) >= BLOCK_MESSAGES):
+                    flush(file, key, block, ids, times)
+                    block, ids, times = [], [], []
+                key = row_key
+                block.append(encode_message(row))
+                ids.append(row.id)
+                times.append(row.created_at)
+                total += 1
+            if block:
+                flush(file, key, block, ids, times)
+            file.flush()
+            os.fsync(file.fileno())
+
+    if not total:
+        tmp_segment.unlink()
+        return None
+
+    index = {
+        "segment": segment_path.name,
+        "cutoff": cutoff.isoformat(),
+        "messages": total,
+        "pending_delete": True,
+        "conversations": conversations,
+    }
+    os.replace(tmp_segment, segment_path)
+    write_index(index_path, index)
+    return index_path, index
+
+
+async def delete_exported(
+    index_path: Path, index: dict, batch_size: int = DELETE_BATCH_SIZE
+) -> int:
+    """
+    Удаляет из базы сообщения, выгруженные в сегмент, порциями по ключам
+    (id, created_at), прочитанным из самого сегмента. Строки, появившиеся
+    после выгрузки, не затрагиваются. После удаления снимает с индекса
+    отметку pending_delete.
+    :param index_path: Путь к индексу сегмента.
+    :param index: Индекс сегмента.
+    :param batch_size: Количество ключей в одном запросе удаления.
+    :raises SQLAlchemyError: Если порция не удалилась; отметка pending_delete
+        остаётся, и следующий запуск продолжит удаление.
+    :return: Количество удалённых строк.
+    """
+
+    async def delete_batch(batch: List[Tuple[int, datetime]]) -> int:
+        # Каждая порция — своя транзакция; сессия передаётся в DAO, чтобы
+        # ошибка базы прервала удаление исходным исключением
+        async with session_scope() as session:
+            return await MessageDAO.delete_by_keys(batch, session=session)
+
+    segment = index_path.parent / index["segment"]
+    deleted = 0
+    keys = []
+    for blocks in index["conversations"].values():
+        for entry in blocks:
+            data = await asyncio.to_thread(read_block, segment, entry)
+            for line in data.splitlines():
+                row = json.loads(line)
+                keys.append((row["id"], datetime.fromisoformat(row["created_at"])))
+            while len(keys) >= batch_size:
+                deleted += await delete_batch(keys[:batch_size])
+                keys = keys[batch_size:]
+    if keys:
+        deleted += await delete_batch(keys)
+    if deleted:
+        # Страницы истории теперь дочитываются из архива; закэшированные
+        # воркерами страницы сбрасываются на случай расхождений
+        async with session_scope() as session:
+            await publish_history_pages_changed(session)
+    index["pending_delete"] = False
+    await asyncio.to_thread(write_index, index_path, index)
+    return deleted
+
+
+async def archive_messages(
+    older_than_days: int = settings.ARCHIVE_OLDER_THAN_DAYS,
+    batch_size: int = DELETE_BATCH_SIZE,
+) -> int:
+    """
+    Архивирует сообщения старше older_than_days дней и удаляет их из базы.
+    Граница фиксируется до выгрузки; новые сообщения создаются с текущим временем
+    и под неё не попадают. Удаляются только строки, записанные в сегмент, и только
+    после того, как сегмент и индекс зафиксированы на диске.
+    Если прошлый запуск прервался до конца удаления, оно сначала завершается,
+    чтобы те же сообщения не выгрузились во второй сегмент.
+    :return: Количество архивированных сообщений.
+    """
+    directory = settings.ARCHIVE_DIR
+    if directory.is_dir():
+        for index_path, index in read_indexes(directory):
+            if index.get("pending_delete"):
+                deleted = await delete_exported(index_path, index, batch_size)
+                logger.info(
+                    "Interrupted archive deletion has been completed",
+                    extra={"segment": index["segment"], "deleted": deleted},
+                )
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    started = time.perf_counter()
+    exported = await export_segment(cutoff, directory)
+    if exported is None:
+        logger.info("Nothing to archive", extra={"cutoff": cutoff.isoformat()})
+        return 0
+
+    index_path, index = exported
+    deleted = await delete_exported(index_path, index, batch_size)
+    logger.info(
+        "Messages have been archived",
+        extra={
+            "cutoff": cutoff.isoformat(),
+            "segment": index["segment"],
+            "archived": index["messages"],
+            "conversations": len(index["conversations"]),
+            "deleted": deleted,
+            "seconds": round(time.perf_counter() - started, 2),
+        },
+    )
+    return index["messages"]
+
+
+def _block_entry(offset: int, data: bytes, rows: List[dict]) -> dict:
+    ids = [row["id"] for row in rows]
+    times = [datetime.fromisoformat(row["created_at"]) for row in rows]
+    return {
+        "offset": offset,
+        "length": len(data),
+        "count": len(rows),
+        "min_id": min(ids),
+        "max_id": max(ids),
+        "min_time": min(times).isoformat(),
+        "max_time": max(times).isoformat(),
+    }
+
+
+def _purge_segment(
+    index_path: Path,
+    index: dict,
+    default_cutoff: datetime | None,
+    cutoffs: Dict[str, datetime],
+) -> int:
+    segment = index_path.parent / index["segment"]
+    # Ключ переписки -> (запись блока, оставшиеся строки или None, если блок цел)
+    kept: Dict[str, List[Tuple[dict, List[bytes] | None]]] = {}
+    removed = 0
+    changed = False
+    for key, blocks in index["conversations"].items():
+        cutoff = cutoffs.get(key, default_cutoff)
+        for entry in blocks:
+            if cutoff is None or datetime.fromisoformat(entry["min_time"]) >= cutoff:
+                kept.setdefault(key, []).append((entry, None))
+                continue
+            changed = True
+            if datetime.fromisoformat(entry["max_time"]) < cutoff:
+                removed += entry["count"]
+                continue
+            lines = [
+                line + b"\n"
+                for line in read_block(segment, entry).splitlines()
+                if datetime.fromisoformat(json.loads(line)["created_at"]) >= cutoff
+            ]
+            removed += entry["count"] - len(lines)
+            kept.setdefault(key, []).append((entry, lines))
+    if not changed:
+        return 0
+
+    if kept:
+        # Новый сегмент публикуется раньше, чем удаляется старый: читатели
+        # в это время видят оба, а повторы отбрасываются по ID
+        name = segment_name(datetime.fromisoformat(index["cutoff"]))
+        new_segment = index_path.parent / f"{name}{SEGMENT_SUFFIX}"
+        tmp_segment = new_segment.with_suffix(".tmp")
+        conversations: Dict[str, List[dict]] = {}
+        with open(segment, "rb") as source, open(tmp_segment, "wb") as file:
+            for key, items in kept.items():
+                for entry, lines in items:
+                    offset = file.tell()
+                    if lines is None:
+                        # Нетронутый блок копируется без перепаковки
+                        source.seek(entry["offset"])
+                        file.write(source.read(entry["length"]))
+                        new_entry = dict(entry, offset=offset)
+                    else:
+                        data = gzip.compress(b"".join(lines))
+                        file.write(data)
+                        new_entry = _block_entry(
+                            offset, data, list(map(json.loads, lines))
+                        )
+                    conversations.setdefault(key, []).append(new_entry)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_segment, new_segment)
+        new_index = dict(
+            index,
+            segment=new_segment.name,
+            messages=index["messages"] - removed,
+            conversations=conversations,
+        )
+        write_index(index_path.parent / f"{name}{INDEX_SUFFIX}", new_index)
+
+    index_path.unlink()
+    fsync_directory(index_path.parent)
+    segment.unlink(missing_ok=True)
+    return removed
+
+
+def purge_segments(
+    directory: Path,
+    default_cutoff: datetime | None,
+    cutoffs: Dict[str, datetime],
+) -> int:
+    """
+    Удаляет из сегментов архива сообщения с истёкшим сроком хранения.
+    Сегмент с такими сообщениями переписывается без них (нетронутые блоки
+    копируются как есть) или удаляется целиком. Сегменты, удаление которых
+    из базы ещё не завершено (pending_delete), не трогаются до следующего прохода.
+    :param directory: Каталог архива.
+    :param default_cutoff: Граница для переписок без своей политики
+        (None — хранить бессрочно).
+    :param cutoffs: Ключ переписки -> граница по её политике хранения.
+    :return: Количество удалённых из архива сообщений.
+    """
+    if not directory.is_dir():
+        return 0
+    removed = 0
+    for index_path, index in read_indexes(directory):
+        if not index.get("pending_delete"):
+            removed += _purge_segment(index_path, index, default_cutoff, cutoffs)
+    return removed
+
+
+async def main(args: argparse.Namespace):
+    try:
+        print(await archive_messages(args.older_than_days, args.batch_size))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old messages to disk")
+    parser.add_argument(
+        "--older-than-days", type=int, default=settings.ARCHIVE_OLDER_THAN_DAYS
+    )
+    parser.add_argument("--batch-size", type=int, default=DELETE_BATCH_SIZE)
+    asyncio.run(main(parser.parse_args()))
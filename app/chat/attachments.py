@@ -0,0 +1,82 @@
+"""
+Хранилище содержимого вложений.
+
+Файл лежит под SHA-256 своего содержимого (<каталог>/ab/cd/abcd...), поэтому
+повторная загрузка того же файла не занимает места. Загрузка пишется порциями
+во временный файл с одновременным подсчётом хэша и только после fsync
+переименовывается на место, поэтому неполный файл никогда не виден читателям,
+а файл целиком в памяти не держится.
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterable, Tuple
+
+from app.core.config import settings
+
+TMP_DIR_NAME = "tmp"
+
+
+class AttachmentStore:
+    """
+    Содержимое вложений в локальном каталоге.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def path_for(self, sha256: str) -> Path:
+        """
+        Путь к файлу с данным SHA-256 содержимого.
+        """
+        return self.directory / sha256[:2] / sha256[2:4] / sha256
+
+    async def save(self, chunks: AsyncIterable[bytes]) -> Tuple[str, int]:
+        """
+        Сохраняет поток данных.
+        :param chunks: Порции содержимого; исключение при их чтении
+            прерывает загрузку и удаляет временный файл.
+        :return: SHA-256 содержимого и его размер в байтах.
+        """
+        tmp_dir = self.directory / TMP_DIR_NAME
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+
+        def write(file, chunk: bytes):
+            digest.update(chunk)
+            file.write(chunk)
+
+        file = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            try:
+                async for chunk in chunks:
+                    if chunk:
+                        size += len(chunk)
+                        await asyncio.to_thread(write, file, chunk)
+                await asyncio.to_thread(file.flush)
+                await asyncio.to_thread(os.fsync, file.fileno())
+            finally:
+                await asyncio.to_thread(file.close)
+            sha256 = digest.hexdigest()
+            await asyncio.to_thread(self._commit, tmp_path, self.path_for(sha256))
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return sha256, size
+
+    @staticmethod
+    def _commit(tmp_path: Path, path: Path):
+        if path.exists():
+            # Такое содержимое уже есть
+            tmp_path.unlink()
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+
+
+attachment_store = AttachmentStore(settings.ATTACHMENTS_DIR)
@@ -0,0 +1,336 @@
+"""
+Кэши чатов в памяти воркера.
+
+Кэш первой страницы списка чатов пользователя.
+
+Список чатов меняется только при отправке сообщения и отметке о прочтении.
+Воркер, обработавший сообщение, обновляет кэш отправителя и получателя
+на месте (после фиксации транзакции), остальные воркеры получают уведомление
+через LISTEN/NOTIFY и удаляют записи этих пользователей. Кэш используется,
+только пока слушатель уведомлений подключён, а записи живут не дольше
+CHAT_LIST_CACHE_TTL секунд — это ограничивает устаревание из-за изменений
+в обход этих путей (архивация, удаление по сроку хранения).
+
+Кэш закодированных страниц истории сообщений. Страница, курсор которой старше
+HISTORY_PAGE_SETTLE_SECONDS, не меняется от новых сообщений: они получают
+большие ID, а сообщение с ID из прошлого могло появиться только в пределах
+расхождения часов воркеров и времени фиксации. Такие страницы отдаются со
+строгим ETag и хранятся в общем для запросов кэше воркера. Старые сообщения
+удаляются только заданием хранения и архивацией; после удаления они
+уведомляют все воркеры, и те очищают кэш целиком.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, Iterable, List, NamedTuple
+from uuid import UUID
+
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.pubsub import WORKER_TOKEN, pubsub
+from app.core.snowflake import is_snowflake, timestamp_of
+
+CHAT_LIST_CHANNEL = "chat_list"
+HISTORY_PAGES_CHANNEL = "history_pages"
+
+
+class ChatListCache:
+    """
+    LRU-кэш первой страницы списка чатов: пользователь -> список словарей чатов
+    (partner_id, partner_username, last_message_time, unread_count)
+    от новых к старым.
+    """
+
+    def __init__(self, max_users: int, ttl: float, page_size: int):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.page_size = page_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[UUID4, tuple]" = OrderedDict()
+        # Незавершённые заполнения: пользователь -> маркер. Инвалидация удаляет
+        # маркер, и результат запроса, начатого до неё, в кэш не попадает
+        self._fills: Dict[UUID4, object] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_users > 0 and pubsub.connected
+
+    def get(self, user_id: UUID4) -> List[dict] | None:
+        """
+        Первая страница чатов пользователя или None, если её нет в кэше.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return [dict(chat) for chat in entry[1]]
+
+    def begin_fill(self, user_id: UUID4) -> object:
+        """
+        Маркер заполнения; берётся до запроса к базе и передаётся в put().
+        """
+        token = self._fills[user_id] = object()
+        return token
+
+    def put(self, user_id: UUID4, chats: List[dict], token: object):
+        """
+        Сохраняет первую страницу, если после begin_fill не было инвалидации.
+        """
+        if self._fills.get(user_id) is not token:
+            return
+        del self._fills[user_id]
+        if not self.enabled:
+            return
+        self._store(user_id, [dict(chat) for chat in chats])
+
+    def _store(self, user_id: UUID4, chats: List[dict]):
+        self._entries[user_id] = (time.monotonic() + self.ttl, chats)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids: Iterable[UUID4]):
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+            self._fills.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._fills.clear()
+
+    def _touch(
+        self,
+        user_id: UUID4,
+        partner_id: UUID4,
+        partner_username: str | None,
+        last_message_time: datetime,
+        unread_count: int | None,
+    ):
+        """
+        Поднимает чат с партнёром в начало закэшированной страницы.
+        Если партнёра на странице нет, а имя его неизвестно, запись удаляется.
+        """
+        self._fills.pop(user_id, None)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        chats = entry[1]
+        chat = next((chat for chat in chats if chat["partner_id"] == partner_id), None)
+        if chat is None:
+            if partner_username is None:
+                del self._entries[user_id]
+                return
+            chat = {
+                "partner_id": partner_id,
+                "partner_username": partner_username,
+                "unread_count": 0,
+            }
+        else:
+            chats.remove(chat)
+        chat["last_message_time"] = last_message_time
+        if unread_count is not None:
+            chat["unread_count"] = unread_count
+        chats.insert(0, chat)
+        del chats[self.page_size :]
+
+    def message_sent(
+        self,
+        sender_id: UUID4,
+        sender_username: str,
+        recipient_id: UUID4,
+        created_at: datetime,
+        recipient_unread_count: int,
+    ):
+        """
+        Обновляет страницы отправителя и получателя после фиксации сообщения.
+        """
+        self._touch(sender_id, recipient_id, None, created_at, None)
+        self._touch(
+            recipient_id, sender_id, sender_username, created_at, recipient_unread_count
+        )
+
+    def handle_notification(self, payload: str):
+        """
+        Обработчик уведомлений канала chat_list от всех воркеров.
+        Собственные уведомления о сообщениях пропускаются: этот воркер уже
+        обновил кэш на месте.
+        """
+        data = json.loads(payload)
+        if data["kind"] == "message" and data["origin"] == WORKER_TOKEN:
+            return
+        self.invalidate(UUID(user_id) for user_id in data["users"])
+
+
+chat_list_cache = ChatListCache(
+    settings.CHAT_LIST_CACHE_SIZE,
+    settings.CHAT_LIST_CACHE_TTL,
+    settings.BASE_LIMIT_CHATS_FOR_USER,
+)
+pubsub.subscribe(
+    CHAT_LIST_CHANNEL, chat_list_cache.handle_notification, chat_list_cache.clear
+)
+
+
+async def publish_chat_list_changed(
+    session: AsyncSession, kind: str, user_ids: Iterable[UUID4]
+):
+    """
+    Сообщает всем воркерам об изменении списков чатов пользователей.
+    Уведомление уходит при фиксации транзакции сессии.
+    :param session: Сессия текущей единицы работы.
+    :param kind: message — новое сообщение, read — отметка о прочтении.
+    :param user_ids: Пользователи, чьи списки изменились.
+    """
+    if settings.CHAT_LIST_CACHE_SIZE <= 0:
+        return
+    payload = json.dumps(
+        {"kind": kind, "origin": WORKER_TOKEN, "users": [str(u) for u in user_ids]}
+    )
+    await pubsub.publish(session, CHAT_LIST_CHANNEL, payload)
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Строгий ETag тела ответа.
+    """
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Проверяет заголовок If-None-Match (слабое сравнение, как требует RFC 9110).
+    :param if_none_match: Значение заголовка или None.
+    :param etag: Текущий ETag ресурса.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class CachedPage(NamedTuple):
+    expires: float
+    etag: str
+    body: bytes
+
+
+class HistoryPageCache:
+    """
+    LRU-кэш закодированных неизменных страниц истории сообщений,
+    ограниченный суммарным размером тел.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, settle_seconds: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.settle = timedelta(seconds=settle_seconds)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        # Увеличивается при каждой очистке; страница, прочитанная из базы
+        # до очистки, в кэш не попадает
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        # Без слушателя уведомлений об удалении кэш мог бы устареть
+        return self.max_bytes > 0 and pubsub.connected
+
+    def is_settled(self, cursor_message_id: int | None) -> bool:
+        """
+        Страница с этим курсором больше не изменится.
+        Первая страница (без курсора) меняется с каждым новым сообщением;
+        ID до перехода на snowflake старше любого нового сообщения.
+        """
+        if cursor_message_id is None:
+            return False
+        if not is_snowflake(cursor_message_id):
+            return True
+        return timestamp_of(cursor_message_id) < datetime.utcnow() - self.settle
+
+    def get(self, key: Hashable) -> CachedPage | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry.expires < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def begin_fill(self) -> int:
+        """
+        Маркер заполнения; берётся до запроса к базе и передаётся в put().
+        """
+        return self._generation
+
+    def put(self, key: Hashable, etag: str, body: bytes, generation: int):
+        """
+        Сохраняет страницу, если после begin_fill кэш не очищался.
+        """
+        if not self.enabled or generation != self._generation:
+            return
+        if len(body) > self.max_bytes:
+            return
+        self.discard(key)
+        self._entries[key] = CachedPage(time.monotonic() + self.ttl, etag, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    def discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+        self._generation += 1
+
+    def handle_notification(self, payload: str):
+        """
+        Обработчик уведомлений канала history_pages: из истории удалены
+        сообщения, и любая закэшированная страница могла устареть.
+        """
+        self.clear()
+
+
+history_page_cache = HistoryPageCache(
+    settings.HISTORY_PAGE_CACHE_BYTES,
+    settings.HISTORY_PAGE_MAX_AGE,
+    settings.HISTORY_PAGE_SETTLE_SECONDS,
+)
+pubsub.subscribe(
+    HISTORY_PAGES_CHANNEL,
+    history_page_cache.handle_notification,
+    history_page_cache.clear,
+)
+
+
+async def publish_history_pages_changed(session: AsyncSession):
+    """
+    Сообщает всем воркерам, что из истории удалены сообщения.
+    Уведомление уходит при фиксации транзакции сессии; вызывается
+    после фиксации удаления, чтобы страница, прочитанная до него, не осталась
+    в кэше (см. HistoryPageCache.begin_fill).
+    :param session: Сессия текущей единицы работы.
+    """
+    await pubsub.publish(session, HISTORY_PAGES_CHANNEL, "")
@@ -1,15 +1,279 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Tuple
 
 from pydantic import UUID4
-from sqlalchemy import and_, case, desc, func, or_, select
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Integer,
+    String,
+    and_,
+    bindparam,
+    case,
+    delete,
+    desc,
+    exists,
+    func,
+    literal_column,
+    or_,
+    select,
+    text,
+    true,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import REAL
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import aliased
+from sqlalchemy.types import Uuid
 
+from app.auth.dto import UserShortDTO
 from app.auth.models import User
-from app.chat.models import Message
+from app.chat.models import (
+    SEARCH_CONFIG,
+    Attachment,
+    ConversationRead,
+    Message,
+    RetentionPolicy,
+)
 from app.core.config import settings
 from app.core.dao import BaseDao
-from app.core.database import async_session_maker
+from app.core.snowflake import is_snowflake, timestamp_of
+
+# Шаблоны «горячих» запросов строятся один раз при импорте модуля.
+# Значения передаются через именованные параметры при выполнении, поэтому
+# дерево выражения не пересобирается на каждый вызов, а ключ кэша компиляции
+# SQLAlchemy вычисляется для шаблона один раз (он мемоизируется в объекте).
+
+
+def build_chats_of_user_query(with_cursor: bool):
+    """
+    Шаблон запроса списка чатов пользователя.
+    Параметры: current_user_id, limit и (при with_cursor) cursor_last_message_time.
+    """
+    current_user_id = bindparam("current_user_id", type_=Uuid)
+    # Подзапрос для получения партнера по чату и времени последнего сообщения
+    sub_query = (
+        select(
+            case(
+                (Message.sender_id == current_user_id, Message.recipient_id),
+                else_=Message.sender_id,
+            ).label("chat_partner_id"),
+            func.max(Message.created_at).label("last_message_time"),
+        )
+        .where(
+            or_(
+                Message.sender_id == current_user_id,
+                Message.recipient_id == current_user_id,
+            )
+        )
+        .group_by("chat_partner_id")
+        .subquery()
+    )
+
+    # Основной запрос для получения чатов, информации о пользователе
+    # и поддерживаемого счётчика непрочитанных сообщений
+    query = (
+        select(
+            sub_query.c.chat_partner_id,
+            User.username,
+            sub_query.c.last_message_time,
+            func.coalesce(ConversationRead.unread_count, 0).label("unread_count"),
+        )
+        .join(User, User.id == sub_query.c.chat_partner_id)
+        .outerjoin(
+            ConversationRead,
+            and_(
+                ConversationRead.user_id == current_user_id,
+                ConversationRead.partner_id == sub_query.c.chat_partner_id,
+            ),
+        )
+    )
+
+    # Добавление фильтра для пагинации
+    if with_cursor:
+        query = query.where(
+            sub_query.c.last_message_time
+            < bindparam("cursor_last_message_time", type_=DateTime)
+        )
+
+    # Сортировка по времени последнего сообщения и ограничение количества записей
+    return BaseDao._replica(
+        query.order_by(desc(sub_query.c.last_message_time)).limit(
+            bindparam("limit", type_=Integer)
+        )
+    )
+
+
+def _messages_between_users_select(with_cursor: bool, time_bound: bool):
+    current_user_id = bindparam("current_user_id", type_=Uuid)
+    participant_user_id = bindparam("participant_user_id", type_=Uuid)
+    # Основной запрос для получения сообщений между пользователями
+    query = select(
+        Message.id,
+        Message.message_text,
+        Message.sender_id,
+        Message.created_at,
+        Message.attachment_id,
+    ).where(
+        or_(
+            and_(
+                Message.sender_id == current_user_id,
+                Message.recipient_id == participant_user_id,
+            ),
+            and_(
+                Message.sender_id == participant_user_id,
+                Message.recipient_id == current_user_id,
+            ),
+        )
+    )
+
+    # Добавление условий для пагинации: ID упорядочены по времени,
+    # поэтому курсором служит один столбец id
+    if with_cursor:
+        query = query.where(
+            Message.id < bindparam("cursor_message_id", type_=BigInteger)
+        )
+    # Верхняя граница created_at, выведенная из ID курсора, позволяет планировщику
+    # отсечь секции messages за месяцы новее курсора (partition pruning)
+    if time_bound:
+        query = query.where(
+            Message.created_at <= bindparam("cursor_time_bound", type_=DateTime)
+        )
+
+    # Сортировка по ID сообщения и ограничение количества записей
+    return query.order_by(desc(Message.id)).limit(bindparam("limit", type_=Integer))
+
+
+def build_messages_between_users_query(with_cursor: bool, time_bound: bool = False):
+    """
+    Шаблон запроса сообщений между двумя пользователями.
+    Параметры: current_user_id, participant_user_id, limit, (при with_cursor)
+    cursor_message_id и (при time_bound) cursor_time_bound.
+    """
+    return BaseDao._replica(_messages_between_users_select(with_cursor, time_bound))
+
+
+def build_conversation_page_query(with_cursor: bool, time_bound: bool = False):
+    """
+    Шаблон страницы переписки за один запрос: участники (их существование
+    и имена) и страница сообщений. Параметры те же, что у
+    build_messages_between_users_query.
+
+    Каждая найденная строка users соединяется (LEFT JOIN LATERAL) со страницей
+    сообщений, но подзапрос выполняется только для строки текущего пользователя:
+    условие на users.id внутри подзапроса становится однократным фильтром.
+    Результат: по строке на сообщение с данными текущего пользователя
+    (или одна строка с пустыми полями сообщения) и одна строка собеседника.
+    """
+    current_user_id = bindparam("current_user_id", type_=Uuid)
+    participant_user_id = bindparam("participant_user_id", type_=Uuid)
+    page = (
+        _messages_between_users_select(with_cursor, time_bound)
+        .where(User.id == current_user_id)
+        .lateral("page")
+    )
+    return BaseDao._replica(
+        select(
+            User.id.label("user_id"),
+            User.username,
+            page.c.id,
+            page.c.message_text,
+            page.c.sender_id,
+            page.c.created_at,
+            page.c.attachment_id,
+        )
+        .outerjoin(page, true())
+        .where(User.id.in_([current_user_id, participant_user_id]))
+        .order_by(desc(page.c.id).nulls_last())
+    )
+
+
+def build_conversation_export_query():
+    """
+    Шаблон выгрузки всей переписки от новых сообщений к старым.
+    Параметры: user_1_id, user_2_id, after_message_id (выгружаются сообщения
+    с большим ID).
+    """
+    user_1_id = bindparam("user_1_id", type_=Uuid)
+    user_2_id = bindparam("user_2_id", type_=Uuid)
+    query = (
+        select(
+            Message.id,
+            Message.message_text,
+            Message.sender_id,
+            Message.recipient_id,
+            Message.created_at,
+            Message.attachment_id,
+        )
+        .where(
+            or_(
+                and_(Message.sender_id == user_1_id, Message.recipient_id == user_2_id),
+                and_(Message.sender_id == user_2_id, Message.recipient_id == user_1_id),
+            ),
+            Message.id > bindparam("after_message_id", type_=BigInteger),
+        )
+        .order_by(desc(Message.id))
+    )
+    return BaseDao._replica(query)
+
+
+def build_purge_batch_query(
+    cutoff: datetime,
+    batch_size: int,
+    after: Tuple[datetime, int] | None = None,
+    conversation: Tuple[UUID4, UUID4] | None = None,
+):
+    """
+    Ключи (id, created_at) порции сообщений с истёкшим сроком хранения
+    в порядке (created_at, id), см. MessageDAO.purge_batch.
+    """
+    query = select(Message.id, Message.created_at).where(Message.created_at < cutoff)
+    if after is not None:
+        query = query.where(tuple_(Message.created_at, Message.id) > tuple_(*after))
+    if conversation is not None:
+        # Условие в форме индекса ix_messages_sender_id_recipient_id_id:
+        # least/greatest по участникам индексом не покрываются, и каждая порция
+        # просматривала бы все сообщения с истёкшим сроком
+        user_1_id, user_2_id = conversation
+        query = query.where(
+            or_(
+                and_(Message.sender_id == user_1_id, Message.recipient_id == user_2_id),
+                and_(Message.sender_id == user_2_id, Message.recipient_id == user_1_id),
+            )
+        )
+    else:
+        query = query.where(
+            ~exists().where(
+                RetentionPolicy.user_1_id
+                == func.least(Message.sender_id, Message.recipient_id),
+                RetentionPolicy.user_2_id
+                == func.greatest(Message.sender_id, Message.recipient_id),
+            )
+        )
+    return query.order_by(Message.created_at, Message.id).limit(batch_size)
+
+
+CHATS_OF_USER_QUERY = build_chats_of_user_query(with_cursor=False)
+CHATS_OF_USER_CURSOR_QUERY = build_chats_of_user_query(with_cursor=True)
+MESSAGES_BETWEEN_USERS_QUERY = build_messages_between_users_query(with_cursor=False)
+# Курсор с ID из последовательности PostgreSQL (до перехода на snowflake):
+# время из такого ID не извлекается, поэтому граница по created_at не добавляется
+MESSAGES_BETWEEN_USERS_CURSOR_QUERY = build_messages_between_users_query(
+    with_cursor=True
+)
+MESSAGES_BETWEEN_USERS_CURSOR_PRUNED_QUERY = build_messages_between_users_query(
+    with_cursor=True, time_bound=True
+)
+CONVERSATION_PAGE_QUERY = build_conversation_page_query(with_cursor=False)
+CONVERSATION_PAGE_CURSOR_QUERY = build_conversation_page_query(with_cursor=True)
+CONVERSATION_PAGE_CURSOR_PRUNED_QUERY = build_conversation_page_query(
+    with_cursor=True, time_bound=True
+)
+CONVERSATION_EXPORT_QUERY = build_conversation_export_query()
+# Запас на расхождение часов воркеров и времени created_at относительно времени ID
+CURSOR_TIME_SLACK = timedelta(minutes=1)
 
 
 class MessageDAO(BaseDao):
@@ -25,6 +289,7 @@ class MessageDAO(BaseDao):
         current_user_id: UUID4,
         cursor_last_message_time: datetime,
         limit: int = settings.BASE_LIMIT_CHATS_FOR_USER,
+        session: AsyncSession | None = None,
     ):
         """
         Получить чаты текущего пользователя с последними сообщениями.
@@ -35,50 +300,21 @@ class MessageDAO(BaseDao):
         :param current_user_id: UUID текущего пользователя.
         :param cursor_last_message_time: Метка времени для пагинации.
         :param limit: Максимальное количество записей для возврата.
+        :param session: Сессия текущего запроса, если есть.
         :return: Список чатов с данными о пользователе и времени последнего сообщения.
         """
-        async with async_session_maker() as session:
+        async with cls._session(session) as session:
             try:
-                # Подзапрос для получения партнера по чату и времени последнего сообщения
-                sub_query = (
-                    select(
-                        case(
-                            (
-                                cls.model.sender_id == current_user_id,
-                                cls.model.recipient_id,
-                            ),
-                            else_=cls.model.sender_id,
-                        ).label("chat_partner_id"),
-                        func.max(cls.model.created_at).label("last_message_time"),
-                    )
-                    .where(
-                        or_(
-                            cls.model.sender_id == current_user_id,
-                            cls.model.recipient_id == current_user_id,
-                        )
-                    )
-                    .group_by("chat_partner_id")
-                    .subquery()
-                )
-
-                # Основной запрос для получения чатов и информации о пользователе
-                query = select(
-                    sub_query.c.chat_partner_id,
-                    User.username,
-                    sub_query.c.last_message_time,
-                ).join(User, User.id == sub_query.c.chat_partner_id)
-
-                # Добавление фильтра для пагинации
+                # Выбор заранее построенного шаблона в зависимости от наличия курсора
+                params = {"current_user_id": current_user_id, "limit": limit}
                 if cursor_last_message_time:
-                    query = query.where(
-                        sub_query.c.last_message_time < cursor_last_message_time
-                    )
-
-                # Сортировка по времени последнего сообщения и ограничение количества записей
-                query = query.order_by(desc(sub_query.c.last_message_time)).limit(limit)
+                    query = CHATS_OF_USER_CURSOR_QUERY
+                    params["cursor_last_message_time"] = cursor_last_message_time
+                else:
+                    query = CHATS_OF_USER_QUERY
 
                 # Выполнение запроса и возврат результата
-                result = await session.execute(query)
+                result = await session.execute(query, params)
                 chats = result.all()
                 return chats
             except (SQLAlchemyError, Exception) as e:
@@ -91,6 +327,7 @@ class MessageDAO(BaseDao):
                         "cursor_last_message_time": str(cursor_last_message_time),
                         "limit": limit,
                     },
+                    session=session,
                 )
 
     @classmethod
@@ -98,61 +335,46 @@ class MessageDAO(BaseDao):
         cls,
         current_user_id: UUID4,
         participant_user_id: UUID4,
-        cursor_time: datetime | None = None,
         cursor_message_id: int | None = None,
         limit: int = settings.BASE_LIMIT_MESSAGES_FOR_USER,
+        session: AsyncSession | None = None,
     ):
         """
         Получить сообщения между двумя пользователями.
 
         Этот метод возвращает список сообщений между текущим пользователем и другим пользователем,
-        с возможностью пагинации по времени и ID сообщения.
+        от новых к старым, с возможностью пагинации по ID сообщения.
 
         :param current_user_id: UUID текущего пользователя.
         :param participant_user_id: UUID второго участника чата.
-        :param cursor_time: Метка времени для пагинации.
         :param cursor_message_id: ID сообщения для пагинации.
         :param limit: Максимальное количество записей для возврата.
+        :param session: Сессия текущего запроса, если есть.
         :return: Список сообщений с данными о тексте, отправителе и времени создания.
         """
-        async with async_session_maker() as session:
+        async with cls._session(session) as session:
             try:
-                # Основной запрос для получения сообщений между пользователями
-                query = select(
-                    cls.model.id,
-                    cls.model.message_text,
-                    cls.model.sender_id,
-                    cls.model.created_at,
-                ).where(
-                    or_(
-                        and_(
-                            cls.model.sender_id == current_user_id,
-                            cls.model.recipient_id == participant_user_id,
-                        ),
-                        and_(
-                            cls.model.sender_id == participant_user_id,
-                            cls.model.recipient_id == current_user_id,
-                        ),
+                # Выбор заранее построенного шаблона в зависимости от курсора
+                params = {
+                    "current_user_id": current_user_id,
+                    "participant_user_id": participant_user_id,
+                    "limit": limit,
+                }
+                if cursor_message_id is None:
+                    query = MESSAGES_BETWEEN_USERS_QUERY
+                elif is_snowflake(cursor_message_id):
+                    query = MESSAGES_BETWEEN_USERS_CURSOR_PRUNED_QUERY
+                    params.update(
+                        cursor_message_id=cursor_message_id,
+                        cursor_time_bound=timestamp_of(cursor_message_id)
+                        + CURSOR_TIME_SLACK,
                     )
-                )
-
-                # Добавление условий для пагинации
-                if cursor_time and cursor_message_id:
-                    query = query.where(
-                        or_(
-                            cls.model.created_at < cursor_time,
-                            and_(
-                                cls.model.created_at == cursor_time,
-                                cls.model.id < cursor_message_id,
-                            ),
-                        )
-                    )
-
-                # Сортировка по времени создания сообщения и ограничение количества записей
-                query = query.order_by(desc(cls.model.created_at)).limit(limit)
+                else:
+                    query = MESSAGES_BETWEEN_USERS_CURSOR_QUERY
+                    params.update(cursor_message_id=cursor_message_id)
 
                 # Выполнение запроса и возврат результата
-                result = await session.execute(query)
+                result = await session.execute(query, params)
                 messages = result.all()
                 return messages
             except (SQLAlchemyError, Exception) as e:
@@ -163,14 +385,126 @@ class MessageDAO(BaseDao):
                     extra={
                         "current_user_id": current_user_id,
                         "participant_user_id": participant_user_id,
-                        "cursor_time": cursor_time,
                         "cursor_message_id": cursor_message_id,
                         "limit": limit,
                     },
+                    session=session,
                 )
 
     @classmethod
-    async def get_all_users_chats(cls, limit: int, offset: int):
+    async def get_conversation_page(
+        cls,
+        current_user_id: UUID4,
+        participant_user_id: UUID4,
+        cursor_message_id: int | None = None,
+        limit: int = settings.BASE_LIMIT_MESSAGES_FOR_USER,
+        session: AsyncSession | None = None,
+    ) -> Tuple[List[UserShortDTO], list] | None:
+        """
+        Получить участников переписки и страницу сообщений за один запрос.
+
+        :param current_user_id: UUID текущего пользователя.
+        :param participant_user_id: UUID второго участника чата.
+        :param cursor_message_id: ID сообщения для пагинации.
+        :param limit: Максимальное количество сообщений.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Найденные участники (до двух) и сообщения от новых к старым.
+        """
+        async with cls._session(session) as session:
+            try:
+                params = {
+                    "current_user_id": current_user_id,
+                    "participant_user_id": participant_user_id,
+                    "limit": limit,
+                }
+                if cursor_message_id is None:
+                    query = CONVERSATION_PAGE_QUERY
+                elif is_snowflake(cursor_message_id):
+                    query = CONVERSATION_PAGE_CURSOR_PRUNED_QUERY
+                    params.update(
+                        cursor_message_id=cursor_message_id,
+                        cursor_time_bound=timestamp_of(cursor_message_id)
+                        + CURSOR_TIME_SLACK,
+                    )
+                else:
+                    query = CONVERSATION_PAGE_CURSOR_QUERY
+                    params.update(cursor_message_id=cursor_message_id)
+
+                result = await session.execute(query, params)
+                users, messages = {}, []
+                for row in result:
+                    users.setdefault(row.user_id, row.username)
+                    if row.id is not None:
+                        messages.append(row)
+                return [UserShortDTO(*user) for user in users.items()], messages
+            except (SQLAlchemyError, Exception) as e:
+                # Логирование ошибок
+                cls._log_error(
+                    e,
+                    error_message=(
+                        "Не удалось получить страницу переписки, "
+                        f"модель {cls.model.__name__}"
+                    ),
+                    extra={
+                        "current_user_id": current_user_id,
+                        "participant_user_id": participant_user_id,
+                        "cursor_message_id": cursor_message_id,
+                        "limit": limit,
+                    },
+                    session=session,
+                )
+
+    @classmethod
+    async def stream_conversation(
+        cls,
+        user_1_id: UUID4,
+        user_2_id: UUID4,
+        after_message_id: int = 0,
+        fetch_size: int = settings.EXPORT_FETCH_SIZE,
+        session: AsyncSession | None = None,
+    ) -> AsyncIterator[list]:
+        """
+        Читает всю переписку через серверный курсор порциями по fetch_size строк,
+        от новых сообщений к старым. Следующая порция запрашивается, только когда
+        потребитель забрал предыдущую, поэтому память не зависит от длины переписки.
+
+        :param user_1_id: UUID первого участника.
+        :param user_2_id: UUID второго участника.
+        :param after_message_id: Выгружать только сообщения с ID больше этого.
+        :param fetch_size: Количество строк в одной порции.
+        :param session: Сессия выгрузки; курсор живёт в её транзакции.
+        :return: Асинхронный итератор порций строк.
+        """
+        async with cls._session(session) as session:
+            try:
+                result = await session.stream(
+                    CONVERSATION_EXPORT_QUERY,
+                    {
+                        "user_1_id": user_1_id,
+                        "user_2_id": user_2_id,
+                        "after_message_id": after_message_id,
+                    },
+                    execution_options={"yield_per": fetch_size},
+                )
+                async for rows in result.partitions():
+                    yield rows
+            except (SQLAlchemyError, Exception) as e:
+                cls._log_error(
+                    e,
+                    error_message=(
+                        f"Не удалось выгрузить переписку, модель {cls.model.__name__}"
+                    ),
+                    extra={"user_1_id": user_1_id, "user_2_id": user_2_id},
+                    session=session,
+                )
+                # Часть выгрузки уже отправлена, поэтому ошибку нельзя вернуть
+                # кодом ответа: обрыв потока сообщает клиенту о неполной выгрузке
+                raise
+
+    @classmethod
+    async def get_all_users_chats(
+        cls, limit: int, offset: int, session: AsyncSession | None = None
+    ):
         """
         Получить все чаты между пользователями.
 
@@ -179,10 +513,11 @@ class MessageDAO(BaseDao):
 
         :param limit: Максимальное количество записей для возврата.
         :param offset: Смещение для пагинации.
+        :param session: Сессия текущего запроса, если есть.
         :return: Список чатов с данными о пользователях и времени последнего сообщения.
         """
         try:
-            async with async_session_maker() as session:
+            async with cls._session(session) as session:
                 # Создание алиасов для отправителя и получателя
                 sender = aliased(User)
                 recipient = aliased(User)
@@ -219,7 +554,7 @@ class MessageDAO(BaseDao):
                 )
 
                 # Выполнение запроса и возврат результата
-                result = await session.execute(query)
+                result = await session.execute(cls._replica(query))
                 all_chats = result.all()
                 return all_chats
         except (SQLAlchemyError, Exception) as e:
@@ -228,4 +563,431 @@ class MessageDAO(BaseDao):
                 e,
                 error_message=f"Не удалось получить все чаты между пользователями, модель {cls.model.__name__}",
                 extra={"offset": offset, "limit": limit},
+                session=session,
+            )
+
+    @classmethod
+    async def search(
+        cls,
+        query_text: str,
+        user_id: UUID4 | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        order_by_rank: bool = True,
+        cursor_rank: float | None = None,
+        cursor_message_id: int | None = None,
+        limit: int = settings.BASE_LIMIT_MESSAGES_FOR_MODERATOR,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Полнотекстовый поиск по тексту сообщений (GIN-индекс по search_vector).
+
+        Синтаксис запроса — как в поисковых системах (websearch_to_tsquery):
+        слова, "точная фраза", OR и -исключение. Пагинация по ключу:
+        (rank, id) при сортировке по релевантности или id при сортировке по времени.
+        Сортировка по релевантности вычисляет ранг всех совпадений, поэтому для
+        частых слов быстрее сортировка по времени или фильтр по времени, который
+        к тому же отсекает лишние секции messages.
+
+        :param query_text: Поисковый запрос.
+        :param user_id: UUID пользователя — отправителя или получателя сообщений.
+        :param created_from: Нижняя граница времени создания (включительно).
+        :param created_to: Верхняя граница времени создания (не включительно).
+        :param order_by_rank: Сортировать по релевантности, иначе от новых к старым.
+        :param cursor_rank: Ранг последнего сообщения предыдущей страницы.
+        :param cursor_message_id: ID последнего сообщения предыдущей страницы.
+        :param limit: Максимальное количество записей для возврата.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Список найденных сообщений с рангом и именами участников.
+        """
+        async with cls._session(session) as session:
+            try:
+                sender = aliased(User)
+                recipient = aliased(User)
+                ts_query = func.websearch_to_tsquery(
+                    literal_column(f"'{SEARCH_CONFIG}'::regconfig"),
+                    bindparam("query_text", type_=String),
+                )
+                rank = func.ts_rank(Message.search_vector, ts_query, type_=REAL)
+
+                # Набор фильтров зависит от вызова, поэтому запрос строится каждый раз;
+                # значения передаются параметрами, и для каждой комбинации фильтров
+                # скомпилированная форма берётся из кэша компиляции
+                params = {"query_text": query_text, "limit": limit}
+                query = (
+                    select(
+                        Message.id,
+                        Message.message_text,
+                        Message.sender_id,
+                        sender.username.label("sender_username"),
+                        Message.recipient_id,
+                        recipient.username.label("recipient_username"),
+                        Message.created_at,
+                        rank.label("rank"),
+                    )
+                    .join(sender, sender.id == Message.sender_id)
+                    .join(recipient, recipient.id == Message.recipient_id)
+                    .where(Message.search_vector.op("@@")(ts_query))
+                )
+                if user_id is not None:
+                    user = bindparam("user_id", type_=Uuid)
+                    query = query.where(
+                        or_(Message.sender_id == user, Message.recipient_id == user)
+                    )
+                    params["user_id"] = user_id
+                if created_from is not None:
+                    query = query.where(
+                        Message.created_at >= bindparam("created_from", type_=DateTime)
+                    )
+                    params["created_from"] = created_from
+                if created_to is not None:
+                    query = query.where(
+                        Message.created_at < bindparam("created_to", type_=DateTime)
+                    )
+                    params["created_to"] = created_to
+
+                if cursor_message_id is not None:
+                    cursor_id = bindparam("cursor_message_id", type_=BigInteger)
+                    params["cursor_message_id"] = cursor_message_id
+                    if order_by_rank and cursor_rank is not None:
+                        query = query.where(
+                            tuple_(rank, Message.id)
+                            < tuple_(bindparam("cursor_rank", type_=REAL), cursor_id)
+                        )
+                        params["cursor_rank"] = cursor_rank
+                    elif not order_by_rank:
+                        query = query.where(Message.id < cursor_id)
+                        if is_snowflake(cursor_message_id):
+                            # Как и в истории переписки: отсечение секций новее курсора
+                            query = query.where(
+                                Message.created_at
+                                <= bindparam("cursor_time_bound", type_=DateTime)
+                            )
+                            params["cursor_time_bound"] = (
+                                timestamp_of(cursor_message_id) + CURSOR_TIME_SLACK
+                            )
+
+                if order_by_rank:
+                    query = query.order_by(desc("rank"), desc(Message.id))
+                else:
+                    query = query.order_by(desc(Message.id))
+                query = query.limit(bindparam("limit", type_=Integer))
+
+                result = await session.execute(cls._replica(query), params)
+                return result.all()
+            except (SQLAlchemyError, Exception) as e:
+                # Логирование ошибок
+                cls._log_error(
+                    e,
+                    error_message=(
+                        "Не удалось выполнить поиск сообщений, "
+                        f"модель {cls.model.__name__}"
+                    ),
+                    extra={
+                        "query_text": query_text,
+                        "user_id": str(user_id),
+                        "created_from": str(created_from),
+                        "created_to": str(created_to),
+                        "cursor_rank": cursor_rank,
+                        "cursor_message_id": cursor_message_id,
+                        "limit": limit,
+                    },
+                    session=session,
+                )
+
+    @classmethod
+    async def delete_by_keys(
+        cls,
+        keys: List[Tuple[int, datetime]],
+        session: AsyncSession | None = None,
+    ) -> int:
+        """
+        Удаляет сообщения с данными ключами первичного ключа.
+        Ключ включает created_at, поэтому запрос затрагивает только секции
+        этих сообщений. Количество ключей ограничено лимитом параметров
+        запроса (по два параметра на ключ).
+
+        :param keys: Пары (id, created_at) удаляемых сообщений.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Количество удалённых строк.
+        """
+        try:
+            async with cls._transaction(session) as session:
+                query = delete(cls.model).where(
+                    tuple_(cls.model.id, cls.model.created_at).in_(keys)
+                )
+                result = await session.execute(query)
+                return result.rowcount
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    "Не удалось удалить сообщения по ключам, "
+                    f"модель {cls.model.__name__}"
+                ),
+                extra={"keys": len(keys)},
+                session=session,
+            )
+
+    @classmethod
+    async def purge_batch(
+        cls,
+        cutoff: datetime,
+        batch_size: int,
+        after: Tuple[datetime, int] | None = None,
+        conversation: Tuple[UUID4, UUID4] | None = None,
+        statement_timeout_ms: int | None = None,
+        session: AsyncSession | None = None,
+    ) -> Tuple[int, Tuple[datetime, int] | None]:
+        """
+        Удаляет одну порцию сообщений с истёкшим сроком хранения в порядке
+        (created_at, id), продолжая с ключа after (keyset-пагинация).
+
+        Без conversation удаляются сообщения всех переписок, кроме тех,
+        для которых задана собственная политика хранения.
+
+        :param cutoff: Сообщения с created_at < cutoff подлежат удалению.
+        :param batch_size: Максимальное количество удаляемых строк.
+        :param after: Ключ (created_at, id) последней удалённой строки
+            предыдущей порции.
+        :param conversation: Упорядоченная пара участников (user_1_id, user_2_id).
+        :param statement_timeout_ms: Ограничение времени выполнения запроса, мс.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Количество удалённых строк и ключ последней из них.
+        """
+        try:
+            async with cls._transaction(session) as session:
+                if statement_timeout_ms:
+                    # Действует только до конца транзакции порции
+                    await session.execute(
+                        text("SELECT set_config('statement_timeout', :value, true)"),
+                        {"value": str(statement_timeout_ms)},
+                    )
+
+                batch = build_purge_batch_query(
+                    cutoff, batch_size, after=after, conversation=conversation
+                )
+                query = (
+                    delete(cls.model)
+                    .where(tuple_(cls.model.id, cls.model.created_at).in_(batch))
+                    .returning(cls.model.created_at, cls.model.id)
+                )
+                keys = (await session.execute(query)).all()
+                return len(keys), (max(tuple(key) for key in keys) if keys else after)
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    "Не удалось удалить порцию сообщений по сроку хранения, "
+                    f"модель {cls.model.__name__}"
+                ),
+                extra={
+                    "cutoff": str(cutoff),
+                    "batch_size": batch_size,
+                    "after": str(after),
+                    "conversation": str(conversation),
+                },
+                session=session,
+            )
+
+
+class RetentionPolicyDao(BaseDao):
+    """
+    DAO для политик хранения сообщений отдельных переписок.
+    """
+
+    model = RetentionPolicy
+
+    @classmethod
+    async def set_policy(
+        cls,
+        user_1_id: UUID4,
+        user_2_id: UUID4,
+        retention_days: int,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Создаёт или обновляет политику хранения переписки.
+        :return: Сохранённая строка политики, если успешно, иначе None.
+        """
+        user_1_id, user_2_id = sorted((user_1_id, user_2_id), key=str)
+        rows = await cls.upsert_many(
+            [
+                {
+                    "user_1_id": user_1_id,
+                    "user_2_id": user_2_id,
+                    "retention_days": retention_days,
+                }
+            ],
+            index_elements=["user_1_id", "user_2_id"],
+            update_columns=["retention_days"],
+            session=session,
+        )
+        return rows[0] if rows else None
+
+    @classmethod
+    async def delete_policy(
+        cls, user_1_id: UUID4, user_2_id: UUID4, session: AsyncSession | None = None
+    ):
+        """
+        Удаляет политику хранения переписки.
+        :return: Количество удалённых политик (0 или 1), если успешно, иначе None.
+        """
+        user_1_id, user_2_id = sorted((user_1_id, user_2_id), key=str)
+        try:
+            async with cls._transaction(session) as session:
+                result = await session.execute(
+                    delete(cls.model).filter_by(
+                        user_1_id=user_1_id, user_2_id=user_2_id
+                    )
+                )
+                return result.rowcount
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=f"Cannot delete {cls.model.__name__}",
+                extra={"user_1_id": str(user_1_id), "user_2_id": str(user_2_id)},
+                session=session,
+            )
+
+
+class ConversationReadDao(BaseDao):
+    """
+    DAO для счётчиков непрочитанных сообщений и отметок о прочтении.
+    """
+
+    model = ConversationRead
+
+    @classmethod
+    async def increment_unread(
+        cls,
+        user_id: UUID4,
+        partner_id: UUID4,
+        message_id: int,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Увеличивает счётчик непрочитанных сообщений пользователя от собеседника.
+        Вызывается в транзакции вставки сообщения.
+        :param user_id: UUID получателя сообщения.
+        :param partner_id: UUID отправителя сообщения.
+        :param message_id: ID добавленного сообщения.
+        :param session: Сессия текущего кадра WebSocket, если есть.
+        :return: Новое значение счётчика, если успешно, иначе None.
+        """
+        try:
+            async with cls._transaction(session) as session:
+                query = pg_insert(cls.model).values(
+                    user_id=user_id,
+                    partner_id=partner_id,
+                    unread_count=1,
+                    last_message_id=message_id,
+                )
+                query = query.on_conflict_do_update(
+                    index_elements=[cls.model.user_id, cls.model.partner_id],
+                    set_={
+                        "unread_count": cls.model.unread_count + 1,
+                        "last_message_id": query.excluded.last_message_id,
+                    },
+                ).returning(cls.model.unread_count)
+                result = await session.execute(query)
+                return result.scalar_one()
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    f"Cannot increment unread counter, model {cls.model.__name__}"
+                ),
+                extra={"user_id": str(user_id), "partner_id": str(partner_id)},
+                session=session,
+            )
+
+    @classmethod
+    async def mark_read(
+        cls, user_id: UUID4, partner_id: UUID4, session: AsyncSession | None = None
+    ):
+        """
+        Сбрасывает счётчик непрочитанных сообщений и переносит отметку о прочтении
+        на последнее полученное от собеседника сообщение.
+        :param user_id: UUID пользователя, прочитавшего переписку.
+        :param partner_id: UUID собеседника.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Строка с unread_count, last_read_message_id и last_read_at,
+            если успешно, иначе None.
+        """
+        try:
+            async with cls._transaction(session) as session:
+                query = pg_insert(cls.model).values(
+                    user_id=user_id,
+                    partner_id=partner_id,
+                    unread_count=0,
+                    last_read_at=func.timezone("utc", func.now()),
+                )
+                query = query.on_conflict_do_update(
+                    index_elements=[cls.model.user_id, cls.model.partner_id],
+                    set_={
+                        "unread_count": 0,
+                        "last_read_message_id": cls.model.last_message_id,
+                        "last_read_at": query.excluded.last_read_at,
+                    },
+                ).returning(
+                    cls.model.unread_count,
+                    cls.model.last_read_message_id,
+                    cls.model.last_read_at,
+                )
+                result = await session.execute(query)
+                return result.one()
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    f"Cannot mark conversation as read, model {cls.model.__name__}"
+                ),
+                extra={"user_id": str(user_id), "partner_id": str(partner_id)},
+                session=session,
+            )
+
+
+class AttachmentDao(BaseDao):
+    """
+    DAO для вложений.
+    """
+
+    model = Attachment
+
+    @classmethod
+    async def find_accessible(
+        cls,
+        attachment_id: UUID4,
+        user_id: UUID4,
+        session: AsyncSession | None = None,
+    ) -> Attachment | None:
+        """
+        Находит вложение, доступное пользователю: загруженное им самим
+        или приложенное к сообщению переписки, в которой он участвует.
+        :param attachment_id: ID вложения.
+        :param user_id: UUID пользователя.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Вложение или None, если его нет или оно недоступно.
+        """
+        try:
+            async with cls._session(session) as session:
+                in_conversation = exists().where(
+                    Message.attachment_id == cls.model.id,
+                    or_(Message.sender_id == user_id, Message.recipient_id == user_id),
+                )
+                query = select(cls.model).where(
+                    cls.model.id == attachment_id,
+                    or_(cls.model.uploader_id == user_id, in_conversation),
+                )
+                result = await session.execute(query)
+                return result.scalar_one_or_none()
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    f"Не удалось получить вложение, модель {cls.model.__name__}"
+                ),
+                extra={"attachment_id": str(attachment_id), "user_id": str(user_id)},
+                session=session,
             )
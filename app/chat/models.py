@@ -1,24 +1,78 @@
+import uuid
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import UUID, DateTime, ForeignKey, String
+from sqlalchemy import (
+    DDL,
+    UUID,
+    BigInteger,
+    Computed,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    UniqueConstraint,
+    event,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
+from app.core.snowflake import message_created_at, next_message_id
 
 if TYPE_CHECKING:
     from app.auth.models import User
 
 
+# Конфигурация текстового поиска для столбца messages.search_vector и запросов к нему
+SEARCH_CONFIG = "simple"
+
+
 class Message(Base):
     __tablename__ = "messages"
+    # Таблица секционирована по месяцам created_at (см. app/chat/partitions.py)
+    __table_args__ = (
+        # Курсор истории переписки — один столбец id
+        Index(
+            "ix_messages_sender_id_recipient_id_id", "sender_id", "recipient_id", "id"
+        ),
+        # Полнотекстовый поиск модератора (MessageDAO.search)
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        # Проверка доступа к вложению (AttachmentDao.find_accessible)
+        Index(
+            "ix_messages_attachment_id",
+            "attachment_id",
+            postgresql_where=text("attachment_id IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    # Упорядоченный по времени 64-битный ID выдаётся воркером (app/core/snowflake.py).
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования
+    id: Mapped[int] = mapped_column(
+        BigInteger,
+        primary_key=True,
+        autoincrement=False,
+        default=next_message_id,
+        index=True,
+    )
     message_text: Mapped[str] = mapped_column(String(4096))
     sender_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), index=True)
     recipient_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), index=True)
+    # Время всегда берётся из ID: одинаковые ID попадают в одну секцию
+    # и отклоняются первичным ключом (уникальный индекс только по id
+    # секционированная таблица иметь не может)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, index=True
+        DateTime, default=message_created_at, primary_key=True, index=True
+    )
+    attachment_id: Mapped[UUID | None] = mapped_column(ForeignKey("attachments.id"))
+    # Вычисляемый столбец для полнотекстового поиска; конфигурация simple
+    # не зависит от языка (в переписке встречаются русский и английский)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', message_text)", persisted=True),
+        deferred=True,
     )
 
     # Связь с отправителем
@@ -33,3 +87,84 @@ class Message(Base):
 
     def __repr__(self):
         return f"Message(id={self.id}, sender_id={self.sender_id}, recipient_id={self.recipient_id})"
+
+
+class Attachment(Base):
+    """
+    Загруженный пользователем файл. Содержимое хранится в AttachmentStore
+    под своим SHA-256, поэтому одинаковые файлы занимают место на диске один раз.
+    """
+
+    __tablename__ = "attachments"
+
+    id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    content_type: Mapped[str] = mapped_column(String(255))
+    filename: Mapped[str] = mapped_column(String(255))
+    uploader_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"Attachment(id={self.id}, sha256={self.sha256}, size={self.size})"
+
+
+class RetentionPolicy(Base):
+    """
+    Срок хранения сообщений отдельной переписки.
+    Переопределяет глобальный срок MESSAGES_RETENTION_DAYS в обе стороны.
+    Участники хранятся упорядоченно: user_1_id < user_2_id.
+    """
+
+    __tablename__ = "retention_policies"
+    __table_args__ = (UniqueConstraint("user_1_id", "user_2_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_1_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    user_2_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    retention_days: Mapped[int]
+
+    def __repr__(self):
+        return (
+            f"RetentionPolicy(user_1_id={self.user_1_id}, user_2_id={self.user_2_id}, "
+            f"retention_days={self.retention_days})"
+        )
+
+
+class ConversationRead(Base):
+    """
+    Счётчик непрочитанных сообщений и отметка о прочтении для пары
+    (пользователь, собеседник). Счётчик увеличивается в транзакции вставки
+    сообщения и сбрасывается при отметке о прочтении.
+    """
+
+    __tablename__ = "conversation_reads"
+
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    partner_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    unread_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Последнее полученное от собеседника сообщение
+    last_message_id: Mapped[int | None] = mapped_column(BigInteger)
+    # Последнее прочитанное сообщение и время отметки о прочтении
+    last_read_message_id: Mapped[int | None] = mapped_column(BigInteger)
+    last_read_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    def __repr__(self):
+        return (
+            f"ConversationRead(user_id={self.user_id}, partner_id={self.partner_id}, "
+            f"unread_count={self.unread_count})"
+        )
+
+
+# Секция по умолчанию принимает строки, для месяца которых ещё нет секции.
+# Нужна при создании схемы через metadata.create_all (например, в тестах),
+# в рабочей базе её создаёт миграция.
+event.listen(
+    Message.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,240 @@
+"""
+Обслуживание помесячных секций таблицы messages.
+
+Создание секций наперёд и отсоединение старых месяцев:
+
+    python -m app.chat.partitions ensure --ahead 3
+    python -m app.chat.partitions list
+    python -m app.chat.partitions detach 2024-10
+"""
+
+import argparse
+import asyncio
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.chat.models import Message
+from app.core.config import settings
+from app.core.database import engine
+from app.core.logger import logger
+
+PARENT_TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+# Ключ advisory-блокировки, чтобы воркеры не создавали секции одновременно
+PARTITIONS_LOCK_KEY = 0x6D657373
+# Сколько отсоединение секции ждёт блокировку messages, мс
+DETACH_LOCK_TIMEOUT_MS = 5000
+# Хранимые столбцы messages (вычисляемые PostgreSQL заполняет сам)
+MESSAGE_COLUMNS = ", ".join(
+    column.name for column in Message.__table__.columns if column.computed is None
+)
+
+
+def month_start(value: date) -> date:
+    """
+    Первое число месяца, к которому относится дата.
+    """
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """
+    Первое число месяца, отстоящего от value на months месяцев.
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """
+    Имя секции месяца, например messages_y2024m10.
+    """
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+async def _create_partition(connection: AsyncConnection, month: date) -> bool:
+    """
+    Создаёт секцию месяца, если её ещё нет.
+    Строки этого месяца, уже попавшие в секцию по умолчанию, переносятся в новую
+    секцию: иначе PostgreSQL не позволит её создать.
+    :return: True, если секция была создана.
+    """
+    name = partition_name(month)
+    exists = await connection.scalar(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    )
+    if exists:
+        return False
+
+    lower, upper = month, add_months(month, 1)
+    bounds = f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    params = {
+        "lower": datetime(lower.year, lower.month, 1),
+        "upper": datetime(upper.year, upper.month, 1),
+    }
+    in_default = await connection.scalar(
+        text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            "WHERE created_at >= :lower AND created_at < :upper)"
+        ),
+        params,
+    )
+    if not in_default:
+        await connection.execute(
+            text(f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} {bounds}")
+        )
+        return True
+
+    # Секция создаётся отдельной таблицей, заполняется и присоединяется
+    await connection.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {PARENT_TABLE} "
+            "INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"
+        )
+    )
+    # Вычисляемые столбцы (search_vector) не переносятся, а пересчитываются
+    await connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE created_at >= :lower AND created_at < :upper RETURNING *) "
+            f"INSERT INTO {name} ({MESSAGE_COLUMNS}) "
+            f"SELECT {MESSAGE_COLUMNS} FROM moved"
+        ),
+        params,
+    )
+    await connection.execute(
+        text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} {bounds}")
+    )
+    return True
+
+
+async def ensure_partitions(first: date, last: date) -> List[str]:
+    """
+    Создаёт недостающие секции для всех месяцев от first до last включительно.
+    :param first: Любая дата первого месяца.
+    :param last: Любая дата последнего месяца.
+    :return: Имена созданных секций.
+    """
+    created = []
+    async with engine.begin() as connection:
+        await connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITIONS_LOCK_KEY}
+        )
+        month, last = month_start(first), month_start(last)
+        while month <= last:
+            if await _create_partition(connection, month):
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    if created:
+        logger.info("Message partitions have been created", extra={"created": created})
+    return created
+
+
+async def ensure_future_partitions(
+    months_ahead: int = settings.MESSAGES_PARTITIONS_AHEAD,
+) -> List[str]:
+    """
+    Создаёт секции для текущего месяца и months_ahead следующих.
+    :param months_ahead: Количество месяцев вперёд.
+    :return: Имена созданных секций.
+    """
+    current = month_start(datetime.utcnow().date())
+    return await ensure_partitions(current, add_months(current, months_ahead))
+
+
+async def list_partitions() -> List[dict]:
+    """
+    Возвращает секции таблицы messages с их границами.
+    """
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT child.relname AS name, "
+                "pg_get_expr(child.relpartbound, child.oid) AS bounds "
+                "FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :parent ORDER BY child.relname"
+            ),
+            {"parent": PARENT_TABLE},
+        )
+        return [dict(row._mapping) for row in result]
+
+
+async def detach_partition(
+    month: date, lock_timeout_ms: int = DETACH_LOCK_TIMEOUT_MS
+) -> str:
+    """
+    Отсоединяет секцию месяца от messages. Данные остаются в отдельной таблице,
+    которую можно выгрузить в архив или удалить целиком (DROP TABLE).
+
+    У messages есть секция по умолчанию, а с ней PostgreSQL не допускает
+    DETACH ... CONCURRENTLY. Обычный DETACH меняет только каталог и выполняется
+    быстро, но под эксклюзивной блокировкой messages. Чтобы ожидание этой
+    блокировки за долгими запросами не останавливало запись в таблицу, оно
+    ограничено lock_timeout: при превышении операция завершается ошибкой,
+    ничего не меняя, и её можно повторить.
+    :param month: Любая дата нужного месяца.
+    :param lock_timeout_ms: Сколько ждать блокировку messages, мс.
+    :return: Имя отсоединённой таблицы.
+    """
+    name = partition_name(month_start(month))
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+        )
+        await connection.execute(
+            text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+        )
+    logger.info("Message partition has been detached", extra={"partition": name})
+    return name
+
+
+async def run_partition_maintenance(interval: float):
+    """
+    Фоновая задача: периодически создаёт недостающие будущие секции.
+    :param interval: Интервал между проверками в секундах.
+    """
+    while True:
+        try:
+            await ensure_future_partitions()
+        except Exception as e:
+            logger.error(
+                "Message partition maintenance failed", extra={"error": str(e)}
+            )
+        await asyncio.sleep(interval)
+
+
+async def main(args: argparse.Namespace):
+    try:
+        if args.command == "ensure":
+            print(await ensure_future_partitions(args.ahead))
+        elif args.command == "list":
+            for partition in await list_partitions():
+                print(f"{partition['name']:<24} {partition['bounds']}")
+        elif args.command == "detach":
+            month = datetime.strptime(args.month, "%Y-%m").date()
+            print(await detach_partition(month, args.lock_timeout_ms))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="messages partition maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure", help="Создать будущие секции")
+    ensure.add_argument("--ahead", type=int, default=settings.MESSAGES_PARTITIONS_AHEAD)
+    commands.add_parser("list", help="Показать секции")
+    detach = commands.add_parser("detach", help="Отсоединить секцию месяца")
+    detach.add_argument("month", help="Месяц в формате YYYY-MM")
+    detach.add_argument(
+        "--lock-timeout-ms",
+        type=int,
+        default=DETACH_LOCK_TIMEOUT_MS,
+        help="Сколько ждать блокировку messages, мс",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,213 @@
+"""
+Удаление сообщений с истёкшим сроком хранения.
+
+Глобальный срок задаётся MESSAGES_RETENTION_DAYS, для отдельных переписок
+его переопределяют политики хранения (таблица retention_policies).
+Удаление идёт небольшими порциями в порядке (created_at, id), каждая порция —
+отдельная короткая транзакция с ограничением statement_timeout, между порциями
+делается пауза. Так задание не держит долгих блокировок и не создаёт всплесков WAL.
+После базы те же сроки применяются к сегментам холодного архива (app.chat.archive).
+
+    python -m app.chat.retention
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.chat.archive import conversation_key, purge_segments
+from app.chat.cache import publish_history_pages_changed
+from app.chat.dao import MessageDAO, RetentionPolicyDao
+from app.core.config import settings
+from app.core.database import engine, session_scope
+from app.core.exceptions import QueryTimeoutException
+from app.core.logger import logger
+
+# Ключ advisory-блокировки: задание выполняет только один воркер одновременно
+RETENTION_LOCK_KEY = 0x72657465
+# Как часто (в порциях) писать в лог промежуточный прогресс
+PROGRESS_EVERY_BATCHES = 50
+
+
+class RetentionStats:
+    """
+    Прогресс текущего и итоги последнего прохода задания в этом воркере.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.running = False
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.deleted = 0
+        self.archive_deleted = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.errors = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.deleted / self.seconds, 1) if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "deleted": self.deleted,
+            "archive_deleted": self.archive_deleted,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": self.rows_per_second,
+            "errors": self.errors,
+        }
+
+
+retention_stats = RetentionStats()
+
+
+async def _purge(
+    stats: RetentionStats,
+    started: float,
+    retention_days: int,
+    conversation: tuple | None = None,
+) -> int:
+    """
+    Удаляет порциями все сообщения старше retention_days дней
+    (одной переписки или всех переписок без собственной политики).
+    :return: Количество удалённых строк.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    after, deleted = None, 0
+    while True:
+        try:
+            result = await MessageDAO.purge_batch(
+                cutoff,
+                settings.RETENTION_BATCH_SIZE,
+                after=after,
+                conversation=conversation,
+                statement_timeout_ms=settings.RETENTION_STATEMENT_TIMEOUT_MS,
+            )
+        except QueryTimeoutException:
+            # Порция не уложилась в statement_timeout; следующий проход продолжит
+            result = None
+        if result is None:
+            # Ошибка уже залогирована в DAO
+            stats.errors += 1
+            return deleted
+        count, after = result
+        if not count:
+            return deleted
+
+        deleted += count
+        stats.deleted += count
+        stats.batches += 1
+        stats.seconds = time.perf_counter() - started
+        if stats.batches % PROGRESS_EVERY_BATCHES == 0:
+            logger.info(
+                "Retention purge progress",
+                extra={
+                    "deleted": stats.deleted,
+                    "batches": stats.batches,
+                    "rows_per_second": stats.rows_per_second,
+                },
+            )
+        await asyncio.sleep(settings.RETENTION_BATCH_SLEEP)
+
+
+async def _purge_archive(stats: RetentionStats, policies: list):
+    """
+    Удаляет сообщения с истёкшим сроком хранения из сегментов архива.
+    """
+    now = datetime.utcnow()
+    default_cutoff = None
+    if settings.MESSAGES_RETENTION_DAYS is not None:
+        default_cutoff = now - timedelta(days=settings.MESSAGES_RETENTION_DAYS)
+    cutoffs = {}
+    for policy in policies:
+        key = conversation_key(policy.user_1_id, policy.user_2_id)
+        cutoffs[key] = now - timedelta(days=policy.retention_days)
+    try:
+        stats.archive_deleted = await asyncio.to_thread(
+            purge_segments, settings.ARCHIVE_DIR, default_cutoff, cutoffs
+        )
+    except OSError as e:
+        stats.errors += 1
+        logger.error("Archive retention purge failed", extra={"error": str(e)})
+
+
+async def purge_expired_messages(stats: RetentionStats = retention_stats) -> int:
+    """
+    Один проход задания: глобальный срок и все политики переписок,
+    сначала в базе, затем в сегментах архива.
+    :return: Количество удалённых из базы сообщений.
+    """
+    stats.reset()
+    stats.running = True
+    stats.started_at = datetime.utcnow()
+    started = time.perf_counter()
+    try:
+        if settings.MESSAGES_RETENTION_DAYS is not None:
+            await _purge(stats, started, settings.MESSAGES_RETENTION_DAYS)
+        policies = await RetentionPolicyDao.find_all() or []
+        for policy in policies:
+            await _purge(
+                stats,
+                started,
+                policy.retention_days,
+                conversation=(policy.user_1_id, policy.user_2_id),
+            )
+        await _purge_archive(stats, policies)
+    finally:
+        if stats.deleted or stats.archive_deleted:
+            # Закэшированные воркерами страницы истории могли устареть
+            async with session_scope() as session:
+                await publish_history_pages_changed(session)
+        stats.running = False
+        stats.finished_at = datetime.utcnow()
+        stats.seconds = time.perf_counter() - started
+    logger.info("Retention purge finished", extra=stats.as_dict())
+    return stats.deleted
+
+
+async def run_retention(interval: float):
+    """
+    Фоновая задача: периодически удаляет сообщения с истёкшим сроком хранения.
+    Проход выполняет только воркер, получивший advisory-блокировку.
+    :param interval: Интервал между проходами в секундах.
+    """
+    while True:
+        try:
+            async with engine.connect() as connection:
+                locked = await connection.scalar(
+                    text("SELECT pg_try_advisory_lock(:key)"),
+                    {"key": RETENTION_LOCK_KEY},
+                )
+                await connection.commit()
+                if locked:
+                    try:
+                        await purge_expired_messages()
+                    finally:
+                        await connection.execute(
+                            text("SELECT pg_advisory_unlock(:key)"),
+                            {"key": RETENTION_LOCK_KEY},
+                        )
+                        await connection.commit()
+        except Exception as e:
+            logger.error("Retention purge failed", extra={"error": str(e)})
+        await asyncio.sleep(interval)
+
+
+async def main():
+    try:
+        print(await purge_expired_messages())
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
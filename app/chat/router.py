@@ -1,31 +1,60 @@
+import asyncio
 from datetime import datetime
 
 from fastapi import (
     APIRouter,
     Depends,
+    Header,
     Query,
+    Request,
+    Response,
     WebSocket,
     WebSocketDisconnect,
+    status,
 )
+from fastapi.responses import FileResponse
 from pydantic import UUID4, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.dependencies import get_current_user, get_current_user_websocket
+from app.auth.dependencies import (
+    get_current_payload,
+    get_current_user,
+    get_current_user_websocket,
+)
 from app.auth.models import User
-from app.chat.services import ChatService
+from app.chat.cache import (
+    chat_list_cache,
+    etag_matches,
+    history_page_cache,
+    make_etag,
+)
+from app.chat.services import AttachmentService, ChatService
 from app.chat.shemas import (
     IncomingWebSocketMessage,
+    SAttachment,
     SChats,
     SGetMessagesBetweenUsersResponse,
+    SMarkReadFrame,
+    SMarkReadResponse,
     SSearchByUsernameResponse,
     SWebsocketMessage,
 )
 from app.chat.websocket import manager
 from app.core.config import settings
+from app.core.database import get_session, query_budget, session_scope
 from app.core.exceptions import (
+    AttachmentNotFoundException,
     OneUserIdNotFoundException,
+    QueryTimeoutException,
+    SenderThrottledException,
+    UserMessagesBetweenSameException,
     UserMessagesBetweenYourselfException,
 )
 from app.core.logger import logger
+from app.core.responses import json_response, render_model
+from app.core.snowflake import next_message_id, timestamp_of
+from app.moderation.flood import flood_detector
+from app.moderation.screening import ScreenedMessage, screener
 
 router = APIRouter(
     prefix="/chat",
@@ -33,10 +62,15 @@ router = APIRouter(
 )
 
 
-@router.get("/messages/", response_model=SChats)
+@router.get(
+    "/messages/",
+    response_model=SChats,
+    dependencies=[Depends(query_budget(settings.QUERY_BUDGET_CHATS_MS))],
+)
 async def get_chats(
     cursor_last_message_time: datetime = Query(default=None),
     current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Получение списка чатов текущего пользователя.
@@ -46,42 +80,198 @@ async def get_chats(
 
     Возвращает список чатов с последними сообщениями.
     """
-    return await ChatService.get_all_chats_for_user(
-        current_user.id, cursor_last_message_time
+    chats = await ChatService.get_all_chats_for_user(
+        current_user.id, cursor_last_message_time, session=session
+    )
+    return json_response(SChats, chats)
+
+
+def history_page_headers(etag: str, settled: bool) -> dict:
+    """
+    Заголовки кэширования страницы истории. Устоявшиеся страницы клиент может
+    хранить HISTORY_PAGE_MAX_AGE секунд, остальные — только перепроверять по ETag.
+    Устоявшиеся страницы не помечаются immutable: задание хранения и архивация
+    удаляют из них сообщения.
+    """
+    cache_control = (
+        f"private, max-age={settings.HISTORY_PAGE_MAX_AGE}"
+        if settled
+        else "private, no-cache"
     )
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
 
 
-@router.get("/messages/{partner_id}/", response_model=SGetMessagesBetweenUsersResponse)
+@router.get(
+    "/messages/{partner_id}/",
+    response_model=SGetMessagesBetweenUsersResponse,
+    responses={304: {"description": "Страница не изменилась (If-None-Match)"}},
+    dependencies=[Depends(query_budget(settings.QUERY_BUDGET_CHATS_MS))],
+)
 async def get_messages_between_users(
     partner_id: UUID4,
-    cursor_time: datetime = Query(default=None),
+    cursor_time: datetime = Query(default=None, deprecated=True),
     cursor_message_id: int = Query(default=None),
+    if_none_match: str | None = Header(default=None),
     current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Получение списка сообщений между текущим пользователем и другим пользователем.
 
     - **partner_id**: (UUID4, обязательный) UUID другого пользователя.
-    - **cursor_time**: (datetime, optional) Метка времени для пагинации сообщений.
+    - **cursor_time**: (datetime, optional) Устарел и не учитывается:
+      ID сообщений упорядочены по времени.
     - **cursor_message_id**: (int, optional) ID сообщения для пагинации.
-    - **current_user**: (User, обязательный) Проверяет пользователя на аутентификацию.
+    - **If-None-Match**: (заголовок, optional) ETag ранее полученной страницы.
 
     Возвращает сообщения между пользователями и информацию о пагинации.
+    Страницы с курсором старше HISTORY_PAGE_SETTLE_SECONDS не меняются от новых
+    сообщений и отдаются со строгим ETag и Cache-Control с max-age; при
+    совпадении ETag возвращается 304. Пользователь (в том числе его блокировка)
+    проверяется до обращения к кэшу, поэтому 304 без действующего доступа
+    не отдаётся.
+    """
+    settled = history_page_cache.is_settled(cursor_message_id)
+    key = (current_user.id, partner_id, cursor_message_id)
+    cached = history_page_cache.get(key) if settled else None
+    # Страница уже у клиента: ответ 304 даётся без чтения переписки
+    if cached is not None and etag_matches(if_none_match, cached.etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=history_page_headers(cached.etag, settled),
+        )
+
+    if cached is not None:
+        etag, body = cached.etag, cached.body
+    else:
+        generation = history_page_cache.begin_fill()
+        page = await ChatService.get_messages_between_users(
+            user_1_id=current_user.id,
+            user_2_id=partner_id,
+            cursor_message_id=cursor_message_id,
+            session=session,
+        )
+        body = render_model(SGetMessagesBetweenUsersResponse, page)
+        etag = make_etag(body)
+        if settled:
+            history_page_cache.put(key, etag, body, generation)
+
+    headers = history_page_headers(etag, settled)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post("/messages/{partner_id}/read/", response_model=SMarkReadResponse)
+async def mark_read(
+    partner_id: UUID4,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Отметка переписки с другим пользователем как прочитанной.
+
+    - **partner_id**: (UUID4, обязательный) UUID другого пользователя.
+    - **current_user**: (User, обязательный) Проверяет пользователя на аутентификацию.
+
+    Обнуляет счётчик непрочитанных сообщений и возвращает отметку о прочтении.
+    """
+    return await ChatService.mark_read(current_user.id, partner_id, session=session)
+
+
+@router.post(
+    "/attachments/",
+    status_code=status.HTTP_201_CREATED,
+    response_model=SAttachment,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary"}
+                }
+            },
+        }
+    },
+)
+async def upload_attachment(
+    request: Request,
+    filename: str = Query(min_length=1, max_length=255),
+    payload: dict = Depends(get_current_payload),
+):
     """
-    return await ChatService.get_messages_between_users(
-        user_1_id=current_user.id,
-        user_2_id=partner_id,
-        cursor_time=cursor_time,
-        cursor_message_id=cursor_message_id,
+    Загрузка вложения. Тело запроса — содержимое файла как есть (не multipart),
+    Content-Type запроса сохраняется как тип вложения.
+
+    - **filename**: (str, обязательный) Имя файла.
+
+    Тело пишется на диск по мере получения и не держится в памяти целиком;
+    файлы больше ATTACHMENT_MAX_SIZE отклоняются с кодом 413. Возвращает
+    вложение, ID которого передаётся в поле attachment_id сообщения.
+    """
+    # Пользователь проверяется в короткой сессии до чтения тела: загрузка
+    # может длиться долго и не должна держать соединение пула
+    async with session_scope(settings.QUERY_BUDGET_MS) as session:
+        current_user = await get_current_user(payload=payload, session=session)
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    content_length = request.headers.get("content-length", "")
+    return await AttachmentService.upload(
+        uploader_id=current_user.id,
+        filename=filename,
+        content_type=content_type[:255],
+        content_length=int(content_length) if content_length.isdigit() else None,
+        chunks=request.stream(),
     )
 
 
-@router.get("/users/", response_model=SSearchByUsernameResponse)
+@router.get(
+    "/attachments/{attachment_id}/",
+    response_class=FileResponse,
+    responses={200: {"content": {"application/octet-stream": {}}}},
+)
+async def download_attachment(
+    attachment_id: UUID4,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Скачивание вложения.
+
+    - **attachment_id**: (UUID4, обязательный) UUID вложения.
+    - **current_user**: (User, обязательный) Проверяет пользователя на аутентификацию.
+
+    Вложение доступно загрузившему его пользователю, участникам переписок,
+    в которых оно отправлено, и модераторам. Поддерживаются запросы части
+    файла (Range). Содержимое неизменно, поэтому кэшируется клиентом надолго.
+    """
+    attachment, path = await AttachmentService.get_for_download(
+        attachment_id,
+        current_user.id,
+        moder_flag=current_user.is_moderator,
+        session=session,
+    )
+    return FileResponse(
+        path,
+        media_type=attachment.content_type,
+        filename=attachment.filename,
+        headers={
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+
+@router.get(
+    "/users/",
+    response_model=SSearchByUsernameResponse,
+    dependencies=[Depends(query_budget(settings.QUERY_BUDGET_USERS_SEARCH_MS))],
+)
 async def search_by_username(
     username: str = Query(min_length=1),
     limit: int = Query(settings.BASE_LIMIT_USERS_SEARCH, gt=0),
     offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Поиск пользователей по имени.
@@ -93,9 +283,10 @@ async def search_by_username(
 
     Возвращает список найденных пользователей и информацию о пагинации.
     """
-    return await ChatService.find_users_by_username(
-        username=username, limit=limit, offset=offset
+    users = await ChatService.find_users_by_username(
+        username=username, limit=limit, offset=offset, session=session
     )
+    return json_response(SSearchByUsernameResponse, users)
 
 
 @router.websocket("/ws/")
@@ -115,6 +306,36 @@ async def websocket_endpoint(websocket: WebSocket):
 
         while True:
             data = await websocket.receive_json()
+            # Соединение закрыто менеджером с кодом закрытия (пользователь
+            # заблокирован или подключился заново): кадр уже не обрабатывается
+            if manager.active_connections.get(current_user.id) is not websocket:
+                break
+
+            # Кадр отметки переписки как прочитанной
+            if isinstance(data, dict) and data.get("type") == "mark_read":
+                try:
+                    frame = SMarkReadFrame(**data)
+                    async with session_scope(settings.QUERY_BUDGET_MS) as session:
+                        read = await ChatService.mark_read(
+                            current_user.id, frame.partner_id, session=session
+                        )
+                except ValidationError as e:
+                    await websocket.send_json({"detail": e.errors()})
+                    continue
+                except (
+                    UserMessagesBetweenSameException,
+                    OneUserIdNotFoundException,
+                    QueryTimeoutException,
+                ) as e:
+                    await websocket.send_json({"detail": e.detail})
+                    continue
+                await websocket.send_json(
+                    {
+                        "type": "mark_read",
+                        "data": SMarkReadResponse(**read).model_dump(mode="json"),
+                    }
+                )
+                continue
 
             try:
                 incoming_message = IncomingWebSocketMessage(**data)
@@ -127,30 +348,98 @@ async def websocket_endpoint(websocket: WebSocket):
                 await websocket.send_json({"detail": "Incorrect data."})
                 continue
 
-            try:
-                message_data = SWebsocketMessage(**incoming_message.dict())
-                await ChatService.add_message(message_data, current_user.id)
-            except UserMessagesBetweenYourselfException as e:
-                await websocket.send_json({"detail": e.detail})
+            # ID выдаётся до вставки, поэтому получатель уведомляется
+            # параллельно с записью в базу, а не после неё
+            message_id = next_message_id()
+            message_data = SWebsocketMessage(
+                **incoming_message.dict(),
+                id=message_id,
+                created_at=timestamp_of(message_id),
+            )
+            if message_data.recipient_id == current_user.id:
+                await websocket.send_json(
+                    {"detail": UserMessagesBetweenYourselfException.detail}
+                )
                 continue
-            except OneUserIdNotFoundException as e:
-                await websocket.send_json({"detail": e.detail})
+
+            # Массовая рассылка: решение принимается по окнам в памяти воркера
+            verdict = flood_detector.check(
+                current_user.id,
+                message_data.recipient_id,
+                message_data.message_text,
+            )
+            if verdict.throttled:
+                await websocket.send_json({"detail": SenderThrottledException.detail})
                 continue
 
-            # Добавление сообщения в базу данных через сервис
-            await ChatService.add_message(message_data, current_user.id)
+            async def store_message():
+                # Одна сессия и одна транзакция на кадр
+                async with session_scope(settings.QUERY_BUDGET_MS) as session:
+                    return await ChatService.add_message(
+                        message_data, current_user.id, session=session
+                    )
+
+            result, _ = await asyncio.gather(
+                store_message(),
+                manager.notify_user_about_new_message(
+                    message_data, sender_id=current_user.id
+                ),
+                return_exceptions=True,
+            )
+            if isinstance(result, BaseException):
+                # Получатель уже видел сообщение: отзываем его
+                await manager.notify_message_retracted(
+                    message_data, sender_id=current_user.id
+                )
+                if isinstance(
+                    result,
+                    (
+                        OneUserIdNotFoundException,
+                        AttachmentNotFoundException,
+                        QueryTimeoutException,
+                    ),
+                ):
+                    await websocket.send_json({"detail": result.detail})
+                    continue
+                raise result
+
+            # Подтверждение отправителю: сообщение сохранено под этим ID
+            await websocket.send_json(
+                {
+                    "type": "message_ack",
+                    "data": {
+                        "message_id": str(message_id),
+                        "created_at": str(message_data.created_at),
+                    },
+                }
+            )
 
-            # Уведомление получателя о новом сообщении
-            await manager.notify_user_about_new_message(
-                message_data, sender_id=current_user.id
+            # Автоматическая проверка содержимого: только постановка в очередь
+            screener.submit(
+                ScreenedMessage(
+                    message_id,
+                    current_user.id,
+                    message_data.recipient_id,
+                    message_data.message_text,
+                    message_data.created_at,
+                    verdict.flags,
+                )
             )
 
-            # Уведомление об обновлении списка чатов
+            # Обновление закэшированных списков чатов и уведомление о нём
+            chat_list_cache.message_sent(
+                current_user.id,
+                current_user.username,
+                message_data.recipient_id,
+                message_data.created_at,
+                result["unread_count"],
+            )
             await manager.notify_chat_list_update(
                 current_user_id=current_user.id,
                 partner_id=message_data.recipient_id,
                 last_message_time=message_data.created_at,
+                partner_unread_count=result["unread_count"],
             )
 
     except WebSocketDisconnect:
-        await manager.disconnect(current_user.id)
+        await manager.disconnect(current_user.id, websocket)
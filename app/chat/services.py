@@ -1,18 +1,48 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator
 
 from pydantic import UUID4
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dao import UsersDao
-from app.chat.dao import MessageDAO
+from app.chat.archive import archive_store, encode_message
+from app.chat.attachments import attachment_store
+from app.chat.cache import chat_list_cache, publish_chat_list_changed
+from app.chat.dao import (
+    AttachmentDao,
+    ConversationReadDao,
+    MessageDAO,
+    RetentionPolicyDao,
+)
 from app.chat.shemas import SWebsocketMessage
+from app.core.config import settings
+from app.core.database import session_scope
 from app.core.exceptions import (
+    AttachmentNotFoundException,
+    AttachmentTooLargeException,
     OneUserIdNotFoundException,
+    RetentionPolicyNotFoundException,
+    UserIsNotPresentException,
     UserMessagesBetweenSameException,
     UserMessagesBetweenYourselfException,
     UserSearchNotFoundException,
     UsersIdNotFoundException,
 )
+from app.core.logger import logger
+from app.core.routing import stick_to_primary
+from app.core.snowflake import timestamp_of
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    """
+    Приводит время с часовым поясом к UTC без пояса, как created_at в базе.
+    """
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 class ChatService:
@@ -23,18 +53,44 @@ class ChatService:
 
     @staticmethod
     async def get_all_chats_for_user(
-        current_user_id: UUID4, cursor_last_message_time: datetime
+        current_user_id: UUID4,
+        cursor_last_message_time: datetime,
+        session: AsyncSession | None = None,
     ):
         """
         Получить список всех чатов для текущего пользователя с последними сообщениями.
 
         :param current_user_id: UUID текущего пользователя.
         :param cursor_last_message_time: Метка времени для пагинации.
+        :param session: Сессия текущего запроса, если есть.
         :return: Словарь с информацией о чатах и курсором для пагинации.
         """
+        # Первая страница берётся из кэша воркера, если она там есть
+        first_page = cursor_last_message_time is None
+        filling = False
+        if first_page:
+            cached = chat_list_cache.get(current_user_id)
+            if cached is not None:
+                return {
+                    "chats": cached,
+                    "cursor_last_message_time": (
+                        None if not cached else cached[-1]["last_message_time"]
+                    ),
+                }
+            # Кэш заполняется только из основной базы: страница с отстающей
+            # реплики держалась бы в кэше до TTL, а инвалидация, пришедшая
+            # раньше, её уже не сбросит. Собственная сессия DAO может уйти
+            # на реплику, поэтому без сессии запроса кэш не заполняется
+            filling = session is not None and chat_list_cache.enabled
+            if filling:
+                fill_token = chat_list_cache.begin_fill(current_user_id)
+                stick_to_primary(session)
+
         # Получение сырых данных чатов с использованием DAO
         raw_chats = await MessageDAO.get_chats_of_user(
-            current_user_id, cursor_last_message_time=cursor_last_message_time
+            current_user_id,
+            cursor_last_message_time=cursor_last_message_time,
+            session=session,
         )
 
         # Форматирование результата
@@ -44,6 +100,7 @@ class ChatService:
                     "partner_id": chat.chat_partner_id,
                     "partner_username": chat.username,
                     "last_message_time": chat.last_message_time,
+                    "unread_count": chat.unread_count,
                 }
                 for chat in raw_chats
             ],
@@ -52,24 +109,26 @@ class ChatService:
                 None if not raw_chats else raw_chats[-1].last_message_time
             ),
         }
+        if filling:
+            chat_list_cache.put(current_user_id, chats["chats"], fill_token)
         return chats
 
     @staticmethod
     async def get_messages_between_users(
         user_1_id: UUID4,
         user_2_id: UUID4,
-        cursor_time: datetime,
-        cursor_message_id: int,
+        cursor_message_id: int | None,
         moder_flag: bool = False,
+        session: AsyncSession | None = None,
     ):
         """
         Получить сообщения между двумя пользователями.
 
         :param user_1_id: UUID первого пользователя.
         :param user_2_id: UUID второго пользователя.
-        :param cursor_time: Метка времени для пагинации.
         :param cursor_message_id: ID сообщения для пагинации.
         :param moder_flag: Флаг модерации, определяет, кто текущий пользователь.
+        :param session: Сессия текущего запроса, если есть.
         :raises UserMessagesBetweenSameException: Исключение при попытке получить сообщения между одним и тем же пользователем.
         :raises UsersIdNotFoundException: Исключение, если не найдены оба пользователя.
         :raises OneUserIdNotFoundException: Исключение, если найден только один пользователь.
@@ -79,17 +138,32 @@ class ChatService:
         if user_1_id == user_2_id:
             raise UserMessagesBetweenSameException
 
-        # Поиск пользователей в базе данных
-        users = await UsersDao.find_users_for_chat(user_1_id, user_2_id)
+        # Участники и страница сообщений одним запросом
+        limit = settings.BASE_LIMIT_MESSAGES_FOR_USER
+        users, raw_messages = await MessageDAO.get_conversation_page(
+            user_1_id,
+            user_2_id,
+            cursor_message_id,
+            limit=limit,
+            session=session,
+        ) or ([], [])
         if not users:
             raise UsersIdNotFoundException
         if len(users) == 1:
             raise OneUserIdNotFoundException(user_id=users[0].id)
 
-        # Получение сообщений между пользователями
-        raw_messages = await MessageDAO.get_messages_between_users(
-            user_1_id, user_2_id, cursor_time, cursor_message_id
-        )
+        # Если в базе сообщения закончились, страница дополняется из холодного архива
+        if len(raw_messages) < limit:
+            if raw_messages:
+                cursor_message_id = raw_messages[-1].id
+            archived = await asyncio.to_thread(
+                archive_store.get_messages,
+                user_1_id,
+                user_2_id,
+                cursor_message_id,
+                limit - len(raw_messages),
+            )
+            raw_messages = list(raw_messages) + archived
 
         # Создание словаря для отображения ID пользователя на имя
         users_map = {user.id: user.username for user in users}
@@ -101,62 +175,151 @@ class ChatService:
                 },
                 {"participant_id": user_2_id, "is_current_user": False},
             ],
-            # Форматирование списка сообщений
+            # Форматирование списка сообщений; ID строкой, как сериализует
+            # схема (MessageId), потому что render_model в PROD её не применяет
             "messages": [
                 {
+                    "id": str(message.id),
                     "sender_id": message.sender_id,
                     "username": users_map.get(message.sender_id),
                     "message_text": message.message_text,
                     "created_at": message.created_at,
+                    "attachment_id": message.attachment_id,
                 }
                 for message in raw_messages
             ],
             # Определение курсоров для следующей пагинации
             "cursor_time": None if not raw_messages else raw_messages[-1].created_at,
-            "cursor_message_id": None if not raw_messages else raw_messages[-1].id,
+            "cursor_message_id": (
+                None if not raw_messages else str(raw_messages[-1].id)
+            ),
         }
 
     @classmethod
-    async def add_message(cls, message: SWebsocketMessage, sender_id: UUID4):
+    async def add_message(
+        cls,
+        message: SWebsocketMessage,
+        sender_id: UUID4,
+        session: AsyncSession | None = None,
+    ):
         """
         Добавить новое сообщение в базу данных.
 
         :param message: Данные сообщения.
         :param sender_id: UUID отправителя.
+        :param session: Сессия текущего кадра WebSocket, если есть.
         :raises UserMessagesBetweenYourselfException: Исключение при попытке отправить сообщение самому себе.
         :raises OneUserIdNotFoundException: Исключение, если получатель не найден.
-        :return: Словарь со статусом операции.
+        :raises AttachmentNotFoundException: Исключение, если вложение недоступно
+            отправителю.
+        :return: Словарь со статусом операции, ID сообщения и счётчиком
+            непрочитанных сообщений получателя.
         """
         # Проверка на попытку отправки сообщения самому себе
         if sender_id == message.recipient_id:
             raise UserMessagesBetweenYourselfException
+        # Приложить можно своё вложение или полученное в своей переписке
+        if (
+            message.attachment_id is not None
+            and not await AttachmentDao.find_accessible(
+                message.attachment_id, sender_id, session=session
+            )
+        ):
+            raise AttachmentNotFoundException
         try:
+            # ID, выданный воркером заранее, сохраняется как есть,
+            # иначе его выдаёт значение по умолчанию модели
+            values = {}
+            if message.id is not None:
+                values = {"id": message.id, "created_at": timestamp_of(message.id)}
             # Добавление сообщения с использованием DAO
-            await MessageDAO.add(
+            new_message = await MessageDAO.add(
+                session=session,
                 message_text=message.message_text,
                 sender_id=sender_id,
                 recipient_id=message.recipient_id,
+                attachment_id=message.attachment_id,
+                **values,
+            )
+            if new_message is None:
+                # Без сессии запроса DAO логирует ошибку вставки и возвращает None;
+                # ожидаемая причина — несуществующий получатель
+                raise OneUserIdNotFoundException(message.recipient_id)
+            # Счётчик непрочитанных у получателя увеличивается в той же транзакции
+            unread_count = await ConversationReadDao.increment_unread(
+                message.recipient_id, sender_id, new_message.id, session=session
+            )
+            # Другие воркеры сбросят закэшированные списки чатов после фиксации
+            await publish_chat_list_changed(
+                session, "message", (sender_id, message.recipient_id)
             )
             return {
                 "status": "success",
+                "message_id": new_message.id,
+                "unread_count": unread_count,
             }
         except IntegrityError:
             # Обработка ошибки целостности данных, если получатель не найден
             raise OneUserIdNotFoundException(message.recipient_id)
 
+    @staticmethod
+    async def mark_read(
+        current_user_id: UUID4,
+        partner_id: UUID4,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Отметить переписку с собеседником как прочитанную.
+
+        :param current_user_id: UUID текущего пользователя.
+        :param partner_id: UUID собеседника.
+        :param session: Сессия текущего запроса или кадра WebSocket, если есть.
+        :raises UserMessagesBetweenSameException: Исключение, если собеседник —
+            сам пользователь.
+        :raises OneUserIdNotFoundException: Исключение, если собеседник не найден.
+        :return: Словарь с обнулённым счётчиком и отметкой о прочтении.
+        """
+        if current_user_id == partner_id:
+            raise UserMessagesBetweenSameException
+        try:
+            read = await ConversationReadDao.mark_read(
+                current_user_id, partner_id, session=session
+            )
+        except IntegrityError:
+            # Вставка отметки не прошла проверку внешнего ключа
+            raise OneUserIdNotFoundException(partner_id)
+        if read is None:
+            # То же без сессии запроса: DAO логирует ошибку и возвращает None
+            raise OneUserIdNotFoundException(partner_id)
+        # Счётчик в закэшированном списке чатов сбросят все воркеры после фиксации
+        await publish_chat_list_changed(session, "read", (current_user_id,))
+        return {
+            "partner_id": partner_id,
+            "unread_count": read.unread_count,
+            "last_read_message_id": read.last_read_message_id,
+            "last_read_at": read.last_read_at,
+        }
+
     @classmethod
-    async def find_users_by_username(cls, username: str, limit: int, offset: int):
+    async def find_users_by_username(
+        cls,
+        username: str,
+        limit: int,
+        offset: int,
+        session: AsyncSession | None = None,
+    ):
         """
         Найти пользователей по имени.
 
         :param username: Имя пользователя для поиска.
         :param limit: Максимальное количество записей для возврата.
         :param offset: Смещение для пагинации.
+        :param session: Сессия текущего запроса, если есть.
         :raises UserSearchNotFoundException: Исключение, если пользователи не найдены.
         :return: Словарь с информацией о пользователях и данными о пагинации.
         """
         # Поиск пользователей по имени
-        raw_users = await UsersDao.find_by_username(username, limit, offset)
+        raw_users = await UsersDao.find_by_username(username, limit, offset, session)
         if not raw_users:
             raise UserSearchNotFoundException
 
@@ -174,16 +337,19 @@ class ChatService:
         return users
 
     @classmethod
-    async def get_all_chats(cls, limit: int, offset: int):
+    async def get_all_chats(
+        cls, limit: int, offset: int, session: AsyncSession | None = None
+    ):
         """
         Получить список всех чатов между пользователями.
 
         :param limit: Максимальное количество записей для возврата.
         :param offset: Смещение для пагинации.
+        :param session: Сессия текущего запроса, если есть.
         :return: Словарь с информацией о чатах и данными о пагинации.
         """
         # Получение всех чатов с использованием DAO
-        raw_chats = await MessageDAO.get_all_users_chats(limit, offset)
+        raw_chats = await MessageDAO.get_all_users_chats(limit, offset, session)
 
         # Расчет нового смещения для пагинации
         new_offset = offset + limit if raw_chats else offset
@@ -208,3 +374,283 @@ class ChatService:
             },
         }
         return chats
+
+    @classmethod
+    async def export_conversation(
+        cls,
+        user_1_id: UUID4,
+        user_2_id: UUID4,
+        session: AsyncSession | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Выгрузка всей переписки в формате NDJSON, от новых сообщений к старым:
+        сначала сообщения из базы, затем из холодного архива.
+
+        :param user_1_id: UUID первого участника.
+        :param user_2_id: UUID второго участника.
+        :param session: Сессия текущего запроса для проверки участников.
+        :raises UserMessagesBetweenSameException: Если участники совпадают.
+        :raises UsersIdNotFoundException: Если не найдены оба пользователя.
+        :raises OneUserIdNotFoundException: Если найден только один пользователь.
+        :return: Асинхронный итератор кусков тела ответа.
+        """
+        if user_1_id == user_2_id:
+            raise UserMessagesBetweenSameException
+        users = await UsersDao.find_users_for_chat(user_1_id, user_2_id, session) or []
+        if not users:
+            raise UsersIdNotFoundException
+        if len(users) == 1:
+            raise OneUserIdNotFoundException(user_id=users[0].id)
+        return cls._export_chunks(user_1_id, user_2_id)
+
+    @staticmethod
+    async def _export_chunks(
+        user_1_id: UUID4, user_2_id: UUID4
+    ) -> AsyncIterator[bytes]:
+        # Сообщения, уже выгруженные в архив, могут ещё не быть удалены из базы:
+        # из базы читаются только те, что новее архивных
+        archived_max_id = await asyncio.to_thread(
+            archive_store.max_message_id, user_1_id, user_2_id
+        )
+        # Сессия выгрузки живёт дольше обработчика запроса, поэтому она своя
+        async with session_scope(settings.QUERY_BUDGET_MODERATION_MS) as session:
+            async for rows in MessageDAO.stream_conversation(
+                user_1_id, user_2_id, archived_max_id, session=session
+            ):
+                yield b"".join(map(encode_message, rows))
+
+        lines = archive_store.iter_lines(user_1_id, user_2_id)
+        while chunk := await asyncio.to_thread(
+            list, islice(lines, settings.EXPORT_FETCH_SIZE)
+        ):
+            yield b"".join(chunk)
+
+    @staticmethod
+    async def search_messages(
+        query_text: str,
+        user_id: UUID4 | None,
+        created_from: datetime | None,
+        created_to: datetime | None,
+        order_by_rank: bool,
+        cursor_rank: float | None,
+        cursor_message_id: int | None,
+        limit: int,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Полнотекстовый поиск сообщений для модератора.
+
+        :param query_text: Поисковый запрос.
+        :param user_id: UUID отправителя или получателя сообщений.
+        :param created_from: Нижняя граница времени создания.
+        :param created_to: Верхняя граница времени создания.
+        :param order_by_rank: Сортировать по релевантности, иначе от новых к старым.
+        :param cursor_rank: Ранг последнего сообщения предыдущей страницы.
+        :param cursor_message_id: ID последнего сообщения предыдущей страницы.
+        :param limit: Максимальное количество сообщений.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Словарь с найденными сообщениями и курсором для следующей страницы.
+        """
+        raw_messages = (
+            await MessageDAO.search(
+                query_text,
+                user_id=user_id,
+                created_from=_naive_utc(created_from),
+                created_to=_naive_utc(created_to),
+                order_by_rank=order_by_rank,
+                cursor_rank=cursor_rank,
+                cursor_message_id=cursor_message_id,
+                limit=limit,
+                session=session,
+            )
+            or []
+        )
+        last = raw_messages[-1] if raw_messages else None
+        return {
+            "messages": [
+                {
+                    "id": message.id,
+                    "message_text": message.message_text,
+                    "sender_id": message.sender_id,
+                    "sender_username": message.sender_username,
+                    "recipient_id": message.recipient_id,
+                    "recipient_username": message.recipient_username,
+                    "created_at": message.created_at,
+                    "rank": message.rank,
+                }
+                for message in raw_messages
+            ],
+            "cursor_rank": last.rank if last and order_by_rank else None,
+            "cursor_message_id": last.id if last else None,
+            "is_end": len(raw_messages) < limit,
+        }
+
+
+class RetentionService:
+    """
+    Сервисный слой для политик хранения сообщений отдельных переписок.
+    """
+
+    @staticmethod
+    async def set_policy(
+        user_1_id: UUID4,
+        user_2_id: UUID4,
+        retention_days: int,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Задать срок хранения сообщений переписки.
+
+        :raises UserMessagesBetweenSameException: Исключение, если участники совпадают.
+        :raises UsersIdNotFoundException: Исключение, если не найдены оба пользователя.
+        :raises OneUserIdNotFoundException: Исключение, если найден только один
+            пользователь.
+        :return: Сохранённая политика хранения.
+        """
+        if user_1_id == user_2_id:
+            raise UserMessagesBetweenSameException
+        users = await UsersDao.find_users_for_chat(user_1_id, user_2_id, session)
+        if not users:
+            raise UsersIdNotFoundException
+        if len(users) == 1:
+            raise OneUserIdNotFoundException(user_id=users[0].id)
+
+        await RetentionPolicyDao.set_policy(
+            user_1_id, user_2_id, retention_days, session=session
+        )
+        return {
+            "participant_1_id": user_1_id,
+            "participant_2_id": user_2_id,
+            "retention_days": retention_days,
+        }
+
+    @staticmethod
+    async def delete_policy(
+        user_1_id: UUID4, user_2_id: UUID4, session: AsyncSession | None = None
+    ):
+        """
+        Удалить политику хранения переписки (вернуться к глобальному сроку).
+
+        :raises RetentionPolicyNotFoundException: Исключение, если политика не задана.
+        """
+        deleted = await RetentionPolicyDao.delete_policy(
+            user_1_id, user_2_id, session=session
+        )
+        if not deleted:
+            raise RetentionPolicyNotFoundException
+        return {"detail": "The retention policy has been deleted."}
+
+
+class AttachmentService:
+    """
+    Сервисный слой для вложений.
+    """
+
+    @staticmethod
+    def _attachment(attachment) -> dict:
+        return {
+            "id": attachment.id,
+            "sha256": attachment.sha256,
+            "size": attachment.size,
+            "content_type": attachment.content_type,
+            "filename": attachment.filename,
+            "created_at": attachment.created_at,
+        }
+
+    @staticmethod
+    async def _limit_size(
+        chunks: AsyncIterable[bytes], max_size: int
+    ) -> AsyncIterator[bytes]:
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise AttachmentTooLargeException
+            yield chunk
+
+    @classmethod
+    async def upload(
+        cls,
+        uploader_id: UUID4,
+        filename: str,
+        content_type: str,
+        content_length: int | None,
+        chunks: AsyncIterable[bytes],
+    ):
+        """
+        Сохранить загружаемый файл и создать вложение.
+
+        Содержимое пишется в хранилище порциями по мере получения; сессия
+        с базой открывается только после загрузки, поэтому медленный клиент
+        не держит соединение пула.
+
+        :param uploader_id: UUID загрузившего пользователя.
+        :param filename: Имя файла.
+        :param content_type: Тип содержимого.
+        :param content_length: Размер из заголовка Content-Length, если передан.
+        :param chunks: Порции тела запроса.
+        :raises AttachmentTooLargeException: Исключение, если файл больше
+            ATTACHMENT_MAX_SIZE.
+        :raises UserIsNotPresentException: Исключение, если пользователь удалён
+            во время загрузки.
+        :return: Данные созданного вложения.
+        """
+        max_size = settings.ATTACHMENT_MAX_SIZE
+        if content_length is not None and content_length > max_size:
+            raise AttachmentTooLargeException
+        sha256, size = await attachment_store.save(cls._limit_size(chunks, max_size))
+        try:
+            async with session_scope(settings.QUERY_BUDGET_MS) as session:
+                attachment = await AttachmentDao.add(
+                    session=session,
+                    sha256=sha256,
+                    size=size,
+                    content_type=content_type,
+                    filename=filename,
+                    uploader_id=uploader_id,
+                )
+        except IntegrityError:
+            # Загрузивший пользователь удалён во время загрузки.
+            # Файл в хранилище остаётся: его может использовать другое вложение
+            raise UserIsNotPresentException
+        return cls._attachment(attachment)
+
+    @staticmethod
+    async def get_for_download(
+        attachment_id: UUID4,
+        user_id: UUID4,
+        moder_flag: bool = False,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Найти вложение и путь к его содержимому с проверкой доступа.
+
+        :param attachment_id: ID вложения.
+        :param user_id: UUID текущего пользователя.
+        :param moder_flag: Модератору доступны все вложения.
+        :param session: Сессия текущего запроса, если есть.
+        :raises AttachmentNotFoundException: Исключение, если вложения нет
+            или оно недоступно.
+        :return: Вложение и путь к файлу.
+        """
+        if moder_flag:
+            attachment = await AttachmentDao.find_one_or_none(
+                session=session, id=attachment_id
+            )
+        else:
+            attachment = await AttachmentDao.find_accessible(
+                attachment_id, user_id, session=session
+            )
+        if attachment is None:
+            raise AttachmentNotFoundException
+        path = attachment_store.path_for(attachment.sha256)
+        if not await asyncio.to_thread(path.is_file):
+            logger.error(
+                "Attachment content is missing",
+                extra={
+                    "attachment_id": str(attachment_id),
+                    "sha256": attachment.sha256,
+                },
+            )
+            raise AttachmentNotFoundException
+        return attachment, path
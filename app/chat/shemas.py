@@ -1,8 +1,10 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import UUID4, BaseModel, Field
 
+from app.core.snowflake import MessageId
+
 
 class SLimitOffsetPagination(BaseModel):
     """
@@ -32,6 +34,11 @@ class IncomingWebSocketMessage(BaseModel):
         description="UUID получателя",
         example="d9b9f719-5e5e-4b49-8f00-d8f9f19e5e50",
     )
+    attachment_id: Optional[UUID4] = Field(
+        None,
+        description="UUID вложения, загруженного через POST /chat/attachments/",
+        example="5b0c3f4e-8d1a-4c2b-9e7f-1a2b3c4d5e6f",
+    )
 
 
 class SWebsocketMessage(IncomingWebSocketMessage):
@@ -39,6 +46,11 @@ class SWebsocketMessage(IncomingWebSocketMessage):
     Модель для представления сообщения, отправляемого через WebSocket.
     """
 
+    id: Optional[MessageId] = Field(
+        None,
+        description="ID сообщения, выданный воркером до вставки в базу",
+        example="1234567890123",
+    )
     created_at: datetime = Field(
         ...,
         default_factory=datetime.utcnow,
@@ -91,6 +103,9 @@ class SChat(BaseModel):
         description="Время последнего сообщения в чате",
         example="2024-11-03T18:00:00.000Z",
     )
+    unread_count: int = Field(
+        0, description="Количество непрочитанных сообщений от партнера", example=3
+    )
 
 
 class SChats(BaseModel):
@@ -135,6 +150,9 @@ class SGetMessage(BaseModel):
     Модель для представления полученного сообщения.
     """
 
+    id: MessageId = Field(
+        ..., description="ID сообщения (упорядочен по времени)", example="1234567890123"
+    )
     sender_id: UUID4 = Field(
         ...,
         description="UUID отправителя сообщения",
@@ -149,6 +167,9 @@ class SGetMessage(BaseModel):
     created_at: datetime = Field(
         ..., description="Время создания сообщения", example="2024-11-03T19:30:45.123Z"
     )
+    attachment_id: Optional[UUID4] = Field(
+        None, description="UUID вложения, если есть", example=None
+    )
 
 
 class SParticipiant(BaseModel):
@@ -179,9 +200,66 @@ class SGetMessagesBetweenUsersResponse(BaseModel):
     messages: List[SGetMessage] = Field(..., description="Список сообщений")
     cursor_time: Optional[datetime] = Field(
         None,
-        description="Метка времени для пагинации",
+        description="Время последнего сообщения страницы (для пагинации не требуется)",
         example="2024-11-03T20:00:00.000Z",
     )
-    cursor_message_id: Optional[int] = Field(
-        None, description="ID сообщения для пагинации", example=123
+    cursor_message_id: Optional[MessageId] = Field(
+        None, description="ID сообщения для пагинации", example="1234567890123"
+    )
+
+
+class SMarkReadFrame(BaseModel):
+    """
+    Модель кадра WebSocket для отметки переписки как прочитанной.
+    """
+
+    type: Literal["mark_read"] = Field(
+        ..., description="Тип кадра", example="mark_read"
+    )
+    partner_id: UUID4 = Field(
+        ...,
+        description="UUID собеседника",
+        example="f456e789-0123-4567-89ab-0123456789ab",
+    )
+
+
+class SMarkReadResponse(BaseModel):
+    """
+    Модель ответа на отметку переписки как прочитанной.
+    """
+
+    partner_id: UUID4 = Field(
+        ...,
+        description="UUID собеседника",
+        example="f456e789-0123-4567-89ab-0123456789ab",
+    )
+    unread_count: int = Field(
+        ..., description="Количество непрочитанных сообщений", example=0
+    )
+    last_read_message_id: Optional[MessageId] = Field(
+        None,
+        description="ID последнего прочитанного сообщения",
+        example="1234567890123",
+    )
+    last_read_at: Optional[datetime] = Field(
+        None,
+        description="Время отметки о прочтении",
+        example="2024-11-03T18:00:00.000Z",
+    )
+
+
+class SAttachment(BaseModel):
+    """
+    Модель для представления загруженного вложения.
+    """
+
+    id: UUID4 = Field(
+        ...,
+        description="UUID вложения для поля attachment_id сообщения",
+        example="5b0c3f4e-8d1a-4c2b-9e7f-1a2b3c4d5e6f",
     )
+    sha256: str = Field(..., description="SHA-256 содержимого")
+    size: int = Field(..., description="Размер в байтах", example=52431)
+    content_type: str = Field(..., example="image/png")
+    filename: str = Field(..., example="photo.png")
+    created_at: datetime = Field(..., example="2024-11-03T19:30:45.123Z")
@@ -1,13 +1,27 @@
+import asyncio
+import json
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterable, List, Set
+from uuid import UUID
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
 from fastapi.exceptions import WebSocketException
 from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.dao import BlockDao
 from app.chat.shemas import SWebsocketMessage
-from app.core.exceptions import ErrorHandler
+from app.core.database import session_scope
+from app.core.exceptions import ErrorHandler, UserIsBlockedException
 from app.core.logger import logger
+from app.core.pubsub import pubsub
+
+USER_BLOCKED_CHANNEL = "user_blocked"
+# ID пользователей в одном уведомлении (36 символов UUID и разделители)
+USER_BLOCKED_BATCH = 150
+# Код закрытия соединения, заменённого новым подключением того же пользователя
+WS_SUPERSEDED_CODE = 4000
+WS_SUPERSEDED_REASON = "Connection superseded by a newer one"
 
 
 class ConnectionManager(ErrorHandler):
@@ -19,10 +33,15 @@ class ConnectionManager(ErrorHandler):
 
     Методы:
         connect(websocket: WebSocket, user_id: UUID4): Подключает пользователя по WebSocket и добавляет соединение в активные.
-        disconnect(user_id: UUID4): Отключает пользователя и удаляет соединение из активных.
+        disconnect(user_id: UUID4, websocket: WebSocket | None): Отключает пользователя
+            и удаляет соединение из активных.
         send_personal_message(message: dict, recipient_id: UUID4): Отправляет личное сообщение пользователю через WebSocket.
         notify_user_about_new_message(message: SWebsocketMessage, sender_id: UUID4): Уведомляет пользователя о новом сообщении.
+        notify_message_retracted(message: SWebsocketMessage, sender_id: UUID4):
+            Отзывает у получателя сообщение, которое не удалось сохранить.
         notify_chat_list_update(current_user_id: UUID4, partner_id: UUID4, last_message_time: datetime): Уведомляет двух пользователей об обновлении списка чатов.
+        evict(user_ids: Iterable[UUID4]): Закрывает соединения заблокированных
+            пользователей.
     """
 
     _type_error_message = "Websocket Error"
@@ -34,10 +53,14 @@ class ConnectionManager(ErrorHandler):
         """
         # Словарь для хранения активных соединений с пользователями, где ключ - UUID пользователя, значение - WebSocket-соединение.
         self.active_connections: Dict[UUID4, WebSocket] = {}
+        # Запущенные задачи закрытия соединений (ссылки держатся до их завершения)
+        self._eviction_tasks: Set[asyncio.Task] = set()
 
     async def connect(self, websocket: WebSocket, user_id: UUID4):
         """
         Подключает пользователя по WebSocket и добавляет соединение в активные.
+        Предыдущее соединение пользователя закрывается с кодом
+        WS_SUPERSEDED_CODE, чтобы клиент не переподключался к нему.
 
         Параметры:
             websocket (WebSocket): Объект WebSocket для подключения.
@@ -45,21 +68,37 @@ class ConnectionManager(ErrorHandler):
         """
         try:
             # Добавляем соединение в список активных соединений.
+            previous = self.active_connections.get(user_id)
             self.active_connections[user_id] = websocket
         except (WebSocketException, Exception) as e:
             # Логируем ошибку, если не удалось принять соединение.
             self._log_error(e, error_message="Cannot accept websocket connection")
+            return
+        if previous is None or previous is websocket:
+            return
+        try:
+            await previous.close(code=WS_SUPERSEDED_CODE, reason=WS_SUPERSEDED_REASON)
+        except (WebSocketException, Exception) as e:
+            # Старое соединение могло уже оборваться
+            self._log_error(e, error_message="Cannot close superseded connection")
 
-    async def disconnect(self, user_id: UUID4):
+    async def disconnect(self, user_id: UUID4, websocket: WebSocket | None = None):
         """
         Отключает пользователя и удаляет соединение из активных.
 
         Параметры:
             user_id (UUID4): Уникальный идентификатор пользователя.
+            websocket (WebSocket | None): Отключаемое соединение; более новое
+                соединение того же пользователя при этом остаётся активным.
         """
         try:
-            # Удаляем соединение пользователя из списка активных.
-            websocket = self.active_connections.pop(user_id, None)
+            # Удаляем соединение пользователя из списка активных,
+            # если оно не заменено более новым.
+            active = self.active_connections.get(user_id)
+            if websocket is None:
+                websocket = active
+            if websocket is not None and websocket is active:
+                del self.active_connections[user_id]
             if websocket:
                 # Закрываем соединение, если оно найдено.
                 await websocket.close()
@@ -83,7 +122,7 @@ class ConnectionManager(ErrorHandler):
                 await websocket.send_json(message)
             except (WebSocketException, Exception) as e:
                 # При ошибке отправки сообщения разрываем соединение и логируем ошибку.
-                await self.disconnect(recipient_id)
+                await self.disconnect(recipient_id, websocket)
                 self._log_error(
                     e,
                     error_message=f"Cannot sending a message to the user {recipient_id}: {e}",
@@ -93,7 +132,9 @@ class ConnectionManager(ErrorHandler):
             logger.info(f"Connection to user {recipient_id} not found")
 
     async def notify_user_about_new_message(
-        self, message: SWebsocketMessage, sender_id: UUID4
+        self,
+        message: SWebsocketMessage,
+        sender_id: UUID4,
     ):
         """
         Уведомляет пользователя о новом сообщении.
@@ -106,17 +147,45 @@ class ConnectionManager(ErrorHandler):
         message_data = {
             "type": "new_message",
             "data": {
+                "message_id": str(message.id),
                 "sender_id": str(sender_id),
                 "recipient_id": str(message.recipient_id),
                 "message_text": message.message_text,
-                "created_at": str(message.created_at)
-            }
+                "created_at": str(message.created_at),
+                "attachment_id": (
+                    str(message.attachment_id) if message.attachment_id else None
+                ),
+            },
         }
         # Отправляем сообщение получателю.
         await self.send_personal_message(message_data, message.recipient_id)
 
+    async def notify_message_retracted(
+        self, message: SWebsocketMessage, sender_id: UUID4
+    ):
+        """
+        Отзывает у получателя сообщение, разосланное до вставки в базу,
+        если сохранить его не удалось.
+
+        Параметры:
+            message (SWebsocketMessage): Объект неотправленного сообщения.
+            sender_id (UUID4): Уникальный идентификатор отправителя сообщения.
+        """
+        message_data = {
+            "type": "message_retracted",
+            "data": {
+                "message_id": str(message.id),
+                "sender_id": str(sender_id),
+            },
+        }
+        await self.send_personal_message(message_data, message.recipient_id)
+
     async def notify_chat_list_update(
-        self, current_user_id: UUID4, partner_id: UUID4, last_message_time: datetime
+        self,
+        current_user_id: UUID4,
+        partner_id: UUID4,
+        last_message_time: datetime,
+        partner_unread_count: int | None = None,
     ):
         """
         Уведомляет пользователей об обновлении списка чатов.
@@ -125,20 +194,98 @@ class ConnectionManager(ErrorHandler):
             current_user_id (UUID4): Уникальный идентификатор текущего пользователя.
             partner_id (UUID4): Уникальный идентификатор партнера по чату.
             last_message_time (datetime): Время последнего сообщения.
+            partner_unread_count (int | None): Счётчик непрочитанных сообщений
+                партнера в этом чате.
         """
         # Формируем данные события об обновлении чата.
         message_data = {
             "type": "chat_list_update",
             "data": {
                 "partner_id": str(partner_id),
-                "last_message_time": str(last_message_time)
-            }
+                "last_message_time": str(last_message_time),
+            },
         }
         # Отправляем уведомление текущему пользователю.
         await self.send_personal_message(message_data, current_user_id)
-        # Отправляем уведомление партнеру.
-        await self.send_personal_message(message_data, partner_id)
+        # Отправляем уведомление партнеру (собеседник для него — текущий пользователь).
+        partner_data = {
+            "type": "chat_list_update",
+            "data": {
+                "partner_id": str(current_user_id),
+                "last_message_time": str(last_message_time),
+                "unread_count": partner_unread_count,
+            },
+        }
+        await self.send_personal_message(partner_data, partner_id)
+
+    async def evict(self, user_ids: Iterable[UUID4]):
+        """
+        Закрывает соединения заблокированных пользователей с кодом 1008.
+
+        Параметры:
+            user_ids (Iterable[UUID4]): Идентификаторы заблокированных пользователей.
+        """
+        for user_id in user_ids:
+            websocket = self.active_connections.pop(user_id, None)
+            if websocket is None:
+                continue
+            try:
+                await websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION,
+                    reason=UserIsBlockedException.detail,
+                )
+                logger.info("Blocked user evicted", extra={"user_id": str(user_id)})
+            except (WebSocketException, Exception) as e:
+                self._log_error(e, error_message="Cannot evict blocked user")
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._eviction_tasks.add(task)
+        task.add_done_callback(self._eviction_tasks.discard)
+
+    def handle_users_blocked(self, payload: str):
+        """
+        Обработчик уведомлений канала user_blocked от всех воркеров.
+        """
+        self._spawn(self.evict([UUID(user_id) for user_id in json.loads(payload)]))
+
+    def recheck_blocked(self):
+        """
+        После (пере)подключения слушателя уведомления о блокировках могли быть
+        пропущены: подключённые пользователи один раз проверяются по базе.
+        """
+        if self.active_connections:
+            self._spawn(self._evict_blocked(list(self.active_connections)))
+
+    async def _evict_blocked(self, user_ids: List[UUID4]):
+        blocked = await BlockDao.find_blocked_user_ids(user_ids)
+        if blocked:
+            await self.evict(blocked)
 
 
 # Создаем экземпляр менеджера соединений.
 manager = ConnectionManager()
+pubsub.subscribe(
+    USER_BLOCKED_CHANNEL, manager.handle_users_blocked, manager.recheck_blocked
+)
+
+
+async def publish_users_blocked(
+    session: AsyncSession | None, user_ids: Iterable[UUID4]
+):
+    """
+    Сообщает всем воркерам о блокировке пользователей; их соединения закрываются
+    после фиксации транзакции сессии.
+    :param session: Сессия текущей единицы работы; без неё уведомление
+        отправляется в отдельной транзакции.
+    :param user_ids: Заблокированные пользователи.
+    """
+    if session is None:
+        async with session_scope() as session:
+            await publish_users_blocked(session, user_ids)
+        return
+    user_ids = [str(user_id) for user_id in user_ids]
+    # Полезная нагрузка NOTIFY ограничена 8000 байт
+    for start in range(0, len(user_ids), USER_BLOCKED_BATCH):
+        payload = json.dumps(user_ids[start : start + USER_BLOCKED_BATCH])
+        await pubsub.publish(session, USER_BLOCKED_CHANNEL, payload)
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Literal
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, computed_field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -25,6 +25,100 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASS: str
 
+    # Настройки пула соединений и драйвера asyncpg (не применяются в режиме TEST)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Кэш подготовленных выражений SQLAlchemy-адаптера asyncpg (на соединение)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # Работа через pgbouncer в режиме transaction/statement pooling:
+    # именованные подготовленные выражения не переживают смену серверного соединения,
+    # поэтому кэши отключаются, а имена выражений делаются уникальными
+    DB_PGBOUNCER_MODE: bool = False
+
+    # Бюджеты времени на запрос к базе (statement_timeout, мс) в рамках HTTP-запроса
+    # или кадра WebSocket: по умолчанию и для отдельных групп маршрутов
+    QUERY_BUDGET_MS: int = 5000
+    QUERY_BUDGET_CHATS_MS: int = 1000
+    QUERY_BUDGET_USERS_SEARCH_MS: int = 1000
+    QUERY_BUDGET_MODERATION_MS: int = 3000
+
+    # Журнал медленных запросов: порог в мс (None — выключен), размер буфера,
+    # доля медленных SELECT, для которых снимается EXPLAIN ANALYZE, и его тайм-аут
+    SLOW_QUERY_MS: Optional[int] = 200
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = 10000
+
+    # Соединение для LISTEN уведомлений между воркерами и аренды номера воркера
+    # (app/core/snowflake.py); через pgbouncer в режиме transaction pooling LISTEN
+    # и сессионные блокировки не работают, поэтому нужен прямой URL к PostgreSQL
+    # (postgresql+asyncpg://...). По умолчанию используется DATABASE_URL
+    DB_LISTEN_URL: Optional[str] = None
+    PUBSUB_RECONNECT_INTERVAL: float = 5.0
+
+    # Кэш первой страницы списка чатов: число пользователей (0 — выключен)
+    # и максимальное время жизни записи в секундах
+    CHAT_LIST_CACHE_SIZE: int = 10000
+    CHAT_LIST_CACHE_TTL: float = 60.0
+
+    # HTTP-кэширование страниц истории сообщений: страница с курсором старше
+    # HISTORY_PAGE_SETTLE_SECONDS не меняется от новых сообщений и отдаётся с
+    # Cache-Control max-age=HISTORY_PAGE_MAX_AGE (столько клиент может видеть
+    # сообщения, удалённые по сроку хранения); тела таких страниц хранятся
+    # в памяти воркера в пределах HISTORY_PAGE_CACHE_BYTES (0 — выключено)
+    HISTORY_PAGE_SETTLE_SECONDS: int = 60
+    HISTORY_PAGE_MAX_AGE: int = 300
+    HISTORY_PAGE_CACHE_BYTES: int = 64 * 1024 * 1024
+
+    # Автоматическая проверка содержимого сообщений: файл правил
+    # (JSON {"keywords": [...], "patterns": [...]}, перечитывается при изменении),
+    # размер очереди на проверку (при переполнении сообщения не проверяются),
+    # размер пакета, число процессов пула и окно расчёта скорости в секундах
+    SCREENING_ENABLED: bool = True
+    SCREENING_RULES_FILE: str = "screening_rules.json"
+    SCREENING_RELOAD_INTERVAL: float = 10.0
+    SCREENING_QUEUE_SIZE: int = 10000
+    SCREENING_BATCH_SIZE: int = 200
+    SCREENING_WORKERS: int = 1
+    SCREENING_RATE_WINDOW: float = 60.0
+
+    # Обнаружение массовых рассылок: окно в секундах, сколько разных получателей
+    # допустимо за окно, скольким получателям можно отправить один и тот же текст,
+    # на сколько секунд ограничивается отправка и сколько отправителей хранится.
+    # Окна у каждого воркера свои: действующие пороги — эти значения, умноженные
+    # на число воркеров
+    FLOOD_WINDOW_SECONDS: float = 60.0
+    FLOOD_MAX_RECIPIENTS: int = 30
+    FLOOD_DUPLICATE_RECIPIENTS: int = 10
+    FLOOD_THROTTLE_SECONDS: float = 300.0
+    FLOOD_MAX_SENDERS: int = 100000
+
+    # Выгрузка переписки: строк в одной порции серверного курсора
+    EXPORT_FETCH_SIZE: int = 500
+
+    # Сжатие ответов: минимальный размер тела в байтах, уровни gzip (1-9)
+    # и brotli (0-11), префиксы сжимаемых типов содержимого и путей без сжатия
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_CONTENT_TYPES: List[str] = [
+        "application/json",
+        "application/x-ndjson",
+        "text/",
+    ]
+    COMPRESSION_EXCLUDED_PATHS: List[str] = [
+        "/api/v1/auth/",
+        "/api/v1/chat/attachments/",
+    ]
+
+    # Реплики для чтения (JSON-список URL postgresql+asyncpg://...), по умолчанию нет
+    DB_REPLICA_URLS: List[str] = []
+    DB_REPLICA_HEALTH_CHECK_INTERVAL: float = 5.0
+
     TEST_DB_HOST: str
     TEST_DB_PORT: int
     TEST_DB_NAME: str
@@ -37,6 +131,38 @@ class Settings(BaseSettings):
     BASE_LIMIT_USERS_SEARCH: int
     BASE_LIMIT_MESSAGES_FOR_MODERATOR: int
 
+    # Номер воркера (0..1023) в идентификаторах сообщений. Процесс арендует номер
+    # advisory-блокировкой (app/core/snowflake.py): свободный или, если задан,
+    # только этот. PID вместо аренды используется только в DEBUG и TEST
+    SNOWFLAKE_WORKER_ID: Optional[int] = None
+    # Как часто (в секундах) проверяется соединение аренды номера воркера
+    SNOWFLAKE_LEASE_CHECK_INTERVAL: float = 5.0
+
+    # Секционирование messages: сколько месяцев вперёд держать готовые секции
+    # и как часто (в секундах) воркер проверяет их наличие
+    MESSAGES_PARTITIONS_AHEAD: int = 3
+    MESSAGES_PARTITIONS_CHECK_INTERVAL: float = 6 * 3600
+
+    # Холодный архив сообщений: каталог сегментов, возраст архивируемых сообщений
+    # и размер кэша распакованных блоков в байтах
+    ARCHIVE_DIR: Path = BASE_DIR / "archive"
+    ARCHIVE_OLDER_THAN_DAYS: int = 365
+    ARCHIVE_CACHE_BYTES: int = 32 * 1024 * 1024
+
+    # Вложения: каталог хранилища (файлы по SHA-256 содержимого)
+    # и максимальный размер одного файла в байтах
+    ATTACHMENTS_DIR: Path = BASE_DIR / "attachments"
+    ATTACHMENT_MAX_SIZE: int = 25 * 1024 * 1024
+
+    # Срок хранения сообщений в днях (None — хранить бессрочно); отдельные переписки
+    # могут переопределять его политиками хранения
+    MESSAGES_RETENTION_DAYS: Optional[int] = None
+    # Удаление выполняется порциями с паузами и ограничением времени выполнения запроса
+    RETENTION_BATCH_SIZE: int = 1000
+    RETENTION_BATCH_SLEEP: float = 0.1
+    RETENTION_STATEMENT_TIMEOUT_MS: int = 5000
+    RETENTION_INTERVAL: float = 3600
+
     model_config = SettingsConfigDict(
         env_file=BASE_DIR / ".env", env_file_encoding="utf-8"
     )
@@ -1,9 +1,52 @@
+import inspect
+from contextlib import asynccontextmanager
+from functools import wraps
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Sequence
+
 from pydantic import UUID4
 from sqlalchemy import insert, select
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import async_session_maker
-from app.core.exceptions import ErrorHandler
+from app.core.dto import BaseDTO
+from app.core.exceptions import ErrorHandler, QueryTimeoutException
+from app.core.routing import USE_REPLICA
+from app.core.slow_queries import dao_call
+
+
+def _tag_dao_calls(dao: type):
+    """
+    Оборачивает публичные асинхронные методы класса DAO так, что все запросы
+    внутри вызова помечаются именем метода (для журнала медленных запросов).
+    """
+    for name, attribute in list(vars(dao).items()):
+        if (
+            name.startswith("_")
+            or not isinstance(attribute, classmethod)
+            or not inspect.iscoroutinefunction(attribute.__func__)
+        ):
+            continue
+
+        def tagged(method, name=name):
+            @wraps(method)
+            async def wrapper(cls, *args, **kwargs):
+                token = dao_call.set(f"{cls.__name__}.{name}")
+                try:
+                    return await method(cls, *args, **kwargs)
+                finally:
+                    dao_call.reset(token)
+
+            return wrapper
+
+        setattr(dao, name, classmethod(tagged(attribute.__func__)))
+
+
+# Код ошибки PostgreSQL query_canceled (в том числе по statement_timeout)
+QUERY_CANCELED_SQLSTATE = "57014"
+# Ключ session.info, которым помечаются сессии, открытые самим DAO
+OWN_SESSION_KEY = "dao_own_session"
 
 
 class BaseDao(ErrorHandler):
@@ -13,17 +56,91 @@ class BaseDao(ErrorHandler):
     _type_error_message = "Database Error"
     # Тип исключения, который будет использоваться для обработки ошибок.
     _type_error = SQLAlchemyError
+    # Максимальное число параметров в одном запросе asyncpg (протокол PostgreSQL).
+    _max_query_params = 32767
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _tag_dao_calls(cls)
+
+    @classmethod
+    def _log_error(
+        cls,
+        e: Exception,
+        error_message: str,
+        extra: dict | None = None,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Логирует ошибку; превышение statement_timeout не скрывается,
+        а поднимается как QueryTimeoutException, чтобы запрос завершился ответом 503.
+        Ошибка в сессии запроса тоже поднимается: её транзакция прервана,
+        и продолжать работу в ней вызывающий код не может.
+        :param session: Сессия, в которой выполнялся запрос, если есть.
+        """
+        super()._log_error(e, error_message, extra)
+        if isinstance(e, DBAPIError) and (
+            getattr(e.orig, "sqlstate", None) == QUERY_CANCELED_SQLSTATE
+        ):
+            raise QueryTimeoutException from e
+        if session is not None and not session.info.get(OWN_SESSION_KEY):
+            raise e
+
+    @staticmethod
+    def _replica(query):
+        """
+        Помечает запрос на чтение как допускающий выполнение на реплике.
+        Применяется только к запросам, которым не нужна свежесть read-after-write.
+        :param query: Запрос SELECT.
+        """
+        return query.execution_options(**{USE_REPLICA: True})
+
+    @classmethod
+    @asynccontextmanager
+    async def _session(
+        cls, session: AsyncSession | None = None
+    ) -> AsyncIterator[AsyncSession]:
+        """
+        Выдаёт сессию для чтения.
+        Если передана сессия запроса, используется она, иначе открывается новая.
+        :param session: Сессия текущего запроса (единица работы), если есть.
+        """
+        if session is not None:
+            yield session
+            return
+        async with async_session_maker() as new_session:
+            new_session.info[OWN_SESSION_KEY] = True
+            yield new_session
 
     @classmethod
-    async def add(cls, **data):
+    @asynccontextmanager
+    async def _transaction(
+        cls, session: AsyncSession | None = None
+    ) -> AsyncIterator[AsyncSession]:
+        """
+        Выдаёт сессию для записи.
+        Сессию запроса фиксирует её владелец, собственная сессия фиксируется здесь.
+        :param session: Сессия текущего запроса (единица работы), если есть.
+        """
+        if session is not None:
+            yield session
+            return
+        async with async_session_maker() as new_session:
+            new_session.info[OWN_SESSION_KEY] = True
+            async with new_session.begin():
+                yield new_session
+
+    @classmethod
+    async def add(cls, session: AsyncSession | None = None, **data):
         """
         Добавляет новый объект в базу данных.
+        :param session: Сессия текущего запроса, если есть.
         :param data: Данные для создания нового объекта.
         :return: Сохранённый объект, если успешно, иначе None.
         """
         try:
-            # Создание асинхронной сессии
-            async with async_session_maker() as session:
+            # Получение сессии (собственной или сессии запроса)
+            async with cls._transaction(session) as session:
                 # Формирование запроса для добавления новой записи
                 query = (
                     insert(cls.model)
@@ -34,26 +151,174 @@ class BaseDao(ErrorHandler):
                 )
                 # Выполнение запроса
                 result = await session.execute(query)
-                # Подтверждение транзакции
-                await session.commit()
                 # Возвращение созданного объекта
                 return result.fetchone()
         except (SQLAlchemyError, Exception) as e:
             # Логирование ошибки с деталями
             cls._log_error(
-                e, error_message=f"Cannot add new {cls.model.__name__}", extra=data
+                e,
+                error_message=f"Cannot add new {cls.model.__name__}",
+                extra=data,
+                session=session,
+            )
+
+    @classmethod
+    def _chunks(cls, rows: List[dict], chunk_size: int):
+        """
+        Делит строки на части так, чтобы каждый запрос укладывался в лимит параметров.
+        :param rows: Строки для вставки.
+        :param chunk_size: Желаемый размер части.
+        """
+        columns = max(len(rows[0]), 1)
+        size = max(min(chunk_size, cls._max_query_params // columns), 1)
+        for start in range(0, len(rows), size):
+            yield rows[start : start + size]
+
+    @classmethod
+    async def add_many(
+        cls,
+        rows: List[dict],
+        chunk_size: int = 1000,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Добавляет много объектов многострочными INSERT ... RETURNING, частями.
+        Все части выполняются в одной транзакции.
+        :param rows: Данные объектов (словари с одинаковым набором ключей).
+        :param chunk_size: Максимальное количество строк в одном INSERT.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Список сохранённых строк, если успешно, иначе None.
+        """
+        if not rows:
+            return []
+        try:
+            async with cls._transaction(session) as session:
+                inserted = []
+                for chunk in cls._chunks(rows, chunk_size):
+                    # Многострочный INSERT с возвратом всех колонок
+                    query = (
+                        insert(cls.model)
+                        .values(chunk)
+                        .returning(*cls.model.__table__.columns)
+                    )
+                    result = await session.execute(query)
+                    inserted.extend(result.fetchall())
+                return inserted
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=f"Cannot add many {cls.model.__name__}",
+                extra={"rows": len(rows), "chunk_size": chunk_size},
+                session=session,
+            )
+
+    @classmethod
+    async def upsert_many(
+        cls,
+        rows: List[dict],
+        index_elements: Sequence[str],
+        update_columns: Sequence[str] | None = None,
+        chunk_size: int = 1000,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Вставляет или обновляет много объектов через INSERT ... ON CONFLICT.
+        :param rows: Данные объектов (словари с одинаковым набором ключей).
+        :param index_elements: Колонки уникального ограничения для ON CONFLICT.
+        :param update_columns: Колонки, обновляемые при конфликте;
+            если не заданы, конфликтующие строки пропускаются (DO NOTHING).
+        :param chunk_size: Максимальное количество строк в одном INSERT.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Список вставленных или обновлённых строк (пропущенные не
+            возвращаются), если успешно, иначе None.
+        """
+        if not rows:
+            return []
+        try:
+            async with cls._transaction(session) as session:
+                affected = []
+                for chunk in cls._chunks(rows, chunk_size):
+                    query = pg_insert(cls.model).values(chunk)
+                    if update_columns:
+                        query = query.on_conflict_do_update(
+                            index_elements=index_elements,
+                            set_={
+                                column: query.excluded[column]
+                                for column in update_columns
+                            },
+                        )
+                    else:
+                        query = query.on_conflict_do_nothing(
+                            index_elements=index_elements
+                        )
+                    query = query.returning(*cls.model.__table__.columns)
+                    result = await session.execute(query)
+                    affected.extend(result.fetchall())
+                return affected
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=f"Cannot upsert many {cls.model.__name__}",
+                extra={
+                    "rows": len(rows),
+                    "index_elements": list(index_elements),
+                    "update_columns": list(update_columns or []),
+                },
+                session=session,
+            )
+
+    @classmethod
+    async def copy_in(
+        cls,
+        records: Iterable[tuple] | AsyncIterable[tuple],
+        columns: Sequence[str],
+        session: AsyncSession | None = None,
+    ):
+        """
+        Загружает большие объёмы данных через COPY ... FROM STDIN
+        на «сыром» соединении asyncpg. Записи читаются потоково, поэтому
+        можно передавать генератор.
+        :param records: Кортежи значений в порядке columns (итерируемый
+            или асинхронный итерируемый объект).
+        :param columns: Имена колонок таблицы.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Количество загруженных строк, если успешно, иначе None.
+        """
+        try:
+            async with cls._transaction(session) as session:
+                connection = await session.connection()
+                # Адаптер asyncpg открывает транзакцию лениво, при первом запросе;
+                # без этого COPY на «сыром» соединении зафиксировался бы сам
+                # и не откатывался вместе с единицей работы
+                await connection.exec_driver_sql("SELECT 1")
+                raw_connection = await connection.get_raw_connection()
+                # Соединение asyncpg под адаптером SQLAlchemy
+                status = await raw_connection.driver_connection.copy_records_to_table(
+                    cls.model.__tablename__, records=records, columns=list(columns)
+                )
+                # asyncpg возвращает статус вида "COPY 12345"
+                return int(status.split()[-1])
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=f"Cannot copy in {cls.model.__name__}",
+                extra={"columns": list(columns)},
+                session=session,
             )
 
     @classmethod
-    async def find_by_id(cls, model_id: int | UUID4):
+    async def find_by_id(
+        cls, model_id: int | UUID4, session: AsyncSession | None = None
+    ):
         """
         Находит объект по его ID.
         :param model_id: Идентификатор объекта.
+        :param session: Сессия текущего запроса, если есть.
         :return: Найденный объект или None, если объект не найден.
         """
         try:
-            # Создание асинхронной сессии
-            async with async_session_maker() as session:
+            # Получение сессии (собственной или сессии запроса)
+            async with cls._session(session) as session:
                 # Формирование запроса для поиска объекта по ID
                 query = select(cls.model).filter_by(id=model_id)
                 # Выполнение запроса
@@ -66,18 +331,20 @@ class BaseDao(ErrorHandler):
                 e,
                 error_message=f"Cannot find {cls.model.__name__} by id",
                 extra={"model_id": model_id},
+                session=session,
             )
 
     @classmethod
-    async def find_one_or_none(cls, **filter_by):
+    async def find_one_or_none(cls, session: AsyncSession | None = None, **filter_by):
         """
         Находит один объект, соответствующий заданным фильтрам.
+        :param session: Сессия текущего запроса, если есть.
         :param filter_by: Критерии фильтрации.
         :return: Найденный объект или None, если объект не найден.
         """
         try:
-            # Создание асинхронной сессии
-            async with async_session_maker() as session:
+            # Получение сессии (собственной или сессии запроса)
+            async with cls._session(session) as session:
                 # Формирование запроса для поиска объекта с фильтрацией
                 query = select(cls.model).filter_by(**filter_by)
                 # Выполнение запроса
@@ -90,17 +357,50 @@ class BaseDao(ErrorHandler):
                 e,
                 error_message=f"Cannot find one or none for model {cls.model.__name__}",
                 extra=filter_by,
+                session=session,
+            )
+
+    @classmethod
+    async def find_one_as(
+        cls, dto: type[BaseDTO], session: AsyncSession | None = None, **filter_by
+    ):
+        """
+        Находит один объект и возвращает только нужные колонки в виде DTO.
+        В отличие от find_one_or_none не создаёт ORM-объект и не кладёт его
+        в identity map сессии.
+        :param dto: Класс DTO, поля которого задают выбираемые колонки.
+        :param session: Сессия текущего запроса, если есть.
+        :param filter_by: Критерии фильтрации.
+        :return: Экземпляр DTO или None, если объект не найден.
+        """
+        try:
+            async with cls._session(session) as session:
+                # Выбираем только колонки DTO
+                query = select(*dto.columns(cls.model)).filter_by(**filter_by)
+                result = await session.execute(query)
+                row = result.one_or_none()
+                return None if row is None else dto(*row)
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    f"Cannot find one as {dto.__name__} "
+                    f"for model {cls.model.__name__}"
+                ),
+                extra=filter_by,
+                session=session,
             )
 
     @classmethod
-    async def find_all(cls):
+    async def find_all(cls, session: AsyncSession | None = None):
         """
         Находит все объекты данного типа в базе данных.
+        :param session: Сессия текущего запроса, если есть.
         :return: Список всех объектов.
         """
         try:
-            # Создание асинхронной сессии
-            async with async_session_maker() as session:
+            # Получение сессии (собственной или сессии запроса)
+            async with cls._session(session) as session:
                 # Формирование запроса для поиска всех объектов
                 query = select(cls.model)
                 # Выполнение запроса
@@ -110,5 +410,10 @@ class BaseDao(ErrorHandler):
         except (SQLAlchemyError, Exception) as e:
             # Логирование ошибки с деталями
             cls._log_error(
-                e, error_message=f"Cannot find all for model {cls.model.__name__}"
+                e,
+                error_message=f"Cannot find all for model {cls.model.__name__}",
+                session=session,
             )
+
+
+_tag_dao_calls(BaseDao)
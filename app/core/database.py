@@ -1,17 +1,131 @@
-from sqlalchemy import NullPool
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from uuid import uuid4
+
+from fastapi import Depends, Request
+from sqlalchemy import NullPool, event, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.core.config import settings
+from app.core.pool import InstrumentedAsyncPool
+from app.core.routing import REPLICAS_KEY, ReplicaSet, RoutingSession, stick_to_primary
+from app.core.slow_queries import instrument_engine
 
 if settings.MODE == "TEST":
     DATABASE_URL = settings.TEST_DATABASE_URL
     DATABASE_PARAM = {"poolclass": NullPool}
 else:
     DATABASE_URL = settings.DATABASE_URL
-    DATABASE_PARAM = {}
+    DATABASE_PARAM = {
+        "poolclass": InstrumentedAsyncPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_PGBOUNCER_MODE:
+        # Подготовленные выражения с уникальными именами и без кэширования,
+        # чтобы не конфликтовать на общих серверных соединениях pgbouncer
+        DATABASE_PARAM["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    else:
+        DATABASE_PARAM["connect_args"] = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        }
+
+# Заголовок, которым клиент может потребовать чтение только из основной базы
+# (например, сразу после собственной записи)
+STICK_TO_PRIMARY_HEADER = "X-Read-Primary"
 
-engine = create_async_engine(DATABASE_URL, **DATABASE_PARAM)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+engine = create_async_engine(
+    DATABASE_URL, pool_logging_name="primary", **DATABASE_PARAM
+)
+# Реплики для чтения; в режиме TEST не используются
+replicas = ReplicaSet(
+    []
+    if settings.MODE == "TEST"
+    else [
+        create_async_engine(url, pool_logging_name=f"replica-{i}", **DATABASE_PARAM)
+        for i, url in enumerate(settings.DB_REPLICA_URLS)
+    ]
+)
+# Замер времени выражений для журнала медленных запросов
+for instrumented_engine in (engine, *replicas.engines):
+    instrument_engine(instrumented_engine)
+
+async_session_maker = sessionmaker(
+    engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+    info={REPLICAS_KEY: replicas},
+)
 
 Base = declarative_base()
+
+# Ключ session.info с бюджетом времени на каждый запрос сессии к базе, мс
+STATEMENT_TIMEOUT_KEY = "statement_timeout_ms"
+SET_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :value, true)")
+
+
+@event.listens_for(RoutingSession, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    """
+    Устанавливает statement_timeout сессии (SET LOCAL) в начале транзакции
+    на каждом соединении, которое она использует (основная база или реплика).
+    Действует только до конца транзакции, поэтому безопасно и через pgbouncer.
+    """
+    timeout = session.info.get(STATEMENT_TIMEOUT_KEY)
+    if timeout:
+        connection.execute(SET_STATEMENT_TIMEOUT, {"value": str(int(timeout))})
+
+
+@asynccontextmanager
+async def session_scope(
+    statement_timeout_ms: int | None = None,
+) -> AsyncIterator[AsyncSession]:
+    """
+    Единица работы: одна сессия и одна транзакция на HTTP-запрос или кадр WebSocket.
+    Фиксирует транзакцию при успешном выходе и откатывает её при исключении.
+    :param statement_timeout_ms: Бюджет времени на каждый запрос сессии, мс.
+    """
+    async with async_session_maker() as session:
+        if statement_timeout_ms:
+            session.info[STATEMENT_TIMEOUT_KEY] = statement_timeout_ms
+        async with session.begin():
+            yield session
+
+
+async def get_session(request: Request) -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI-зависимость, выдающая одну сессию на запрос.
+    FastAPI кэширует зависимость в рамках запроса, поэтому все DAO-вызовы
+    (включая аутентификацию) используют одно соединение из пула.
+    Заголовок X-Read-Primary направляет все чтения запроса в основную базу.
+    Каждый запрос к базе ограничен бюджетом QUERY_BUDGET_MS, если маршрут
+    не задал свой через query_budget.
+    """
+    async with session_scope(settings.QUERY_BUDGET_MS) as session:
+        if request.headers.get(STICK_TO_PRIMARY_HEADER):
+            stick_to_primary(session)
+        yield session
+
+
+def query_budget(milliseconds: int):
+    """
+    Зависимость маршрута, задающая бюджет времени на каждый запрос к базе:
+    dependencies=[Depends(query_budget(...))]. Зависимости маршрута вычисляются
+    раньше параметров обработчика, поэтому бюджет действует и на аутентификацию.
+    :param milliseconds: Значение statement_timeout, мс.
+    """
+
+    async def set_budget(session: AsyncSession = Depends(get_session)):
+        session.info[STATEMENT_TIMEOUT_KEY] = milliseconds
+
+    return set_budget
@@ -0,0 +1,24 @@
+class BaseDTO:
+    """
+    Лёгкий объект передачи данных на __slots__ для «горячих» чтений.
+    Поля DTO совпадают с колонками модели, из которых он заполняется;
+    объект не отслеживается сессией и не несёт инструментирования ORM.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def columns(cls, model) -> list:
+        """
+        Колонки модели для SELECT в порядке полей DTO.
+        :param model: Модель SQLAlchemy.
+        """
+        return [getattr(model, name) for name in cls.__slots__]
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
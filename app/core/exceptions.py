@@ -140,6 +140,48 @@ class UserMessagesBetweenYourselfException(BaseException):
     detail = "The user cannot send messages to himself."
 
 
+class RetentionPolicyNotFoundException(BaseException):
+    # Исключение для случая, когда для переписки не задана политика хранения
+    status_code = status.HTTP_404_NOT_FOUND
+    detail = "No retention policy is set for this conversation."
+
+
+class ModerationQueueItemNotFoundException(BaseException):
+    # Исключение для случая, когда записи очереди модерации нет или она уже рассмотрена
+    status_code = status.HTTP_404_NOT_FOUND
+    detail = "The moderation queue item was not found or has already been reviewed."
+
+
+class SenderThrottledException(BaseException):
+    # Исключение для случая, когда отправка временно ограничена за массовую рассылку
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    detail = (
+        "Too many messages to different recipients. Sending is temporarily limited."
+    )
+
+
+class AttachmentNotFoundException(BaseException):
+    # Исключение для случая, когда вложения нет или оно недоступно пользователю
+    status_code = status.HTTP_404_NOT_FOUND
+    detail = "The attachment was not found."
+
+
+class AttachmentTooLargeException(BaseException):
+    # Исключение для случая, когда загружаемый файл больше ATTACHMENT_MAX_SIZE
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    detail = "The attachment is too large."
+
+
+# Исключения для работы с базой данных
+
+
+class QueryTimeoutException(BaseException):
+    # Исключение для случая, когда запрос к базе превысил бюджет времени
+    # (statement_timeout)
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    detail = "The request took too long to process. Please try again later."
+
+
 # Класс для обработки ошибок и логирования
 
 
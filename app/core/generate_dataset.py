@@ -0,0 +1,269 @@
+"""
+Генератор синтетического набора данных для нагрузочных тестов и бенчмарков.
+
+Пример запуска (около 500 тысяч сообщений на единицу масштаба):
+
+    python -m app.core.generate_dataset --scale 20 --truncate
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import text
+
+from app.auth.auth_utilits import get_password_hash
+from app.auth.dao import UsersDao
+from app.chat.dao import MessageDAO
+from app.chat.partitions import ensure_partitions
+from app.core.database import engine
+from app.core.logger import logger
+from app.core.snowflake import (
+    MAX_SEQUENCE,
+    TIMESTAMP_SHIFT,
+    id_from_datetime,
+    timestamp_of,
+)
+
+# Базовые объёмы на единицу масштаба
+USERS_PER_SCALE = 2_000
+MESSAGES_PER_SCALE = 500_000
+
+USER_COLUMNS = ("id", "username", "email", "hashed_password", "is_moderator")
+MESSAGE_COLUMNS = ("id", "message_text", "sender_id", "recipient_id", "created_at")
+
+WORDS = (
+    "привет как дела что нового давай созвонимся завтра сегодня встреча "
+    "проект отчёт готов спасибо отлично хорошо посмотрю позже напишу "
+    "hello thanks meeting tomorrow done review deploy release ticket ok"
+).split()
+
+
+@dataclass
+class DatasetConfig:
+    users: int
+    conversations_per_user: int
+    messages: int
+    zipf_s: float
+    days: int
+    batch_size: int
+    seed: int
+    password: str
+
+
+def zipf_cum_weights(n: int, s: float) -> list:
+    """
+    Накопленные веса распределения Ципфа для рангов 1..n.
+    :param n: Количество элементов.
+    :param s: Показатель перекоса (чем больше, тем сильнее перекос).
+    """
+    return list(accumulate(1.0 / rank**s for rank in range(1, n + 1)))
+
+
+def make_texts(rng: random.Random, count: int = 2_000) -> list:
+    """
+    Заготовки текстов сообщений: в основном короткие, изредка длинные.
+    """
+    texts = []
+    for _ in range(count):
+        length = min(int(rng.lognormvariate(2.0, 0.9)) + 1, 600)
+        texts.append(" ".join(rng.choices(WORDS, k=length))[:4096])
+    return texts
+
+
+def make_users(config: DatasetConfig, rng: random.Random) -> list:
+    """
+    Идентификаторы пользователей. Порядок в списке задаёт ранг активности.
+    """
+    return [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(config.users)]
+
+
+def make_conversations(config: DatasetConfig, rng: random.Random):
+    """
+    Пары собеседников. Партнёры выбираются по Ципфу: популярные пользователи
+    участвуют в большом числе переписок. Пары хранятся в компактных массивах.
+    """
+    cum_weights = zipf_cum_weights(config.users, config.zipf_s)
+    population = range(config.users)
+    seen = set()
+    left, right = array("I"), array("I")
+    for user in population:
+        for partner in rng.choices(
+            population, cum_weights=cum_weights, k=config.conversations_per_user
+        ):
+            if partner == user:
+                continue
+            pair = (user, partner) if user < partner else (partner, user)
+            if pair in seen:
+                continue
+            seen.add(pair)
+            left.append(pair[0])
+            right.append(pair[1])
+    # Перемешиваем пары, чтобы активность переписки не зависела от ранга пользователей
+    order = list(range(len(left)))
+    rng.shuffle(order)
+    return array("I", (left[i] for i in order)), array("I", (right[i] for i in order))
+
+
+async def users_records(config: DatasetConfig, user_ids: list, password_hash: str):
+    moderators = max(1, config.users // 10_000)
+    for index, user_id in enumerate(user_ids):
+        yield (
+            user_id,
+            f"user_{index}",
+            f"user_{index}@example.com",
+            password_hash,
+            index < moderators,
+        )
+
+
+async def message_records(
+    config: DatasetConfig, rng: random.Random, user_ids: list, left, right, end
+):
+    """
+    Потоково генерирует сообщения партиями, чтобы не держать набор в памяти.
+
+    Время сообщений равномерно заполняет интервал config.days дней до end:
+    интервалы между соседними сообщениями случайны, поэтому сообщения идут
+    по возрастанию времени. ID собирается как у генератора воркера:
+    миллисекунда и последовательность внутри неё (при переполнении занимается
+    следующая миллисекунда), а created_at вычисляется из ID.
+    """
+    cum_weights = zipf_cum_weights(len(left), config.zipf_s)
+    pairs = range(len(left))
+    texts = make_texts(rng)
+    spread_ms = config.days * 86_400_000
+    start_ms = id_from_datetime(end - timedelta(days=config.days)) >> TIMESTAMP_SHIFT
+    mean_gap_ms = spread_ms / max(config.messages, 1)
+    elapsed_ms, last_ms, sequence = 0.0, -1, 0
+    generated = 0
+    while generated < config.messages:
+        batch = min(config.batch_size, config.messages - generated)
+        for pair in rng.choices(pairs, cum_weights=cum_weights, k=batch):
+            sender, recipient = user_ids[left[pair]], user_ids[right[pair]]
+            if rng.random() < 0.5:
+                sender, recipient = recipient, sender
+            elapsed_ms += rng.random() * 2 * mean_gap_ms
+            milliseconds = start_ms + int(elapsed_ms)
+            if milliseconds > last_ms:
+                last_ms, sequence = milliseconds, 0
+            else:
+                sequence += 1
+                if sequence > MAX_SEQUENCE:
+                    last_ms, sequence = last_ms + 1, 0
+            message_id = (last_ms << TIMESTAMP_SHIFT) | sequence
+            generated += 1
+            yield (
+                message_id,
+                rng.choice(texts),
+                sender,
+                recipient,
+                timestamp_of(message_id),
+            )
+        # Отдаём управление циклу событий между партиями
+        await asyncio.sleep(0)
+
+
+async def generate(config: DatasetConfig, truncate: bool):
+    rng = random.Random(config.seed)
+
+    if truncate:
+        async with engine.begin() as connection:
+            await connection.execute(
+                text("TRUNCATE messages, blocked_users, users RESTART IDENTITY CASCADE")
+            )
+        logger.info("Existing data has been truncated.")
+
+    # Один хеш пароля на всех пользователей: bcrypt слишком медленный
+    # для массовой генерации
+    password_hash = get_password_hash(config.password)
+
+    started = time.perf_counter()
+    user_ids = make_users(config, rng)
+    copied = await UsersDao.copy_in(
+        users_records(config, user_ids, password_hash), USER_COLUMNS
+    )
+    logger.info(
+        "Users have been generated.",
+        extra={"users": copied, "seconds": round(time.perf_counter() - started, 2)},
+    )
+
+    started = time.perf_counter()
+    left, right = make_conversations(config, rng)
+    logger.info(
+        "Conversations have been generated.",
+        extra={
+            "conversations": len(left),
+            "seconds": round(time.perf_counter() - started, 2),
+        },
+    )
+
+    # Секции messages на весь диапазон дат, чтобы строки не оседали
+    # в секции по умолчанию (с запасом в день: время последних сообщений
+    # может немного превысить end)
+    end = datetime.utcnow()
+    await ensure_partitions(
+        (end - timedelta(days=config.days)).date(), (end + timedelta(days=1)).date()
+    )
+
+    started = time.perf_counter()
+    copied = await MessageDAO.copy_in(
+        message_records(config, rng, user_ids, left, right, end),
+        MESSAGE_COLUMNS,
+    )
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Messages have been generated.",
+        extra={
+            "messages": copied,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": int((copied or 0) / elapsed) if elapsed else None,
+        },
+    )
+
+    # Актуальная статистика планировщика для воспроизведения реальных планов
+    async with engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("ANALYZE users"))
+        await connection.execute(text("ANALYZE messages"))
+
+
+def parse_args() -> tuple:
+    parser = argparse.ArgumentParser(description="Synthetic AtomChat dataset")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--conversations-per-user", type=int, default=20)
+    parser.add_argument("--messages", type=int)
+    parser.add_argument(
+        "--zipf-s", type=float, default=1.1, help="Перекос активности (Ципф)"
+    )
+    parser.add_argument("--days", type=int, default=365, help="Разброс по времени")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="benchmark_password")
+    parser.add_argument(
+        "--truncate", action="store_true", help="Очистить таблицы перед генерацией"
+    )
+    args = parser.parse_args()
+    config = DatasetConfig(
+        users=args.users or max(2, int(USERS_PER_SCALE * args.scale)),
+        conversations_per_user=args.conversations_per_user,
+        messages=args.messages or int(MESSAGES_PER_SCALE * args.scale),
+        zipf_s=args.zipf_s,
+        days=args.days,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        password=args.password,
+    )
+    return config, args.truncate
+
+
+if __name__ == "__main__":
+    config, truncate = parse_args()
+    asyncio.run(generate(config, truncate))
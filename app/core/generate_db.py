@@ -5,8 +5,8 @@ from datetime import datetime
 from sqlalchemy import text
 
 from app.auth.auth_utilits import get_password_hash
-from app.auth.models import User
-from app.chat.models import Message
+from app.auth.dao import UsersDao
+from app.chat.dao import MessageDAO
 from app.core.database import async_session_maker
 from app.core.logger import logger
 
@@ -18,52 +18,52 @@ async def add_test_users():
             logger.info("The test data already exists.")
             return
 
-        # Создаем трех пользователей
-        user1 = User(
-            id=uuid.uuid4(),
-            username="test_user1",
-            email="test1@example.com",
-            hashed_password=get_password_hash("test_password_1"),
-            is_moderator=False,
-        )
-        user2 = User(
-            id=uuid.uuid4(),
-            username="test_user2",
-            email="test2@example.com",
-            hashed_password=get_password_hash("test_password_2"),
-            is_moderator=False,
-        )
-        user3 = User(
-            id=uuid.uuid4(),
-            username="test_moderator",
-            email="moderator@example.com",
-            hashed_password=get_password_hash("moderator_password_3"),
-            is_moderator=True,
-        )
-
-        session.add_all([user1, user2, user3])
-        await session.commit()
-        logger.info("Test users have been successfully added.")
+    # Создаем трех пользователей одним INSERT
+    user1, user2, user3 = await UsersDao.add_many(
+        [
+            dict(
+                id=uuid.uuid4(),
+                username="test_user1",
+                email="test1@example.com",
+                hashed_password=get_password_hash("test_password_1"),
+                is_moderator=False,
+            ),
+            dict(
+                id=uuid.uuid4(),
+                username="test_user2",
+                email="test2@example.com",
+                hashed_password=get_password_hash("test_password_2"),
+                is_moderator=False,
+            ),
+            dict(
+                id=uuid.uuid4(),
+                username="test_moderator",
+                email="moderator@example.com",
+                hashed_password=get_password_hash("moderator_password_3"),
+                is_moderator=True,
+            ),
+        ]
+    )
+    logger.info("Test users have been successfully added.")
 
-        # Добавляем по 10 сообщений между пользователями
-        await add_test_messages(session, user1, user2)
-        await add_test_messages(session, user1, user3)
-        await add_test_messages(session, user2, user3)
+    # Добавляем по 10 сообщений между пользователями
+    await add_test_messages(user1, user2)
+    await add_test_messages(user1, user3)
+    await add_test_messages(user2, user3)
 
 
-async def add_test_messages(session, sender, recipient):
-    messages = []
-    for i in range(10):
-        message = Message(
+async def add_test_messages(sender, recipient):
+    messages = [
+        dict(
             message_text=f"Тестовое сообщение {i + 1} от {sender.username} к {recipient.username}",
             sender_id=sender.id,
             recipient_id=recipient.id,
             created_at=datetime.utcnow(),
         )
-        messages.append(message)
+        for i in range(10)
+    ]
 
-    session.add_all(messages)
-    await session.commit()
+    await MessageDAO.add_many(messages)
     logger.info(
         f"Messages between {sender.username} and {recipient.username} have been successfully added."
     )
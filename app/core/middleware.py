@@ -0,0 +1,254 @@
+import asyncio
+import re
+import zlib
+from contextlib import suppress
+from typing import Callable, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logger import logger
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli ответы сжимаются только gzip
+    brotli = None
+
+# Суффикс, который сжатое представление добавляет к ETag ответа
+ETAG_ENCODING_SUFFIX = re.compile(r'-(?:gzip|br)"')
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Отменяет обработку HTTP-запроса, если клиент отключился до получения ответа.
+
+    Без неё обработчик продолжает работу после ухода клиента и держит соединение
+    пула до конца запроса. Отмена задачи прерывает ожидание asyncpg, который
+    отправляет серверу запрос на отмену выполняемого выражения, а транзакция
+    запроса откатывается.
+
+    Сообщения клиента передаются приложению через очередь из одного элемента,
+    поэтому тело запроса по-прежнему читается с обратным давлением.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        response_complete = False
+
+        async def listen():
+            # Читает сообщения клиента до отключения. Об отключении сообщаем
+            # сразу, даже если приложение не читает очередь (например, GET без тела)
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    with suppress(asyncio.QueueFull):
+                        queue.put_nowait(message)
+                    return
+                await queue.put(message)
+
+        async def send_wrapper(message: Message):
+            nonlocal response_complete
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_complete = True
+
+        app_task = asyncio.create_task(self.app(scope, queue.get, send_wrapper))
+        listen_task = asyncio.create_task(listen())
+        try:
+            await asyncio.wait(
+                {app_task, listen_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            # После отправки ответа приложение может выполнять фоновые задачи,
+            # их отключение клиента не прерывает
+            if not app_task.done() and not response_complete:
+                app_task.cancel()
+                logger.info(
+                    "Client disconnected, request has been cancelled",
+                    extra={"method": scope["method"], "path": scope["path"]},
+                )
+            try:
+                await app_task
+            except asyncio.CancelledError:
+                if not listen_task.done() or asyncio.current_task().cancelling():
+                    raise
+        finally:
+            listen_task.cancel()
+            app_task.cancel()
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Выбирает кодировку сжатия по заголовку Accept-Encoding:
+    с наибольшим q, при равенстве br предпочтительнее gzip.
+    :param accept_encoding: Значение заголовка.
+    :return: "br", "gzip" или None, если клиент не принимает ни одну.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def make_compressor(
+    encoding: str, gzip_level: int, brotli_quality: int
+) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes], Callable[[], bytes]]:
+    """
+    Функции сжатия куска, сброса накопленного (для потоковых ответов)
+    и завершения потока.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=brotli_quality)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip или brotli по Accept-Encoding.
+
+    Сжимаются только ответы с типом содержимого из allow-листа и телом не меньше
+    minimum_size байт; пути из excluded_paths (короткие ответы аутентификации
+    с токенами) не сжимаются. Потоковые ответы сжимаются по мере отправки.
+    Сжатое представление получает свой строгий ETag с суффиксом кодировки;
+    в If-None-Match суффикс снимается до передачи запроса приложению и
+    возвращается в ответе 304.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int,
+        gzip_level: int,
+        brotli_quality: int,
+        content_types: Sequence[str],
+        excluded_paths: Sequence[str] = (),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = tuple(content_types)
+        self.excluded_paths = tuple(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = request_headers.get("if-none-match", "")
+        if ETAG_ENCODING_SUFFIX.search(if_none_match):
+            scope = dict(scope)
+            scope["headers"] = [
+                (
+                    (
+                        name,
+                        ETAG_ENCODING_SUFFIX.sub('"', value.decode("latin-1")).encode(),
+                    )
+                    if name == b"if-none-match"
+                    else (name, value)
+                )
+                for name, value in scope["headers"]
+            ]
+
+        start: Message | None = None
+        compress = flush = finish = None
+
+        def tag_etag(headers: MutableHeaders):
+            etag = headers.get("etag")
+            if etag and etag.endswith('"'):
+                headers["etag"] = f'{etag[:-1]}-{encoding}"'
+
+        async def send_wrapper(message: Message):
+            nonlocal start, compress, flush, finish
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                if message["status"] == 304:
+                    # Клиент хранит сжатое представление, если прислал его ETag
+                    etag = headers.get("etag")
+                    if etag and f'{etag[:-1]}-{encoding}"' in if_none_match:
+                        tag_etag(headers)
+                    await send({**message, "headers": headers.raw})
+                    return
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(
+                    self.content_types
+                ):
+                    start = None
+                    await send(message)
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                start = {**message, "headers": headers.raw}
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compress is None:
+                headers = MutableHeaders(raw=start["headers"])
+                length = headers.get("content-length")
+                small = (
+                    len(body) < self.minimum_size
+                    if not more_body
+                    else length is not None and int(length) < self.minimum_size
+                )
+                if small:
+                    await send(start)
+                    await send(message)
+                    start = None
+                    return
+                compress, flush, finish = make_compressor(
+                    encoding, self.gzip_level, self.brotli_quality
+                )
+                headers["content-encoding"] = encoding
+                tag_etag(headers)
+                if more_body:
+                    del headers["content-length"]
+                    await send(start)
+                else:
+                    body = compress(body) + finish()
+                    headers["content-length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            chunk = compress(body) + (flush() if more_body else finish())
+            await send(
+                {"type": "http.response.body", "body": chunk, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_wrapper)
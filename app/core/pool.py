@@ -0,0 +1,125 @@
+import time
+from bisect import bisect_left
+from typing import Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин (в миллисекундах).
+    Последняя корзина собирает все значения выше максимальной границы.
+    """
+
+    # Границы корзин по умолчанию для времени ожидания соединения, мс
+    DEFAULT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value_ms: float):
+        """
+        Добавляет наблюдение в гистограмму.
+        :param value_ms: Значение в миллисекундах.
+        """
+        self.counts[bisect_left(self.buckets, value_ms)] += 1
+        self.total += value_ms
+        self.count += 1
+
+    def as_dict(self) -> dict:
+        """
+        Возвращает состояние гистограммы в виде словаря для API.
+        """
+        labels = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+        }
+
+
+class PoolStats:
+    """
+    Счётчики пула соединений: количество выдач, тайм-ауты и время ожидания.
+    Экземпляры хранятся по имени пула, поэтому переживают пересоздание пула
+    при engine.dispose().
+    """
+
+    _registry: Dict[str, "PoolStats"] = {}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms = Histogram()
+
+    @classmethod
+    def for_pool(cls, name: str) -> "PoolStats":
+        """
+        Возвращает (создавая при необходимости) статистику пула по его имени.
+        :param name: Имя пула (pool_logging_name движка).
+        """
+        if name not in cls._registry:
+            cls._registry[name] = cls(name)
+        return cls._registry[name]
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool, замеряющий время ожидания свободного соединения
+    и считающий тайм-ауты выдачи.
+    """
+
+    @property
+    def stats(self) -> PoolStats:
+        return PoolStats.for_pool(self._orig_logging_name or "default")
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.wait_ms.observe((time.perf_counter() - start) * 1000)
+        self.stats.checkouts += 1
+        return connection
+
+
+def get_pool_status(pool: Pool, healthy: bool = True) -> dict:
+    """
+    Возвращает текущее состояние пула и накопленную статистику.
+    :param pool: Пул соединений движка (engine.pool).
+    :param healthy: Результат последней проверки исправности (для реплик).
+    """
+    status = {
+        "name": pool._orig_logging_name or "default",
+        "pool_class": type(pool).__name__,
+        "healthy": healthy,
+        "size": 0,
+        "checked_in": 0,
+        "checked_out": 0,
+        "overflow": 0,
+    }
+    # NullPool (режим TEST) не держит соединений и не ведёт счётчиков
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            # До заполнения пула SQLAlchemy возвращает отрицательное значение
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, InstrumentedAsyncPool):
+        stats = pool.stats
+        status.update(
+            checkouts=stats.checkouts,
+            checkout_timeouts=stats.timeouts,
+            wait_ms=stats.wait_ms.as_dict(),
+        )
+    return status
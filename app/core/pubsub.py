@@ -0,0 +1,116 @@
+"""
+Уведомления между воркерами через LISTEN/NOTIFY PostgreSQL.
+
+Уведомление публикуется в транзакции, которая изменила данные
+(pg_notify доставляется только после её фиксации), и приходит всем воркерам,
+включая отправителя. Воркер слушает каналы на отдельном соединении;
+после его потери и переподключения подписчики получают вызов on_reset,
+потому что уведомления за время разрыва могли быть пропущены.
+"""
+
+import asyncio
+import os
+from typing import Callable, Dict, List, Tuple
+from uuid import uuid4
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logger import logger
+
+NOTIFY = text("SELECT pg_notify(:channel, :payload)")
+
+# Уникальный идентификатор воркера, чтобы отличать собственные уведомления
+WORKER_TOKEN = f"{os.getpid()}-{uuid4().hex[:8]}"
+
+
+class PubSub:
+    """
+    Подписки воркера на каналы уведомлений.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Tuple[Callable, Callable | None]]] = {}
+        self.connected = False
+
+    def subscribe(
+        self,
+        channel: str,
+        handler: Callable[[str], None],
+        on_reset: Callable[[], None] | None = None,
+    ):
+        """
+        Регистрирует обработчик канала. Подписки нужно зарегистрировать
+        до запуска run().
+        :param channel: Имя канала.
+        :param handler: Обработчик полезной нагрузки уведомления.
+        :param on_reset: Вызывается при (пере)подключении слушателя.
+        """
+        self._handlers.setdefault(channel, []).append((handler, on_reset))
+
+    @staticmethod
+    async def publish(session: AsyncSession, channel: str, payload: str):
+        """
+        Публикует уведомление в транзакции сессии; оно будет доставлено
+        после фиксации и отброшено при откате.
+        :param session: Сессия текущей единицы работы.
+        :param channel: Имя канала.
+        :param payload: Полезная нагрузка (до 8000 байт).
+        """
+        await session.execute(NOTIFY, {"channel": channel, "payload": payload})
+
+    def _dispatch(self, connection, pid, channel: str, payload: str):
+        for handler, _ in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(
+                    "Notification handler failed",
+                    extra={"channel": channel, "error": str(e)},
+                )
+
+    def _reset(self):
+        for handlers in self._handlers.values():
+            for _, on_reset in handlers:
+                if on_reset is not None:
+                    on_reset()
+
+    async def run(self, reconnect_interval: float):
+        """
+        Фоновая задача: слушает все каналы с подписками и переподключается
+        при потере соединения.
+        :param reconnect_interval: Пауза перед переподключением в секундах.
+        """
+        url = (settings.DB_LISTEN_URL or settings.DATABASE_URL).replace(
+            "postgresql+asyncpg://", "postgresql://"
+        )
+        while True:
+            lost = asyncio.Event()
+            connection = None
+            try:
+                connection = await asyncpg.connect(url)
+                connection.add_termination_listener(lambda _: lost.set())
+                for channel in self._handlers:
+                    await connection.add_listener(channel, self._dispatch)
+                # Всё, что могло измениться до подписки, считается устаревшим
+                self._reset()
+                self.connected = True
+                logger.info(
+                    "Listening for notifications",
+                    extra={"channels": list(self._handlers)},
+                )
+                await lost.wait()
+                logger.warning("Notification listener connection lost")
+            except Exception as e:
+                logger.error("Notification listener failed", extra={"error": str(e)})
+            finally:
+                self.connected = False
+                self._reset()
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(reconnect_interval)
+
+
+pubsub = PubSub()
@@ -0,0 +1,60 @@
+"""
+Быстрая сериализация ответов горячих маршрутов.
+
+Сервисы собирают словари в форме схем ответа, а FastAPI для response_model
+проверяет их схемой ещё раз, преобразует в JSON-совместимые объекты и только
+потом вызывает json.dumps. Маршруты, которые возвращают json_response(...),
+пропускают этот путь: словарь сразу кодируется orjson (UUID и datetime
+он кодирует сам, в том же формате, что и pydantic; UUID из asyncpg — подкласс
+uuid.UUID, который orjson не принимает, — кодируется через default). Проверка
+схемой выполняется только вне PROD, чтобы расхождение словарей со схемами
+ловилось тестами и при разработке. response_model у маршрутов остаётся для OpenAPI.
+"""
+
+from typing import Any, Mapping, Type
+from uuid import UUID
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+VALIDATE_RESPONSES = settings.MODE != "PROD"
+
+
+def _default(value: Any) -> str:
+    # orjson кодирует только сам uuid.UUID, а столбцы из сырых запросов
+    # asyncpg возвращает его подклассом
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def render_model(model: Type[BaseModel], content: Mapping) -> bytes:
+    """
+    Кодирует словарь в форме схемы ответа в JSON.
+    :param model: Схема ответа маршрута.
+    :param content: Словарь, собранный сервисом.
+    :raises ValidationError: Вне PROD, если словарь не соответствует схеме.
+    """
+    if VALIDATE_RESPONSES:
+        model.model_validate(content)
+    return orjson.dumps(content, default=_default)
+
+
+def json_response(
+    model: Type[BaseModel],
+    content: Mapping,
+    status_code: int = 200,
+    headers: Mapping[str, str] | None = None,
+) -> Response:
+    """
+    Ответ с телом, закодированным render_model.
+    """
+    return Response(
+        content=render_model(model, content),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
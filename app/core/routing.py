@@ -0,0 +1,110 @@
+import asyncio
+from itertools import count
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.core.logger import logger
+
+# Опция выполнения, которой DAO помечают запросы, допускающие чтение с реплики
+USE_REPLICA = "use_replica"
+# Ключи в session.info, управляющие маршрутизацией
+REPLICAS_KEY = "replicas"
+STICK_TO_PRIMARY_KEY = "stick_to_primary"
+HAS_WRITES_KEY = "has_writes"
+
+
+class ReplicaSet:
+    """
+    Набор реплик для чтения с выбором по кругу (round-robin) среди исправных.
+    Исправность реплик периодически проверяется запросом SELECT 1.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], check_timeout: float = 2.0):
+        self.engines = engines
+        self.healthy = list(engines)
+        self.check_timeout = check_timeout
+        self._counter = count()
+
+    def choose(self) -> AsyncEngine | None:
+        """
+        Возвращает следующую исправную реплику или None, если таких нет.
+        """
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def _is_healthy(self, engine: AsyncEngine) -> bool:
+        try:
+            async with engine.connect() as connection:
+                await asyncio.wait_for(
+                    connection.execute(text("SELECT 1")), self.check_timeout
+                )
+            return True
+        except Exception as e:
+            logger.warning(
+                "Replica health check failed",
+                extra={"replica": engine.pool.logging_name, "error": str(e)},
+            )
+            return False
+
+    async def check_health(self):
+        """
+        Проверяет все реплики и обновляет список исправных.
+        """
+        results = await asyncio.gather(
+            *(self._is_healthy(engine) for engine in self.engines)
+        )
+        self.healthy = [
+            engine for engine, healthy in zip(self.engines, results) if healthy
+        ]
+
+    async def run_health_checks(self, interval: float):
+        """
+        Фоновая задача: проверяет реплики каждые interval секунд.
+        :param interval: Интервал между проверками в секундах.
+        """
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, направляющая помеченные DAO запросы на чтение в реплики.
+
+    Запросы идут в основную базу, если:
+    - запрос не помечен опцией use_replica;
+    - это запись (INSERT/UPDATE/DELETE или flush) — после неё все последующие
+      чтения этой сессии тоже идут в основную базу (read-after-write);
+    - для сессии включено «прилипание» к основной базе (stick_to_primary);
+    - реплики не настроены или ни одна из них не исправна.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info[HAS_WRITES_KEY] = True
+        elif (
+            isinstance(clause, Executable)
+            and clause.get_execution_options().get(USE_REPLICA)
+            and not self.info.get(HAS_WRITES_KEY)
+            and not self.info.get(STICK_TO_PRIMARY_KEY)
+        ):
+            replicas: ReplicaSet | None = self.info.get(REPLICAS_KEY)
+            replica = replicas.choose() if replicas else None
+            if replica is not None:
+                return replica.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+def stick_to_primary(session: AsyncSession):
+    """
+    Направляет все последующие запросы сессии в основную базу.
+    :param session: Сессия текущего запроса.
+    """
+    session.info[STICK_TO_PRIMARY_KEY] = True
@@ -0,0 +1,160 @@
+"""
+Журнал медленных запросов.
+
+Обработчики событий движка замеряют время каждого выражения. Выражения дольше
+SLOW_QUERY_MS логируются вместе с вызвавшим их методом DAO (без значений
+параметров) и попадают в кольцевой буфер, доступный модераторам через
+GET /moderation/stats/slow-queries/. Для части медленных SELECT (доля
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE) в фоне снимается план EXPLAIN (ANALYZE, BUFFERS).
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, List
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# Метод DAO, выполняющий запросы в текущем контексте (устанавливает BaseDao)
+dao_call: ContextVar[str | None] = ContextVar("dao_call", default=None)
+
+# Значения этих типов не считаются чувствительными и логируются как есть
+SAFE_PARAMETER_TYPES = (bool, int, float, type(None))
+
+
+def redact_parameters(parameters) -> list:
+    """
+    Заменяет значения параметров (кроме чисел, bool и None) названиями их типов.
+    :param parameters: Позиционные параметры выражения.
+    """
+    return [
+        (
+            value
+            if isinstance(value, SAFE_PARAMETER_TYPES)
+            else f"<{type(value).__name__}>"
+        )
+        for value in parameters or ()
+    ]
+
+
+class SlowQueryLog:
+    """
+    Кольцевой буфер последних медленных запросов этого воркера.
+    """
+
+    def __init__(self, size: int):
+        self.entries: Deque[dict] = deque(maxlen=size)
+        self.total = 0
+        # Одновременно снимается не больше одного плана, чтобы не занимать пул
+        self._explain_task: asyncio.Task | None = None
+
+    def record(self, entry: dict):
+        self.entries.append(entry)
+        self.total += 1
+
+    def snapshot(self) -> List[dict]:
+        """
+        Записи от новых к старым.
+        """
+        return list(reversed(self.entries))
+
+    def maybe_explain(
+        self, engine: AsyncEngine, entry: dict, statement: str, parameters
+    ):
+        """
+        Запускает в фоне снятие плана для доли медленных SELECT.
+        EXPLAIN ANALYZE выполняет выражение, поэтому изменяющие запросы пропускаются.
+        """
+        if (
+            self._explain_task is not None
+            or statement.lstrip()[:6].upper() != "SELECT"
+            or random.random() >= settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+        ):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explain_task = loop.create_task(
+            self._explain(engine, entry, statement, tuple(parameters or ()))
+        )
+
+    async def _explain(
+        self, engine: AsyncEngine, entry: dict, statement: str, parameters
+    ):
+        """
+        Снимает план медленного запроса на отдельном соединении того же движка
+        и сохраняет его в записи. Транзакция откатывается, время плана ограничено.
+        """
+        try:
+            async with engine.connect() as connection:
+                raw = await connection.get_raw_connection()
+                driver = raw.driver_connection
+                async with driver.transaction():
+                    await driver.execute(
+                        "SELECT set_config('statement_timeout', $1, true)",
+                        str(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS),
+                    )
+                    rows = await driver.fetch(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {statement}", *parameters
+                    )
+            entry["plan"] = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            logger.warning(
+                "Cannot capture slow query plan",
+                extra={"dao_call": entry["dao_call"], "error": str(e)},
+            )
+        finally:
+            self._explain_task = None
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
+
+
+def instrument_engine(engine: AsyncEngine, log: SlowQueryLog = slow_query_log):
+    """
+    Подключает замер времени выражений к движку.
+    :param engine: Асинхронный движок (основная база или реплика).
+    :param log: Буфер медленных запросов.
+    """
+    if settings.SLOW_QUERY_MS is None:
+        return
+    threshold = settings.SLOW_QUERY_MS / 1000
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_start
+        if elapsed < threshold:
+            return
+        entry = {
+            "time": datetime.utcnow(),
+            "dao_call": dao_call.get(),
+            "database": engine.pool.logging_name,
+            "duration_ms": round(elapsed * 1000, 3),
+            "statement": statement,
+            "parameters": redact_parameters(
+                parameters[0] if executemany else parameters
+            ),
+            "executemany": executemany,
+            "plan": None,
+        }
+        log.record(entry)
+        logger.warning(
+            "Slow query",
+            extra={key: entry[key] for key in entry if key not in ("time", "plan")},
+        )
+        if not executemany:
+            log.maybe_explain(engine, entry, statement, parameters)
@@ -0,0 +1,288 @@
+"""
+64-битные идентификаторы, упорядоченные по времени (в стиле Snowflake).
+
+Раскладка битов (старший бит всегда 0):
+
+    | 41 бит: мс от EPOCH | 10 бит: воркер | 12 бит: последовательность |
+
+Идентификатор выдаётся в воркере до вставки в базу, поэтому сообщение можно
+подтвердить и разослать с окончательным ID параллельно со вставкой.
+Идентификаторы одного воркера строго возрастают, а порядок идентификаторов
+разных воркеров совпадает с порядком времени с точностью до миллисекунды.
+
+Уникальность между процессами обеспечивает номер воркера: каждый процесс
+арендует свой номер сессионной advisory-блокировкой PostgreSQL (WorkerIdLease)
+и держит её на отдельном соединении, пока жив. Без аренды (DEBUG и TEST)
+номер берётся из SNOWFLAKE_WORKER_ID или PID, в PROD выдача идентификаторов
+без аренды запрещена. created_at сообщения всегда вычисляется из его ID,
+поэтому повтор ID отклоняется первичным ключом (id, created_at).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Annotated
+
+import asyncpg
+from pydantic import PlainSerializer, WithJsonSchema
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# Начало отсчёта: 2024-01-01T00:00:00Z (хватает на ~69 лет)
+EPOCH_MS = 1_704_067_200_000
+EPOCH = datetime(2024, 1, 1)
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Идентификаторы, выданные последовательностью PostgreSQL до перехода на snowflake,
+# меньше этой границы; время из них извлечь нельзя
+LEGACY_ID_LIMIT = 1 << 31
+
+# Первый ключ advisory-блокировок аренды номера воркера ("snow"), второй — номер
+WORKER_LEASE_LOCK_KEY = 0x736E6F77
+TRY_LEASE = "SELECT pg_try_advisory_lock($1, $2)"
+
+# ID сообщения в JSON передаётся строкой: 64-битные числа больше 2^53
+# теряют точность в JavaScript. На входе принимаются и строка, и число
+MessageId = Annotated[
+    int,
+    PlainSerializer(str, return_type=str, when_used="json"),
+    WithJsonSchema(
+        {"type": "string", "pattern": "^[0-9]+$", "example": "1234567890123"},
+        mode="serialization",
+    ),
+]
+
+
+class WorkerIdUnavailableError(RuntimeError):
+    """
+    Номер воркера не арендован, и выдавать идентификаторы нельзя.
+    """
+
+
+class SnowflakeGenerator:
+    """
+    Генератор идентификаторов для одного воркера.
+
+    Обработка перевода часов назад: генератор никогда не берёт время меньше
+    последнего выданного, а продолжает выдавать идентификаторы «из будущего»
+    (увеличивая последовательность и при переполнении — миллисекунду), пока
+    системные часы не догонят. Так монотонность сохраняется без блокировки
+    цикла событий; откаты больше допустимого логируются.
+    """
+
+    def __init__(
+        self,
+        worker_id: int,
+        epoch_ms: int = EPOCH_MS,
+        max_clock_skew_ms: int = 1000,
+        clock=time.time_ns,
+    ):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be in [0, {MAX_WORKER_ID}]")
+        self.worker_id = worker_id
+        self.epoch_ms = epoch_ms
+        self.max_clock_skew_ms = max_clock_skew_ms
+        self.clock_skew_events = 0
+        self._clock = clock
+        self._last_ms = -1
+        self._last_now = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _now_ms(self) -> int:
+        return self._clock() // 1_000_000 - self.epoch_ms
+
+    def next_id(self) -> int:
+        """
+        Возвращает следующий идентификатор.
+        """
+        with self._lock:
+            now = self._now_ms()
+            if self._last_now - now > self.max_clock_skew_ms:
+                # Логируется один раз на каждый скачок часов назад
+                self.clock_skew_events += 1
+                logger.warning(
+                    "Clock moved backwards, issuing ids ahead of the clock",
+                    extra={"skew_ms": self._last_now - now},
+                )
+            self._last_now = now
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            else:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Последовательность миллисекунды исчерпана: занимаем следующую
+                    self._last_ms += 1
+            return (
+                (self._last_ms << TIMESTAMP_SHIFT)
+                | (self.worker_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+
+
+def is_snowflake(value: int) -> bool:
+    """
+    Выдан ли идентификатор генератором (а не последовательностью PostgreSQL).
+    """
+    return value >= LEGACY_ID_LIMIT
+
+
+def timestamp_of(value: int) -> datetime:
+    """
+    Время выдачи идентификатора (UTC без часового пояса, как created_at в базе).
+    """
+    return EPOCH + timedelta(milliseconds=value >> TIMESTAMP_SHIFT)
+
+
+def id_from_datetime(value: datetime, low_bits: int = 0) -> int:
+    """
+    Идентификатор с заданным временем. С low_bits=0 — наименьший идентификатор
+    этой миллисекунды (удобно как граница при поиске по времени).
+    :param value: Время (UTC без часового пояса).
+    :param low_bits: Младшие 22 бита (воркер и последовательность).
+    """
+    milliseconds = (value - EPOCH) // timedelta(milliseconds=1)
+    return (milliseconds << TIMESTAMP_SHIFT) | (low_bits & ((1 << TIMESTAMP_SHIFT) - 1))
+
+
+class WorkerIdLease:
+    """
+    Аренда номера воркера на время жизни процесса.
+
+    Номер закреплён сессионной advisory-блокировкой на отдельном соединении:
+    PostgreSQL снимает её, когда соединение закрывается (в том числе при
+    падении процесса или контейнера), и номер может занять другой процесс.
+    Поэтому при потере соединения номер сразу считается утраченным, а фоновая
+    задача арендует номер заново.
+    """
+
+    def __init__(self, url: str | None = None):
+        self.url = url
+        self.worker_id: int | None = None
+        self._connection: asyncpg.Connection | None = None
+
+    def _candidates(self) -> list:
+        if settings.SNOWFLAKE_WORKER_ID is not None:
+            # Явно заданный номер не подменяется другим: конфликт — ошибка настройки
+            return [settings.SNOWFLAKE_WORKER_ID]
+        # Перебор с позиции по PID, чтобы процессы реже проверяли одни и те же номера
+        start = os.getpid() & MAX_WORKER_ID
+        return [(start + offset) & MAX_WORKER_ID for offset in range(MAX_WORKER_ID + 1)]
+
+    async def acquire(self) -> int:
+        """
+        Арендует свободный номер воркера.
+        :raises WorkerIdUnavailableError: Если все номера (или явно заданный
+            SNOWFLAKE_WORKER_ID) заняты другими процессами.
+        :return: Номер воркера.
+        """
+        url = (self.url or settings.DB_LISTEN_URL or settings.DATABASE_URL).replace(
+            "postgresql+asyncpg://", "postgresql://"
+        )
+        connection = await asyncpg.connect(url)
+        try:
+            for candidate in self._candidates():
+                if await connection.fetchval(
+                    TRY_LEASE, WORKER_LEASE_LOCK_KEY, candidate
+                ):
+                    break
+            else:
+                raise WorkerIdUnavailableError(
+                    "No free snowflake worker id: all candidates are leased"
+                )
+        except BaseException:
+            connection.terminate()
+            raise
+        connection.add_termination_listener(self._terminated)
+        self._connection, self.worker_id = connection, candidate
+        logger.info("Snowflake worker id leased", extra={"worker_id": candidate})
+        return candidate
+
+    def _terminated(self, connection: asyncpg.Connection):
+        # Уведомление может прийти от соединения, которое уже заменено новым
+        if connection is self._connection:
+            self.release()
+
+    def release(self):
+        """
+        Отказывается от номера и закрывает соединение аренды.
+        """
+        connection, self._connection, self.worker_id = self._connection, None, None
+        if connection is not None and not connection.is_closed():
+            connection.terminate()
+
+    async def run(self, check_interval: float):
+        """
+        Фоновая задача: проверяет соединение аренды и арендует номер заново
+        после его потери.
+        :param check_interval: Интервал проверки в секундах.
+        """
+        try:
+            while True:
+                await asyncio.sleep(check_interval)
+                try:
+                    if self._connection is None:
+                        await self.acquire()
+                    else:
+                        await self._connection.fetchval("SELECT 1")
+                except Exception as e:
+                    logger.error(
+                        "Snowflake worker id lease lost", extra={"error": str(e)}
+                    )
+                    self.release()
+        finally:
+            self.release()
+
+
+worker_id_lease = WorkerIdLease()
+
+
+def default_worker_id() -> int:
+    """
+    Номер воркера: арендованный (см. WorkerIdLease). Без аренды вне PROD —
+    из настройки SNOWFLAKE_WORKER_ID или PID процесса; PID разных контейнеров
+    совпадают, поэтому в PROD такой номер не используется.
+    :raises WorkerIdUnavailableError: В PROD, если номер не арендован.
+    """
+    if worker_id_lease.worker_id is not None:
+        return worker_id_lease.worker_id
+    if settings.MODE == "PROD":
+        raise WorkerIdUnavailableError("Snowflake worker id is not leased")
+    if settings.SNOWFLAKE_WORKER_ID is not None:
+        return settings.SNOWFLAKE_WORKER_ID
+    return os.getpid() & MAX_WORKER_ID
+
+
+_generator: SnowflakeGenerator | None = None
+_generator_owner: tuple | None = None
+
+
+def next_message_id() -> int:
+    """
+    Следующий идентификатор сообщения этого воркера.
+    Генератор создаётся при первом вызове в процессе, чтобы воркеры,
+    порождённые fork после импорта приложения, получили собственный номер,
+    и заново — если после потери аренды номер воркера сменился.
+    :raises WorkerIdUnavailableError: В PROD, если номер не арендован.
+    """
+    global _generator, _generator_owner
+    owner = (os.getpid(), default_worker_id())
+    if _generator_owner != owner:
+        _generator = SnowflakeGenerator(owner[1])
+        _generator_owner = owner
+    return _generator.next_id()
+
+
+def message_created_at(context) -> datetime:
+    """
+    Значение по умолчанию messages.created_at: время из ID сообщения.
+    """
+    return timestamp_of(context.get_current_parameters()["id"])
@@ -1,14 +1,78 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from app.auth.router import router as AuthRouter
+from app.chat.partitions import run_partition_maintenance
+from app.chat.retention import run_retention
 from app.chat.router import router as ChatRouter
 from app.core.config import settings
+from app.core.database import engine, replicas
+from app.core.middleware import CancelOnDisconnectMiddleware, CompressionMiddleware
+from app.core.pubsub import pubsub
+from app.core.snowflake import worker_id_lease
 from app.moderation.router import router as ModRouter
+from app.moderation.screening import screener
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.MODE != "TEST":
+        # Номер воркера для ID сообщений; без него воркер не запускается
+        await worker_id_lease.acquire()
+    # Фоновые задачи воркера, работающие всё время жизни приложения
+    background_tasks = []
+    if replicas.engines:
+        background_tasks.append(
+            asyncio.create_task(
+                replicas.run_health_checks(settings.DB_REPLICA_HEALTH_CHECK_INTERVAL)
+            )
+        )
+    if settings.MODE != "TEST":
+        background_tasks.append(
+            asyncio.create_task(
+                worker_id_lease.run(settings.SNOWFLAKE_LEASE_CHECK_INTERVAL)
+            )
+        )
+        background_tasks.append(
+            asyncio.create_task(
+                run_partition_maintenance(settings.MESSAGES_PARTITIONS_CHECK_INTERVAL)
+            )
+        )
+        background_tasks.append(
+            asyncio.create_task(run_retention(settings.RETENTION_INTERVAL))
+        )
+        background_tasks.append(
+            asyncio.create_task(pubsub.run(settings.PUBSUB_RECONNECT_INTERVAL))
+        )
+        if settings.SCREENING_ENABLED:
+            background_tasks.append(asyncio.create_task(screener.run()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    for replica in replicas.engines:
+        await replica.dispose()
+    await engine.dispose()
+
 
 app = FastAPI(
     title="AtomChat API",
     docs_url=None if settings.MODE == "PROD" else "/docs",
     redoc_url=None if settings.MODE == "PROD" else "/redoc",
+    lifespan=lifespan,
+)
+# Отмена обработки запросов, клиент которых отключился, чтобы не держать соединения пула
+app.add_middleware(CancelOnDisconnectMiddleware)
+# Сжатие крупных ответов (история сообщений, списки модерации)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    content_types=settings.COMPRESSION_CONTENT_TYPES,
+    excluded_paths=settings.COMPRESSION_EXCLUDED_PATHS,
 )
 
 app.include_router(AuthRouter, prefix="/api/v1")
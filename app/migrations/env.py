@@ -7,8 +7,14 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from app.auth.models import Blocked, User  # noqa
-from app.chat.models import Message  # noqa
+from app.chat.models import (  # noqa
+    Attachment,
+    ConversationRead,
+    Message,
+    RetentionPolicy,
+)
 from app.core.database import DATABASE_URL, Base
+from app.moderation.models import ModerationQueueItem  # noqa
 
 # sys.path.insert(0, dirname(dirname(dirname(abspath(__file__)))))
 # this is the Alembic Config object, which provides
@@ -0,0 +1,179 @@
+"""Partition messages by month
+
+Revision ID: 7b3e91c2d4a5
+Revises: 04c7d9fe26f0
+Create Date: 2026-10-18 10:30:12.418305
+
+Таблица переименовывается и создаётся заново в одной короткой транзакции,
+после чего приложение пишет уже в секционированную таблицу. Старые строки
+переносятся порциями по COPY_BATCH_SIZE, каждая в своей транзакции, поэтому
+эксклюзивные блокировки не держатся на время всего переноса. Пока перенос
+не закончен, история переписок не содержит ещё не перенесённых сообщений.
+Прерванную миграцию можно запустить снова: она продолжит перенос с того места,
+где остановилась.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision: str = "7b3e91c2d4a5"
+down_revision: Union[str, None] = "04c7d9fe26f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперёд создавать секции (дальше их создаёт app/chat/partitions.py)
+PARTITIONS_AHEAD = 3
+
+MESSAGE_INDEXES = ("created_at", "id", "recipient_id", "sender_id")
+MESSAGE_COLUMNS = "id, message_text, sender_id, recipient_id, created_at"
+# Сколько строк переносится одной транзакцией
+COPY_BATCH_SIZE = 50000
+
+# Порция старых строк переносится из messages_legacy в messages
+MOVE_BATCH = text(
+    f"""
+    WITH batch AS (
+        DELETE FROM messages_legacy
+        WHERE id IN (
+            SELECT id FROM messages_legacy WHERE id > :after ORDER BY id LIMIT :limit
+        )
+        RETURNING {MESSAGE_COLUMNS}
+    ), moved AS (
+        INSERT INTO messages ({MESSAGE_COLUMNS}) SELECT {MESSAGE_COLUMNS} FROM batch
+    )
+    SELECT count(*), max(id) FROM batch
+    """
+)
+
+
+def _create_messages_table(name: str, id_type, *args, **kw) -> None:
+    op.create_table(
+        name,
+        sa.Column(
+            "id",
+            id_type,
+            server_default=sa.text("nextval('messages_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("message_text", sa.String(length=4096), nullable=False),
+        sa.Column("sender_id", sa.UUID(), nullable=False),
+        sa.Column("recipient_id", sa.UUID(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["recipient_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"]),
+        *args,
+        **kw,
+    )
+
+
+def _rename_indexes(old_table: str, new_table: str) -> None:
+    for column in MESSAGE_INDEXES:
+        op.execute(
+            f"ALTER INDEX ix_{old_table}_{column} RENAME TO ix_{new_table}_{column}"
+        )
+
+
+def _create_indexes(table: str) -> None:
+    for column in MESSAGE_INDEXES:
+        op.create_index(f"ix_{table}_{column}", table, [column], unique=False)
+
+
+def _create_partitioned_table() -> None:
+    # Старая таблица переименовывается вместе с индексами и ключом
+    op.rename_table("messages", "messages_legacy")
+    op.execute(
+        "ALTER TABLE messages_legacy "
+        "RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey"
+    )
+    _rename_indexes("messages", "messages_legacy")
+
+    # Секционированная таблица; ключ секционирования входит в первичный ключ.
+    # id сразу BIGINT под ID, выдаваемые приложением (e49b6c2f8a17): смена типа
+    # позже переписала бы все секции под эксклюзивной блокировкой
+    _create_messages_table(
+        "messages",
+        sa.BigInteger(),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    _create_indexes("messages")
+
+    # Секции по месяцам от самого раннего сообщения до PARTITIONS_AHEAD месяцев вперёд
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE(
+                        (SELECT min(created_at) FROM messages_legacy),
+                        now() AT TIME ZONE 'utc'
+                    )),
+                    date_trunc('month', now() AT TIME ZONE 'utc')
+                        + interval '{PARTITIONS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'messages_y' || to_char(month, 'YYYY')
+                        || 'm' || to_char(month, 'MM'),
+                    month,
+                    (month + interval '1 month')::date
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # messages_legacy остаётся после прерванного переноса
+    if not bind.scalar(text("SELECT to_regclass('messages_legacy') IS NOT NULL")):
+        _create_partitioned_table()
+
+    # Перенос данных порциями, каждая порция фиксируется отдельно
+    with op.get_context().autocommit_block():
+        after = -1
+        while True:
+            moved, last_id = bind.execute(
+                MOVE_BATCH, {"after": after, "limit": COPY_BATCH_SIZE}
+            ).one()
+            if not moved:
+                break
+            after = last_id
+
+    # Передача последовательности новой таблице
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.drop_table("messages_legacy")
+    op.execute("ANALYZE messages")
+
+
+def downgrade() -> None:
+    # Обычная таблица с прежней схемой, данные переносятся из всех секций;
+    # возможно, только пока в таблице нет ID, выданных приложением
+    _create_messages_table(
+        "messages_plain", sa.Integer(), sa.PrimaryKeyConstraint("id")
+    )
+    op.execute(
+        f"INSERT INTO messages_plain ({MESSAGE_COLUMNS}) "
+        f"SELECT {MESSAGE_COLUMNS} FROM messages"
+    )
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages_plain.id")
+    # Удаление родительской таблицы удаляет и все присоединённые секции
+    op.drop_table("messages")
+    op.rename_table("messages_plain", "messages")
+    op.execute(
+        "ALTER TABLE messages RENAME CONSTRAINT messages_plain_pkey TO messages_pkey"
+    )
+    _create_indexes("messages")
@@ -0,0 +1,47 @@
+"""Snowflake message ids
+
+Revision ID: e49b6c2f8a17
+Revises: 5d1e7a9b3c60
+Create Date: 2026-10-18 15:05:27.930418
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e49b6c2f8a17"
+down_revision: Union[str, None] = "5d1e7a9b3c60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ID сообщений выдаёт приложение; существующие ID последовательности
+    # остаются как есть и по порядку предшествуют новым. Столбцы ID уже
+    # BIGINT (7b3e91c2d4a5, 5d1e7a9b3c60), таблица не переписывается
+    op.alter_column("messages", "id", server_default=None)
+    op.execute("DROP SEQUENCE messages_id_seq")
+    # Индекс для курсора истории переписки по одному столбцу id
+    op.create_index(
+        "ix_messages_sender_id_recipient_id_id",
+        "messages",
+        ["sender_id", "recipient_id", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_sender_id_recipient_id_id", table_name="messages")
+    op.execute("CREATE SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute(
+        "SELECT setval('messages_id_seq', "
+        "COALESCE((SELECT max(id) FROM messages), 0) + 1, false)"
+    )
+    op.alter_column(
+        "messages",
+        "id",
+        server_default=sa.text("nextval('messages_id_seq'::regclass)"),
+    )
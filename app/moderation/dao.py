@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import UUID4
+from sqlalchemy import desc, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.dao import BaseDao
+from app.moderation.models import ModerationQueueItem
+
+
+class ModerationQueueDao(BaseDao):
+    """
+    DAO для очереди сообщений, отмеченных проверкой содержимого.
+    """
+
+    model = ModerationQueueItem
+
+    @classmethod
+    async def get_page(
+        cls,
+        status: str,
+        cursor_id: int | None,
+        limit: int,
+        session: AsyncSession | None = None,
+    ) -> List[ModerationQueueItem] | None:
+        """
+        Страница очереди в заданном статусе, от новых записей к старым.
+
+        :param status: Статус записей (pending, resolved, dismissed).
+        :param cursor_id: ID последней записи предыдущей страницы.
+        :param limit: Максимальное количество записей.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Список записей очереди.
+        """
+        try:
+            async with cls._session(session) as session:
+                query = select(cls.model).where(cls.model.status == status)
+                if cursor_id is not None:
+                    query = query.where(cls.model.id < cursor_id)
+                query = query.order_by(desc(cls.model.id)).limit(limit)
+                result = await session.execute(query)
+                return list(result.scalars())
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    "Не удалось получить очередь модерации, "
+                    f"модель {cls.model.__name__}"
+                ),
+                extra={"status": status, "cursor_id": cursor_id, "limit": limit},
+                session=session,
+            )
+
+    @classmethod
+    async def review(
+        cls,
+        item_id: int,
+        status: str,
+        moderator_id: UUID4,
+        session: AsyncSession | None = None,
+    ) -> ModerationQueueItem | None:
+        """
+        Отмечает ожидающую запись очереди как рассмотренную одним UPDATE.
+
+        :param item_id: ID записи очереди.
+        :param status: Итоговый статус (resolved или dismissed).
+        :param moderator_id: ID модератора.
+        :param session: Сессия текущего запроса, если есть.
+        :return: Обновлённая запись или None, если ожидающей записи с таким ID нет.
+        """
+        try:
+            async with cls._transaction(session) as session:
+                query = (
+                    update(cls.model)
+                    .where(cls.model.id == item_id, cls.model.status == "pending")
+                    .values(
+                        status=status,
+                        resolved_by=moderator_id,
+                        resolved_at=datetime.utcnow(),
+                    )
+                    .returning(cls.model)
+                )
+                result = await session.execute(query)
+                return result.scalar_one_or_none()
+        except (SQLAlchemyError, Exception) as e:
+            cls._log_error(
+                e,
+                error_message=(
+                    "Не удалось обновить запись очереди модерации, "
+                    f"модель {cls.model.__name__}"
+                ),
+                extra={"item_id": item_id, "status": status},
+                session=session,
+            )
@@ -0,0 +1,169 @@
+"""
+Обнаружение массовых рассылок в памяти воркера, без чтения базы при отправке.
+
+Для каждого отправителя хранится скользящее окно получателей (время последнего
+сообщения каждому, не больше FLOOD_MAX_RECIPIENTS + 1 записей) и кольцевой
+буфер хэшей нормализованных текстов последних сообщений. Отправитель, который
+за окно написал слишком многим разным получателям или разослал один и тот же
+текст многим получателям, на FLOOD_THROTTLE_SECONDS лишается возможности
+отправлять сообщения, а сообщение, на котором сработало ограничение, попадает
+в очередь модерации. Отправители хранятся в LRU не больше FLOOD_MAX_SENDERS,
+поэтому память ограничена независимо от числа пользователей.
+
+Состояние хранится в памяти процесса и между воркерами не делится. Отправитель,
+соединения которого попадают на разные воркеры, ограничивается в каждом из них
+отдельно, поэтому действующие пороги — FLOOD_MAX_RECIPIENTS и
+FLOOD_DUPLICATE_RECIPIENTS, умноженные на число воркеров.
+"""
+
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, NamedTuple, Tuple
+
+from pydantic import UUID4
+
+from app.core.config import settings
+
+# Правила, которыми помечаются сообщения в очереди модерации
+FLOOD_RECIPIENTS_RULE = "flood:recipients"
+FLOOD_DUPLICATE_TEXT_RULE = "flood:duplicate_text"
+
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def text_fingerprint(text: str) -> int:
+    """
+    Хэш текста без учёта регистра, пунктуации и пробелов: мелкие
+    изменения рассылаемого текста не меняют его.
+    """
+    return hash(NON_WORD.sub(" ", text.lower()).strip())
+
+
+class FloodVerdict(NamedTuple):
+    throttled: bool
+    # Сработавшие правила, с которыми сообщение отправляется в очередь модерации
+    flags: Tuple[str, ...] = ()
+
+
+ALLOWED = FloodVerdict(False)
+THROTTLED = FloodVerdict(True)
+
+
+class SenderWindow:
+    __slots__ = ("recipients", "texts", "throttled_until")
+
+    def __init__(self, text_history: int):
+        # Получатель -> время последнего сообщения ему, от старых к новым
+        self.recipients: "OrderedDict[UUID4, float]" = OrderedDict()
+        # (время, хэш текста, получатель) последних сообщений
+        self.texts: Deque[Tuple[float, int, UUID4]] = deque(maxlen=text_history)
+        self.throttled_until = 0.0
+
+
+class FloodDetector:
+    """
+    Скользящие окна отправителей одного воркера (процесса); другие воркеры
+    считают сообщения того же отправителя независимо.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        max_recipients: int,
+        duplicate_recipients: int,
+        throttle_seconds: float,
+        max_senders: int,
+    ):
+        self.window = window
+        self.max_recipients = max_recipients
+        self.duplicate_recipients = duplicate_recipients
+        self.throttle_seconds = throttle_seconds
+        self.max_senders = max_senders
+        self._senders: "OrderedDict[UUID4, SenderWindow]" = OrderedDict()
+        self.throttled = 0
+        self.rejected = 0
+
+    def check(
+        self,
+        sender_id: UUID4,
+        recipient_id: UUID4,
+        text: str,
+        now: float | None = None,
+    ) -> FloodVerdict:
+        """
+        Учитывает сообщение и решает, можно ли его отправить.
+        :param sender_id: ID отправителя.
+        :param recipient_id: ID получателя.
+        :param text: Текст сообщения.
+        :param now: Время по time.monotonic().
+        :return: throttled — отправка запрещена; flags — сообщение нужно
+            отправить в очередь модерации с этими правилами.
+        """
+        now = time.monotonic() if now is None else now
+        state = self._senders.get(sender_id)
+        if state is None:
+            state = SenderWindow(self.duplicate_recipients * 2)
+            self._senders[sender_id] = state
+            if len(self._senders) > self.max_senders:
+                self._senders.popitem(last=False)
+        else:
+            self._senders.move_to_end(sender_id)
+        if state.throttled_until > now:
+            self.rejected += 1
+            return THROTTLED
+
+        started = now - self.window
+        recipients = state.recipients
+        recipients[recipient_id] = now
+        recipients.move_to_end(recipient_id)
+        while next(iter(recipients.values())) < started:
+            recipients.popitem(last=False)
+
+        fingerprint = text_fingerprint(text)
+        state.texts.append((now, fingerprint, recipient_id))
+        same_text = {
+            recipient
+            for moment, other, recipient in state.texts
+            if other == fingerprint and moment >= started
+        }
+
+        flags = []
+        if len(recipients) > self.max_recipients:
+            flags.append(FLOOD_RECIPIENTS_RULE)
+            # Держим не больше max_recipients + 1 записей
+            recipients.popitem(last=False)
+        if len(same_text) >= self.duplicate_recipients:
+            flags.append(FLOOD_DUPLICATE_TEXT_RULE)
+        if not flags:
+            return ALLOWED
+        # Сообщение, на котором сработало ограничение, отправляется;
+        # следующие отклоняются до конца ограничения
+        state.throttled_until = now + self.throttle_seconds
+        state.recipients.clear()
+        state.texts.clear()
+        self.throttled += 1
+        return FloodVerdict(False, tuple(flags))
+
+    def stats(self) -> dict:
+        """
+        Счётчики этого воркера.
+        """
+        now = time.monotonic()
+        return {
+            "senders": len(self._senders),
+            "throttled_now": sum(
+                1 for state in self._senders.values() if state.throttled_until > now
+            ),
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+flood_detector = FloodDetector(
+    settings.FLOOD_WINDOW_SECONDS,
+    settings.FLOOD_MAX_RECIPIENTS,
+    settings.FLOOD_DUPLICATE_RECIPIENTS,
+    settings.FLOOD_THROTTLE_SECONDS,
+    settings.FLOOD_MAX_SENDERS,
+)
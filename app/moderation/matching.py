@@ -0,0 +1,118 @@
+"""
+Сопоставление текстов сообщений со списком правил проверки содержимого.
+
+Модуль выполняется в процессах пула проверки, поэтому не импортирует
+остальные модули приложения: правила передаются вместе с пакетом сообщений,
+а собранный автомат кэшируется в процессе по версии правил.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо-Корасик: поиск всех ключевых слов в тексте за один проход,
+    независимо от их количества. Сравнение без учёта регистра, совпадением
+    считается только целое слово (соседние символы — не буквы и не цифры).
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[str, ...]] = [()]
+        for keyword in keywords:
+            keyword = keyword.strip().lower()
+            if keyword:
+                self._add(keyword)
+        self._link()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if keyword not in self._output[state]:
+            self._output[state] += (keyword,)
+
+    def _link(self):
+        # Ссылки неудач строятся обходом в ширину от корня
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> Set[str]:
+        """
+        Ключевые слова, найденные в тексте как целые слова.
+        """
+        text = text.lower()
+        found = set()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                start = position - len(keyword) + 1
+                end = position + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    end == len(text) or not text[end].isalnum()
+                ):
+                    found.add(keyword)
+        return found
+
+
+class Matcher:
+    """
+    Ключевые слова (автомат Ахо-Корасик) и регулярные выражения одной версии правил.
+    """
+
+    def __init__(self, keywords: Sequence[str], patterns: Sequence[str]):
+        self.automaton = AhoCorasick(keywords)
+        self.patterns = [
+            (pattern, re.compile(pattern, re.IGNORECASE)) for pattern in patterns
+        ]
+
+    def match(self, text: str) -> List[str]:
+        """
+        Сработавшие правила: ключевые слова и исходные тексты регулярных выражений.
+        """
+        matches = sorted(self.automaton.find(text))
+        matches.extend(source for source, regex in self.patterns if regex.search(text))
+        return matches
+
+
+# Автомат текущей версии правил в процессе пула
+_cached: Tuple[int, Matcher] | None = None
+
+
+def screen_batch(
+    version: int, keywords: Sequence[str], patterns: Sequence[str], texts: Sequence[str]
+) -> List[List[str]]:
+    """
+    Проверяет пакет текстов; выполняется в процессе пула.
+    :param version: Версия правил; автомат пересобирается только при её смене.
+    :param keywords: Ключевые слова.
+    :param patterns: Регулярные выражения.
+    :param texts: Тексты сообщений.
+    :return: Сработавшие правила для каждого текста.
+    """
+    global _cached
+    if _cached is None or _cached[0] != version:
+        _cached = (version, Matcher(keywords, patterns))
+    matcher = _cached[1]
+    return [matcher.match(text) for text in texts]
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import UUID, BigInteger, DateTime, ForeignKey, Index, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class ModerationQueueItem(Base):
+    """
+    Сообщение, отмеченное автоматической проверкой содержимого.
+    Текст копируется, потому что сообщение может быть архивировано или удалено
+    по сроку хранения раньше, чем модератор его рассмотрит.
+    """
+
+    __tablename__ = "moderation_queue"
+    __table_args__ = (
+        # Очередь модератора: записи в статусе по убыванию id
+        Index("ix_moderation_queue_status_id", "status", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    message_id: Mapped[int] = mapped_column(BigInteger, unique=True)
+    sender_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    recipient_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    message_text: Mapped[str] = mapped_column(String(4096))
+    # Сработавшие правила: ключевые слова и регулярные выражения
+    matches: Mapped[List[str]] = mapped_column(ARRAY(String(256)))
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    flagged_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # pending — ожидает рассмотрения, resolved — нарушение подтверждено,
+    # dismissed — ложное срабатывание
+    status: Mapped[str] = mapped_column(
+        String(16), default="pending", server_default="pending"
+    )
+    resolved_by: Mapped[UUID | None] = mapped_column(ForeignKey("users.id"))
+    resolved_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    def __repr__(self):
+        return (
+            f"ModerationQueueItem(id={self.id}, message_id={self.message_id}, "
+            f"status={self.status})"
+        )
@@ -1,21 +1,48 @@
 from datetime import datetime
+from typing import List, Literal
 
 from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies import get_moderator_user
 from app.auth.models import User
 from app.auth.services import BlockService
-from app.auth.shemas import SBlock
-from app.chat.services import ChatService
+from app.auth.shemas import SBlock, SBulkBlock, SBulkUnblock
+from app.chat.retention import retention_stats
+from app.chat.services import ChatService, RetentionService
 from app.chat.shemas import SGetMessagesBetweenUsersResponse
 from app.core.config import settings
-from app.moderation.shemas import SModerBlockResponse, SModerChatsResponse
+from app.core.database import engine, get_session, query_budget, replicas
+from app.core.pool import get_pool_status
+from app.core.slow_queries import slow_query_log
+from app.moderation.flood import flood_detector
+from app.moderation.screening import screener
+from app.moderation.services import ModerationQueueService
+from app.moderation.shemas import (
+    SFloodStats,
+    SModerBlockResponse,
+    SModerBulkBlockResponse,
+    SModerBulkUnblockResponse,
+    SModerChatsResponse,
+    SModerQueueItem,
+    SModerQueueResponse,
+    SModerQueueReview,
+    SModerSearchResponse,
+    SPoolStats,
+    SRetentionPolicy,
+    SRetentionPolicyDeleteResponse,
+    SRetentionStats,
+    SScreeningStats,
+    SSlowQueries,
+)
 
 # Создание роутера для модерации
 router = APIRouter(
     prefix="/moderation",
     tags=["Moderation"],
+    dependencies=[Depends(query_budget(settings.QUERY_BUDGET_MODERATION_MS))],
 )
 
 
@@ -24,6 +51,7 @@ async def get_all_chats(
     limit: int = Query(settings.BASE_LIMIT_MESSAGES_FOR_MODERATOR, gt=0),
     offset: int = Query(0, ge=0),
     moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Получение списка всех чатов для модератора.
@@ -34,23 +62,25 @@ async def get_all_chats(
 
     Возвращает список чатов с ограничением по количеству.
     """
-    return await ChatService.get_all_chats(limit, offset)
+    return await ChatService.get_all_chats(limit, offset, session=session)
 
 
 @router.get("/chats/messages/", response_model=SGetMessagesBetweenUsersResponse)
 async def get_messages_between_users(
     participant_1_id: UUID4 = Query(),
     participant_2_id: UUID4 = Query(),
-    cursor_time: datetime = Query(default=None),
+    cursor_time: datetime = Query(default=None, deprecated=True),
     cursor_message_id: int = Query(default=None),
     moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Получение сообщений между двумя пользователями для модерации.
 
     - **participant_1_id**: (UUID4) UUID первого участника.
     - **participant_2_id**: (UUID4) UUID второго участника.
-    - **cursor_time**: (datetime, optional) Временная метка для пагинации.
+    - **cursor_time**: (datetime, optional) Устарел и не учитывается:
+      ID сообщений упорядочены по времени.
     - **cursor_message_id**: (int, optional) ID сообщения для пагинации.
     - **moderator**: (User) Авторизованный пользователь-модератор.
 
@@ -59,16 +89,147 @@ async def get_messages_between_users(
     return await ChatService.get_messages_between_users(
         user_1_id=participant_1_id,
         user_2_id=participant_2_id,
-        cursor_time=cursor_time,
         cursor_message_id=cursor_message_id,
         moder_flag=True,
+        session=session,
+    )
+
+
+@router.get(
+    "/chats/messages/export/",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "Сообщения переписки, по одному JSON-объекту в строке",
+        }
+    },
+)
+async def export_messages_between_users(
+    participant_1_id: UUID4 = Query(),
+    participant_2_id: UUID4 = Query(),
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Потоковая выгрузка всей переписки двух пользователей в формате NDJSON.
+
+    - **participant_1_id**: (UUID4) UUID первого участника.
+    - **participant_2_id**: (UUID4) UUID второго участника.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Возвращает все сообщения переписки (включая архивные) от новых к старым,
+    по одному объекту {id, message_text, sender_id, recipient_id, created_at}
+    в строке. Обрыв потока до его конца означает неполную выгрузку.
+    """
+    chunks = await ChatService.export_conversation(
+        participant_1_id, participant_2_id, session=session
+    )
+    filename = f"conversation-{participant_1_id}-{participant_2_id}.ndjson"
+    return StreamingResponse(
+        chunks,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/messages/search/", response_model=SModerSearchResponse)
+async def search_messages(
+    q: str = Query(min_length=1, max_length=256),
+    user_id: UUID4 = Query(default=None),
+    created_from: datetime = Query(default=None),
+    created_to: datetime = Query(default=None),
+    order: Literal["rank", "recent"] = Query(default="rank"),
+    cursor_rank: float = Query(default=None),
+    cursor_message_id: int = Query(default=None),
+    limit: int = Query(settings.BASE_LIMIT_MESSAGES_FOR_MODERATOR, gt=0, le=100),
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Полнотекстовый поиск по сообщениям всех переписок.
+
+    - **q**: (str) Поисковый запрос: слова, "точная фраза", OR, -исключение.
+    - **user_id**: (UUID4, optional) Только сообщения, отправленные
+      или полученные пользователем.
+    - **created_from**: (datetime, optional) Сообщения не раньше этого времени.
+    - **created_to**: (datetime, optional) Сообщения раньше этого времени.
+    - **order**: (str) rank — по релевантности, recent — от новых к старым.
+    - **cursor_rank**: (float, optional) cursor_rank из предыдущей страницы
+      (для order=rank).
+    - **cursor_message_id**: (int, optional) cursor_message_id из предыдущей страницы.
+    - **limit**: (int) Количество сообщений на странице.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Возвращает найденные сообщения и курсор следующей страницы.
+    """
+    return await ChatService.search_messages(
+        q,
+        user_id=user_id,
+        created_from=created_from,
+        created_to=created_to,
+        order_by_rank=order == "rank",
+        cursor_rank=cursor_rank,
+        cursor_message_id=cursor_message_id,
+        limit=limit,
+        session=session,
+    )
+
+
+@router.get("/queue/", response_model=SModerQueueResponse)
+async def get_moderation_queue(
+    status: Literal["pending", "resolved", "dismissed"] = Query(default="pending"),
+    cursor_id: int = Query(default=None),
+    limit: int = Query(settings.BASE_LIMIT_MESSAGES_FOR_MODERATOR, gt=0, le=100),
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Очередь сообщений, отмеченных автоматической проверкой содержимого.
+
+    - **status**: (str) pending — ожидают рассмотрения, resolved или
+      dismissed — рассмотренные.
+    - **cursor_id**: (int, optional) cursor_id из предыдущей страницы.
+    - **limit**: (int) Количество записей на странице.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Возвращает записи от новых к старым со сработавшими правилами и курсор
+    следующей страницы.
+    """
+    return await ModerationQueueService.get_queue(
+        status, cursor_id, limit, session=session
+    )
+
+
+@router.post("/queue/{item_id}/review/", response_model=SModerQueueItem)
+async def review_moderation_queue_item(
+    item_id: int,
+    review: SModerQueueReview,
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Рассмотрение записи очереди модерации.
+
+    - **item_id**: (int) ID записи очереди.
+    - **review**: (SModerQueueReview) Итог рассмотрения.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Возвращает обновлённую запись. Уже рассмотренную запись повторно рассмотреть нельзя.
+    """
+    return await ModerationQueueService.review(
+        item_id, review.status, moderator.id, session=session
     )
 
 
 @router.post(
     "/block/", status_code=status.HTTP_201_CREATED, response_model=SModerBlockResponse
 )
-async def block_user(block: SBlock, moderator: User = Depends(get_moderator_user)):
+async def block_user(
+    block: SBlock,
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
     """
     Блокировка пользователя модератором.
 
@@ -78,5 +239,166 @@ async def block_user(block: SBlock, moderator: User = Depends(get_moderator_user
     Возвращает результат блокировки пользователя.
     """
     return await BlockService.block_user(
-        user_id=block.user_id, moderator_id=moderator.id, reason=block.reason_of_block
+        user_id=block.user_id,
+        moderator_id=moderator.id,
+        reason=block.reason_of_block,
+        session=session,
     )
+
+
+@router.post("/block/bulk/", response_model=SModerBulkBlockResponse)
+async def block_users(
+    block: SBulkBlock,
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Блокировка многих пользователей одним запросом.
+
+    - **block**: (SBulkBlock) ID пользователей и причина блокировки.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Блокирует пользователей одним INSERT ... ON CONFLICT и закрывает их
+    WebSocket-соединения на всех воркерах. Возвращает заблокированных,
+    уже заблокированных ранее и ненайденных пользователей.
+    """
+    return await BlockService.block_users(
+        user_ids=block.user_ids,
+        moderator_id=moderator.id,
+        reason=block.reason_of_block,
+        session=session,
+    )
+
+
+@router.post("/unblock/bulk/", response_model=SModerBulkUnblockResponse)
+async def unblock_users(
+    unblock: SBulkUnblock,
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Снятие блокировки с многих пользователей одним запросом.
+
+    - **unblock**: (SBulkUnblock) ID пользователей.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Возвращает пользователей, с которых снята блокировка.
+    """
+    return await BlockService.unblock_users(unblock.user_ids, session=session)
+
+
+@router.get("/stats/pool/", response_model=List[SPoolStats])
+async def get_pool_stats(moderator: User = Depends(get_moderator_user)):
+    """
+    Текущее состояние пулов соединений: основной базы и реплик для чтения.
+
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Возвращает для каждого пула число выданных и свободных соединений, переполнение,
+    гистограмму времени ожидания соединения, количество тайм-аутов выдачи
+    и признак исправности (для реплик).
+    """
+    return [
+        get_pool_status(engine.pool),
+        *(
+            get_pool_status(replica.pool, healthy=replica in replicas.healthy)
+            for replica in replicas.engines
+        ),
+    ]
+
+
+@router.get("/stats/slow-queries/", response_model=SSlowQueries)
+async def get_slow_queries(moderator: User = Depends(get_moderator_user)):
+    """
+    Последние медленные запросы к базе в этом воркере, от новых к старым.
+
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Для каждого запроса возвращает вызвавший его метод DAO, длительность,
+    текст выражения с параметрами без значений и, для части SELECT,
+    план EXPLAIN (ANALYZE, BUFFERS).
+    """
+    return {
+        "threshold_ms": settings.SLOW_QUERY_MS,
+        "total": slow_query_log.total,
+        "queries": slow_query_log.snapshot(),
+    }
+
+
+@router.put("/retention/", response_model=SRetentionPolicy)
+async def set_retention_policy(
+    policy: SRetentionPolicy,
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Установка срока хранения сообщений для переписки двух пользователей.
+
+    - **policy**: (SRetentionPolicy) Участники переписки и срок хранения в днях.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+
+    Срок переписки переопределяет глобальный срок MESSAGES_RETENTION_DAYS.
+    """
+    return await RetentionService.set_policy(
+        policy.participant_1_id,
+        policy.participant_2_id,
+        policy.retention_days,
+        session=session,
+    )
+
+
+@router.delete("/retention/", response_model=SRetentionPolicyDeleteResponse)
+async def delete_retention_policy(
+    participant_1_id: UUID4 = Query(),
+    participant_2_id: UUID4 = Query(),
+    moderator: User = Depends(get_moderator_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Удаление срока хранения переписки: к ней снова применяется глобальный срок.
+
+    - **participant_1_id**: (UUID4) UUID первого участника.
+    - **participant_2_id**: (UUID4) UUID второго участника.
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+    """
+    return await RetentionService.delete_policy(
+        participant_1_id, participant_2_id, session=session
+    )
+
+
+@router.get("/stats/retention/", response_model=SRetentionStats)
+async def get_retention_stats(moderator: User = Depends(get_moderator_user)):
+    """
+    Прогресс текущего или итоги последнего прохода удаления сообщений по сроку
+    хранения в этом воркере: количество удалённых строк, порций, длительность
+    и скорость (строк/с).
+
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+    """
+    return {
+        "global_retention_days": settings.MESSAGES_RETENTION_DAYS,
+        **retention_stats.as_dict(),
+    }
+
+
+@router.get("/stats/screening/", response_model=SScreeningStats)
+async def get_screening_stats(moderator: User = Depends(get_moderator_user)):
+    """
+    Счётчики автоматической проверки содержимого в этом воркере: проверено,
+    отмечено и пропущено из-за переполнения очереди сообщений, длина очереди,
+    скорость проверки (сообщений/с) и версия загруженных правил.
+
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+    """
+    return {"enabled": settings.SCREENING_ENABLED, **screener.stats()}
+
+
+@router.get("/stats/flood/", response_model=SFloodStats)
+async def get_flood_stats(moderator: User = Depends(get_moderator_user)):
+    """
+    Счётчики обнаружения массовых рассылок в этом воркере: отправители
+    в скользящих окнах, отправители с ограничением отправки и отклонённые сообщения.
+
+    - **moderator**: (User) Авторизованный пользователь-модератор.
+    """
+    return flood_detector.stats()
@@ -0,0 +1,225 @@
+"""
+Автоматическая проверка содержимого сообщений вне пути отправки.
+
+Обработчик WebSocket после сохранения сообщения кладёт его в ограниченную
+очередь воркера без ожидания (при переполнении сообщение не проверяется
+и учитывается как пропущенное), поэтому задержка отправки не меняется.
+Фоновая задача забирает сообщения пакетами и сопоставляет их с правилами
+в пуле процессов (app.moderation.matching), чтобы проверка не занимала
+цикл событий. Сработавшие сообщения записываются в очередь модерации
+(таблица moderation_queue). Файл правил перечитывается при изменении.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Deque, List, NamedTuple, Tuple
+
+from pydantic import UUID4
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.moderation.dao import ModerationQueueDao
+from app.moderation.matching import screen_batch
+
+# Максимальная длина одного правила в moderation_queue.matches
+MATCH_MAX_LENGTH = 256
+
+
+class ScreenedMessage(NamedTuple):
+    id: int
+    sender_id: UUID4
+    recipient_id: UUID4
+    message_text: str
+    created_at: datetime
+    # Правила, сработавшие до проверки содержимого (например, app.moderation.flood)
+    flags: Tuple[str, ...] = ()
+
+
+class ScreeningRules(NamedTuple):
+    version: int
+    keywords: Tuple[str, ...]
+    patterns: Tuple[str, ...]
+
+
+class Screener:
+    """
+    Очередь и фоновая задача проверки содержимого одного воркера.
+    """
+
+    def __init__(self, queue_size: int, batch_size: int, workers: int):
+        self.batch_size = batch_size
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.rules = ScreeningRules(0, (), ())
+        self._rules_mtime: float | None = None
+        self._rules_checked = 0.0
+        self.processed = 0
+        self.flagged = 0
+        self.dropped = 0
+        # (время, количество проверенных) по пакетам для расчёта скорости
+        self._throughput: Deque[Tuple[float, int]] = deque()
+
+    def submit(self, message: ScreenedMessage):
+        """
+        Ставит сообщение в очередь проверки без ожидания.
+        """
+        if not settings.SCREENING_ENABLED:
+            return
+        if not self.rules.keywords and not self.rules.patterns and not message.flags:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def reload_rules(self, force: bool = False):
+        """
+        Перечитывает файл правил, если он изменился. Ошибочный файл
+        (неверный JSON или регулярное выражение) не заменяет текущие правила.
+        """
+        now = time.monotonic()
+        if not force and now - self._rules_checked < settings.SCREENING_RELOAD_INTERVAL:
+            return
+        self._rules_checked = now
+        path = settings.SCREENING_RULES_FILE
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._rules_mtime:
+            return
+        try:
+            keywords, patterns = (), ()
+            if mtime is not None:
+                with open(path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                keywords = tuple(str(keyword) for keyword in data.get("keywords", []))
+                patterns = tuple(str(pattern) for pattern in data.get("patterns", []))
+                for pattern in patterns:
+                    re.compile(pattern)
+        except (OSError, ValueError, AttributeError, re.error) as e:
+            logger.error(
+                "Cannot load screening rules", extra={"path": path, "error": str(e)}
+            )
+            self._rules_mtime = mtime
+            return
+        self._rules_mtime = mtime
+        self.rules = ScreeningRules(self.rules.version + 1, keywords, patterns)
+        logger.info(
+            "Screening rules loaded",
+            extra={
+                "version": self.rules.version,
+                "keywords": len(keywords),
+                "patterns": len(patterns),
+            },
+        )
+
+    async def _next_batch(self) -> List[ScreenedMessage]:
+        batch = [await self._queue.get()]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _screen(
+        self, executor: ProcessPoolExecutor, batch: List[ScreenedMessage]
+    ) -> List[List[str]]:
+        rules = self.rules
+        return await asyncio.get_running_loop().run_in_executor(
+            executor,
+            screen_batch,
+            rules.version,
+            rules.keywords,
+            rules.patterns,
+            [message.message_text for message in batch],
+        )
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: дочерний процесс не наследует цикл событий и соединения воркера
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    async def run(self):
+        """
+        Фоновая задача воркера: проверяет сообщения из очереди пакетами.
+        """
+        self.reload_rules(force=True)
+        executor = self._new_executor()
+        try:
+            while True:
+                batch = await self._next_batch()
+                self.reload_rules()
+                try:
+                    results = await self._screen(executor, batch)
+                except BrokenProcessPool as e:
+                    logger.error("Screening pool failed", extra={"error": str(e)})
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self._new_executor()
+                    self.dropped += len(batch)
+                    continue
+                rows = [
+                    {
+                        "message_id": message.id,
+                        "sender_id": message.sender_id,
+                        "recipient_id": message.recipient_id,
+                        "message_text": message.message_text,
+                        "matches": [
+                            match[:MATCH_MAX_LENGTH]
+                            for match in (*message.flags, *matches)
+                        ],
+                        "created_at": message.created_at,
+                        "flagged_at": datetime.utcnow(),
+                    }
+                    for message, matches in zip(batch, results)
+                    if matches or message.flags
+                ]
+                if rows:
+                    await ModerationQueueDao.upsert_many(
+                        rows, index_elements=["message_id"]
+                    )
+                self._record(len(batch), len(rows))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _record(self, processed: int, flagged: int):
+        now = time.monotonic()
+        self.processed += processed
+        self.flagged += flagged
+        self._throughput.append((now, processed))
+        while self._throughput[0][0] < now - settings.SCREENING_RATE_WINDOW:
+            self._throughput.popleft()
+
+    def stats(self) -> dict:
+        """
+        Счётчики и скорость проверки этого воркера.
+        """
+        now = time.monotonic()
+        window = settings.SCREENING_RATE_WINDOW
+        recent = sum(
+            count for moment, count in self._throughput if moment >= now - window
+        )
+        return {
+            "processed": self.processed,
+            "flagged": self.flagged,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "messages_per_second": round(recent / window, 3),
+            "rules_version": self.rules.version,
+            "keywords": len(self.rules.keywords),
+            "patterns": len(self.rules.patterns),
+        }
+
+
+screener = Screener(
+    settings.SCREENING_QUEUE_SIZE,
+    settings.SCREENING_BATCH_SIZE,
+    settings.SCREENING_WORKERS,
+)
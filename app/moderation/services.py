@@ -0,0 +1,74 @@
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import ModerationQueueItemNotFoundException
+from app.moderation.dao import ModerationQueueDao
+from app.moderation.models import ModerationQueueItem
+
+
+class ModerationQueueService:
+    """
+    Сервисный слой для очереди сообщений, отмеченных проверкой содержимого.
+    """
+
+    @staticmethod
+    def _item(item: ModerationQueueItem) -> dict:
+        return {
+            "id": item.id,
+            "message_id": item.message_id,
+            "sender_id": item.sender_id,
+            "recipient_id": item.recipient_id,
+            "message_text": item.message_text,
+            "matches": item.matches,
+            "created_at": item.created_at,
+            "flagged_at": item.flagged_at,
+            "status": item.status,
+            "resolved_by": item.resolved_by,
+            "resolved_at": item.resolved_at,
+        }
+
+    @staticmethod
+    async def get_queue(
+        status: str,
+        cursor_id: int | None,
+        limit: int,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Получить страницу очереди модерации.
+
+        :param status: Статус записей.
+        :param cursor_id: cursor_id из предыдущей страницы.
+        :param limit: Количество записей на странице.
+        :return: Записи очереди и курсор следующей страницы.
+        """
+        items = (
+            await ModerationQueueDao.get_page(status, cursor_id, limit, session=session)
+            or []
+        )
+        return {
+            "items": [ModerationQueueService._item(item) for item in items],
+            "cursor_id": items[-1].id if items else None,
+            "is_end": len(items) < limit,
+        }
+
+    @staticmethod
+    async def review(
+        item_id: int,
+        status: str,
+        moderator_id: UUID4,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Отметить запись очереди как рассмотренную.
+
+        :raises ModerationQueueItemNotFoundException: Исключение, если ожидающей
+            записи нет.
+        :return: Обновлённая запись очереди.
+        """
+        item = await ModerationQueueDao.review(
+            item_id, status, moderator_id, session=session
+        )
+        if item is None:
+            raise ModerationQueueItemNotFoundException
+        return ModerationQueueService._item(item)
@@ -1,9 +1,10 @@
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import UUID4, BaseModel, Field
 
 from app.chat.shemas import SLimitOffsetPagination
+from app.core.snowflake import MessageId
 
 
 class SModerUserInfoChat(BaseModel):
@@ -28,3 +29,164 @@ class SModerChatsResponse(BaseModel):
 class SModerBlockResponse(BaseModel):
     detail: str = Field("The user has been blocked")
     blocked_user_id: UUID4 = Field(examples=["0949c72e-ae06-4740-9496-b8fe180016f3"])
+
+
+class SModerBulkBlockResponse(BaseModel):
+    detail: str = Field("The users have been blocked")
+    blocked_user_ids: List[UUID4] = Field(description="Заблокированы этим запросом")
+    already_blocked_user_ids: List[UUID4] = Field(
+        description="Уже были заблокированы ранее"
+    )
+    not_found_user_ids: List[UUID4] = Field(description="Пользователи не найдены")
+
+
+class SModerBulkUnblockResponse(BaseModel):
+    detail: str = Field("The users have been unblocked")
+    unblocked_user_ids: List[UUID4] = Field(
+        description="Пользователи, с которых снята блокировка"
+    )
+
+
+class SPoolWaitHistogram(BaseModel):
+    buckets: Dict[str, int] = Field(
+        description="Количество выдач соединения по корзинам времени ожидания, мс"
+    )
+    count: int
+    sum_ms: float
+
+
+class SPoolStats(BaseModel):
+    name: str
+    pool_class: str
+    healthy: bool
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: Optional[int] = None
+    checkout_timeouts: Optional[int] = None
+    wait_ms: Optional[SPoolWaitHistogram] = None
+
+
+class SRetentionPolicy(BaseModel):
+    participant_1_id: UUID4
+    participant_2_id: UUID4
+    retention_days: int = Field(
+        gt=0, description="Срок хранения сообщений переписки в днях", examples=[90]
+    )
+
+
+class SRetentionPolicyDeleteResponse(BaseModel):
+    detail: str = Field("The retention policy has been deleted.")
+
+
+class SRetentionStats(BaseModel):
+    global_retention_days: Optional[int] = Field(
+        None, description="Глобальный срок хранения (None — бессрочно)"
+    )
+    running: bool
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    deleted: int
+    archive_deleted: int = Field(description="Удалено сообщений из сегментов архива")
+    batches: int
+    seconds: float
+    rows_per_second: float
+    errors: int
+
+
+class SSlowQuery(BaseModel):
+    time: datetime
+    dao_call: Optional[str] = Field(None, description="Метод DAO, выполнивший запрос")
+    database: Optional[str] = Field(None, description="Пул: primary или replica-N")
+    duration_ms: float
+    statement: str
+    parameters: List[Any] = Field(
+        description="Параметры; строки, UUID и даты заменены названиями типов"
+    )
+    executemany: bool
+    plan: Optional[str] = Field(
+        None, description="EXPLAIN (ANALYZE, BUFFERS), если снят"
+    )
+
+
+class SSlowQueries(BaseModel):
+    threshold_ms: Optional[int] = Field(
+        None, description="Порог медленного запроса (None — журнал выключен)"
+    )
+    total: int = Field(description="Всего медленных запросов с запуска воркера")
+    queries: List[SSlowQuery] = Field(description="Последние медленные запросы")
+
+
+class SModerSearchMessage(BaseModel):
+    id: MessageId
+    message_text: str
+    sender_id: UUID4
+    sender_username: str
+    recipient_id: UUID4
+    recipient_username: str
+    created_at: datetime
+    rank: float = Field(description="Релевантность сообщения запросу (ts_rank)")
+
+
+class SModerSearchResponse(BaseModel):
+    messages: List[SModerSearchMessage]
+    cursor_rank: Optional[float] = Field(
+        None,
+        description="Ранг последнего сообщения (курсор сортировки по релевантности)",
+    )
+    cursor_message_id: Optional[MessageId] = Field(
+        None, description="ID последнего сообщения (курсор)"
+    )
+    is_end: bool
+
+
+class SModerQueueItem(BaseModel):
+    id: int
+    message_id: MessageId
+    sender_id: UUID4
+    recipient_id: UUID4
+    message_text: str
+    matches: List[str] = Field(
+        description="Сработавшие ключевые слова и регулярные выражения"
+    )
+    created_at: datetime
+    flagged_at: datetime
+    status: Literal["pending", "resolved", "dismissed"]
+    resolved_by: Optional[UUID4] = None
+    resolved_at: Optional[datetime] = None
+
+
+class SModerQueueResponse(BaseModel):
+    items: List[SModerQueueItem]
+    cursor_id: Optional[int] = Field(None, description="ID последней записи (курсор)")
+    is_end: bool
+
+
+class SModerQueueReview(BaseModel):
+    status: Literal["resolved", "dismissed"] = Field(
+        description="resolved — нарушение подтверждено, dismissed — ложное срабатывание"
+    )
+
+
+class SScreeningStats(BaseModel):
+    enabled: bool
+    processed: int = Field(description="Проверено сообщений с запуска воркера")
+    flagged: int = Field(description="Отправлено в очередь модерации")
+    dropped: int = Field(description="Не проверено из-за переполнения очереди")
+    queued: int = Field(description="Ожидают проверки")
+    messages_per_second: float = Field(
+        description="Скорость проверки за последние SCREENING_RATE_WINDOW секунд"
+    )
+    rules_version: int
+    keywords: int
+    patterns: int
+
+
+class SFloodStats(BaseModel):
+    senders: int = Field(description="Отправителей в скользящих окнах воркера")
+    throttled_now: int = Field(
+        description="Отправителей с ограничением отправки сейчас"
+    )
+    throttled: int = Field(description="Ограничений отправки с запуска воркера")
+    rejected: int = Field(description="Отклонено сообщений ограниченных отправителей")
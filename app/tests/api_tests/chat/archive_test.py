@@ -0,0 +1,150 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import BigInteger, DateTime, delete, insert, select
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from app.chat import archive
+from app.chat.archive import ArchiveStore, delete_exported, export_segment
+from app.chat.dao import MessageDAO
+from app.chat.models import Message
+from app.core.database import async_session_maker
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+JANE_ID = uuid.UUID("2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2")
+# Старше всех сообщений тестовых данных
+CUTOFF = datetime(2020, 1, 1)
+FIRST_ID = 900_000
+OLDEST = CUTOFF - timedelta(days=30, seconds=FIRST_ID)
+
+
+async def add_old_messages(ids):
+    async with async_session_maker() as session:
+        await session.execute(
+            insert(Message).values(
+                [
+                    {
+                        "id": message_id,
+                        "message_text": f"old {message_id}",
+                        "sender_id": JOHN_ID if message_id % 2 else JANE_ID,
+                        "recipient_id": JANE_ID if message_id % 2 else JOHN_ID,
+                        "created_at": OLDEST + timedelta(seconds=message_id),
+                    }
+                    for message_id in ids
+                ]
+            )
+        )
+        await session.commit()
+
+
+async def existing_ids(ids):
+    async with async_session_maker() as session:
+        result = await session.execute(select(Message.id).where(Message.id.in_(ids)))
+        return set(result.scalars())
+
+
+async def remove_messages(ids):
+    async with async_session_maker() as session:
+        await session.execute(delete(Message).where(Message.id.in_(ids)))
+        await session.commit()
+
+
+async def test_archive_round_trip_and_delete_bound(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "BLOCK_MESSAGES", 10)
+    ids = list(range(FIRST_ID, FIRST_ID + 25))
+    await add_old_messages(ids)
+
+    index_path, index = await export_segment(CUTOFF, tmp_path)
+    assert index["messages"] == 25
+    assert index["pending_delete"]
+    # Переписка разбита на блоки по BLOCK_MESSAGES сообщений
+    blocks = index["conversations"][archive.conversation_key(JOHN_ID, JANE_ID)]
+    assert [block["count"] for block in blocks] == [10, 10, 5]
+
+    # Сообщение, появившееся после выгрузки, не удаляется
+    late_id = FIRST_ID + 100
+    await add_old_messages([late_id])
+    try:
+        assert await delete_exported(index_path, index, batch_size=7) == 25
+        assert await existing_ids(ids + [late_id]) == {late_id}
+    finally:
+        await remove_messages([late_id])
+
+    store = ArchiveStore(tmp_path, cache_bytes=1024 * 1024)
+    page = store.get_messages(JOHN_ID, JANE_ID, None, 12)
+    assert [message.id for message in page] == ids[::-1][:12]
+    page = store.get_messages(JOHN_ID, JANE_ID, page[-1].id, 20)
+    assert [message.id for message in page] == ids[::-1][12:]
+    assert store.max_message_id(JOHN_ID, JANE_ID) == ids[-1]
+    assert len(list(store.iter_lines(JOHN_ID, JANE_ID))) == 25
+    assert not archive.read_indexes(tmp_path)[0][1]["pending_delete"]
+
+
+async def test_archive_overlapping_segments_are_deduplicated(tmp_path):
+    ids = list(range(FIRST_ID + 200, FIRST_ID + 210))
+    await add_old_messages(ids)
+    try:
+        # Прерванный запуск: сегмент записан, строки не удалены
+        await export_segment(CUTOFF, tmp_path)
+        await add_old_messages([FIRST_ID + 210])
+        # Повторная выгрузка даёт пересекающийся сегмент
+        await export_segment(CUTOFF, tmp_path)
+    finally:
+        await remove_messages(ids + [FIRST_ID + 210])
+
+    store = ArchiveStore(tmp_path, cache_bytes=1024 * 1024)
+    expected = [FIRST_ID + 210] + ids[::-1]
+    page = store.get_messages(JOHN_ID, JANE_ID, None, 50)
+    assert [message.id for message in page] == expected
+    page = store.get_messages(JOHN_ID, JANE_ID, None, 3)
+    assert [message.id for message in page] == expected[:3]
+    lines = list(store.iter_lines(JOHN_ID, JANE_ID))
+    assert [archive.decode_message(line).id for line in lines] == expected
+
+
+async def test_archive_block_cache_is_bounded_by_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "BLOCK_MESSAGES", 5)
+    ids = list(range(FIRST_ID + 300, FIRST_ID + 320))
+    await add_old_messages(ids)
+    try:
+        index_path, index = await export_segment(CUTOFF, tmp_path)
+    finally:
+        await remove_messages(ids)
+
+    segment = tmp_path / index["segment"]
+    blocks = index["conversations"][archive.conversation_key(JOHN_ID, JANE_ID)]
+    sizes = [len(archive.read_block(segment, block)) for block in blocks]
+    store = ArchiveStore(tmp_path, cache_bytes=sizes[0] + sizes[1])
+    page = store.get_messages(JOHN_ID, JANE_ID, None, 20)
+    assert len(page) == 20
+    assert 0 < store._cache_size <= sizes[0] + sizes[1]
+    assert len(store._blocks) < len(blocks)
+
+
+class MissingBase(DeclarativeBase):
+    pass
+
+
+class MissingMessage(MissingBase):
+    # Таблицы нет в базе: удаление по ключам завершается ошибкой
+    __tablename__ = "messages_missing"
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+
+async def test_archive_delete_failure_is_raised(tmp_path, monkeypatch):
+    ids = list(range(FIRST_ID + 400, FIRST_ID + 405))
+    await add_old_messages(ids)
+    try:
+        index_path, index = await export_segment(CUTOFF, tmp_path)
+        monkeypatch.setattr(MessageDAO, "model", MissingMessage)
+        with pytest.raises(ProgrammingError):
+            await delete_exported(index_path, index)
+        monkeypatch.undo()
+        # Сегмент остаётся отмеченным, удаление продолжит следующий запуск
+        assert archive.read_indexes(tmp_path)[0][1]["pending_delete"]
+        assert await existing_ids(ids) == set(ids)
+    finally:
+        await remove_messages(ids)
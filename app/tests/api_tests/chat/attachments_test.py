@@ -0,0 +1,91 @@
+import hashlib
+import uuid
+
+from httpx import AsyncClient
+
+from app.auth.auth_utilits import ACCESS_TOKEN_TYPE, create_jwt
+from app.chat import attachments
+from app.chat.services import ChatService
+from app.chat.shemas import SWebsocketMessage
+from app.core.config import settings
+from app.core.database import session_scope
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+JANE_ID = uuid.UUID("2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2")
+MODERATOR_ID = uuid.UUID("3c6e4ecb-bd84-5af0-c3c7-5e7f9b1e4df3")
+CONTENT = bytes(range(256)) * 64
+URL = "api/v1/chat/attachments/"
+
+
+def auth(user_id: uuid.UUID) -> dict:
+    token = create_jwt(ACCESS_TOKEN_TYPE, {"sub": str(user_id)})
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def upload(ac: AsyncClient, content=CONTENT):
+    return await ac.post(
+        URL,
+        params={"filename": "data.bin"},
+        content=content,
+        headers={**auth(JOHN_ID), "Content-Type": "application/octet-stream"},
+    )
+
+
+async def test_upload_and_range_download(ac: AsyncClient, monkeypatch, tmp_path):
+    monkeypatch.setattr(attachments.attachment_store, "directory", tmp_path)
+    response = await upload(ac)
+    assert response.status_code == 201
+    attachment = response.json()
+    assert attachment["size"] == len(CONTENT)
+    assert attachment["sha256"] == hashlib.sha256(CONTENT).hexdigest()
+    # Тот же файл хранится один раз, временных файлов не остаётся
+    assert (await upload(ac)).json()["sha256"] == attachment["sha256"]
+    assert len([path for path in tmp_path.rglob("*") if path.is_file()]) == 1
+
+    url = f"{URL}{attachment['id']}/"
+    response = await ac.get(url, headers=auth(JOHN_ID))
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+
+    response = await ac.get(url, headers={**auth(JOHN_ID), "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(CONTENT)}"
+
+
+async def test_attachment_access(ac: AsyncClient, monkeypatch, tmp_path):
+    monkeypatch.setattr(attachments.attachment_store, "directory", tmp_path)
+    attachment_id = (await upload(ac, b"shared file")).json()["id"]
+    url = f"{URL}{attachment_id}/"
+
+    # Собеседник получает доступ, только когда вложение отправлено в переписке
+    assert (await ac.get(url, headers=auth(JANE_ID))).status_code == 404
+    assert (await ac.get(url, headers=auth(MODERATOR_ID))).status_code == 200
+    assert (await ac.get(url)).status_code in (401, 403)
+
+    message = SWebsocketMessage(
+        message_text="file", recipient_id=JANE_ID, attachment_id=attachment_id
+    )
+    async with session_scope() as session:
+        await ChatService.add_message(message, JOHN_ID, session=session)
+    response = await ac.get(url, headers=auth(JANE_ID))
+    assert response.status_code == 200
+    assert response.content == b"shared file"
+
+
+async def test_upload_too_large(ac: AsyncClient, monkeypatch, tmp_path):
+    monkeypatch.setattr(attachments.attachment_store, "directory", tmp_path)
+    monkeypatch.setattr(settings, "ATTACHMENT_MAX_SIZE", 1024)
+    response = await upload(ac, b"x" * 2048)
+    assert response.status_code == 413
+    assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+
+    # Без Content-Length размер проверяется по мере чтения тела
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 512
+
+    response = await upload(ac, chunks())
+    assert response.status_code == 413
+    assert not [path for path in tmp_path.rglob("*") if path.is_file()]
@@ -0,0 +1,34 @@
+import uuid
+
+from app.chat import cache
+from app.chat.services import ChatService
+from app.core.database import session_scope
+from app.core.routing import STICK_TO_PRIMARY_KEY
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+
+
+async def test_cache_fill_reads_primary(monkeypatch):
+    monkeypatch.setattr(cache.pubsub, "connected", True)
+    cache.chat_list_cache.clear()
+    async with session_scope() as session:
+        chats = await ChatService.get_all_chats_for_user(JOHN_ID, None, session=session)
+        assert session.info.get(STICK_TO_PRIMARY_KEY)
+    assert cache.chat_list_cache.get(JOHN_ID) == chats["chats"]
+
+    # Страница из кэша и следующие страницы читаются как обычно
+    async with session_scope() as session:
+        await ChatService.get_all_chats_for_user(JOHN_ID, None, session=session)
+        last_message_time = chats["chats"][-1]["last_message_time"]
+        await ChatService.get_all_chats_for_user(
+            JOHN_ID, last_message_time, session=session
+        )
+        assert not session.info.get(STICK_TO_PRIMARY_KEY)
+    cache.chat_list_cache.clear()
+
+
+async def test_cache_not_filled_without_request_session(monkeypatch):
+    monkeypatch.setattr(cache.pubsub, "connected", True)
+    cache.chat_list_cache.clear()
+    await ChatService.get_all_chats_for_user(JOHN_ID, None)
+    assert cache.chat_list_cache.get(JOHN_ID) is None
@@ -0,0 +1,39 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.chat.dao import MessageDAO
+from app.chat.models import Message
+from app.core.database import async_session_maker, session_scope
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+JANE_ID = uuid.UUID("2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2")
+FIRST_ID = 970_000
+COLUMNS = ("id", "message_text", "sender_id", "recipient_id", "created_at")
+
+
+def records(count: int):
+    for number in range(count):
+        yield (FIRST_ID + number, "copy", JOHN_ID, JANE_ID, datetime(2019, 6, 1))
+
+
+async def count_copied() -> int:
+    async with async_session_maker() as session:
+        return await session.scalar(
+            select(func.count()).where(Message.id.between(FIRST_ID, FIRST_ID + 99))
+        )
+
+
+async def test_copy_in_rolls_back_with_unit_of_work():
+    with pytest.raises(RuntimeError):
+        async with session_scope() as session:
+            assert await MessageDAO.copy_in(records(10), COLUMNS, session=session) == 10
+            raise RuntimeError
+    assert await count_copied() == 0
+
+
+async def test_copy_in_commits_own_session():
+    assert await MessageDAO.copy_in(records(5), COLUMNS) == 5
+    assert await count_copied() == 5
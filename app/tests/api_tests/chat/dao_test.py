@@ -0,0 +1,28 @@
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.chat.dao import ConversationReadDao
+from app.chat.services import ChatService
+from app.core.database import session_scope
+from app.core.exceptions import OneUserIdNotFoundException
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+
+
+async def test_dao_error_in_own_session_returns_none():
+    assert await ConversationReadDao.mark_read(JOHN_ID, uuid.uuid4()) is None
+
+
+async def test_dao_error_in_request_session_is_raised():
+    with pytest.raises(IntegrityError):
+        async with session_scope() as session:
+            await ConversationReadDao.mark_read(JOHN_ID, uuid.uuid4(), session=session)
+
+
+async def test_mark_read_unknown_partner():
+    partner_id = uuid.uuid4()
+    with pytest.raises(OneUserIdNotFoundException):
+        async with session_scope() as session:
+            await ChatService.mark_read(JOHN_ID, partner_id, session=session)
@@ -0,0 +1,36 @@
+import random
+from datetime import datetime
+
+from app.core.generate_dataset import (
+    DatasetConfig,
+    make_conversations,
+    make_users,
+    message_records,
+)
+from app.core.snowflake import timestamp_of
+
+
+async def test_message_ids_unique_and_match_created_at():
+    # Много сообщений на короткий интервал: в одну миллисекунду попадает
+    # больше строк, чем вмещает последовательность
+    config = DatasetConfig(
+        users=50,
+        conversations_per_user=5,
+        messages=30_000,
+        zipf_s=1.1,
+        days=0,
+        batch_size=7_000,
+        seed=1,
+        password="password",
+    )
+    rng = random.Random(config.seed)
+    user_ids = make_users(config, rng)
+    left, right = make_conversations(config, rng)
+    end = datetime(2026, 3, 1)
+    rows = [
+        row async for row in message_records(config, rng, user_ids, left, right, end)
+    ]
+    ids = [row[0] for row in rows]
+    assert len(rows) == config.messages
+    assert ids == sorted(set(ids))
+    assert all(created_at == timestamp_of(id) for id, *_, created_at in rows)
@@ -0,0 +1,82 @@
+import uuid
+
+from httpx import AsyncClient
+from sqlalchemy import delete, insert
+
+from app.auth.auth_utilits import ACCESS_TOKEN_TYPE, create_jwt
+from app.auth.models import Blocked
+from app.chat import cache
+from app.core.database import async_session_maker
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+JANE_ID = uuid.UUID("2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2")
+MODERATOR_ID = uuid.UUID("3c6e4ecb-bd84-5af0-c3c7-5e7f9b1e4df3")
+# Курсор старше любого сообщения тестовых данных: страница устоялась
+CURSOR = 1_000_000
+URL = f"api/v1/chat/messages/{JANE_ID}/?cursor_message_id={CURSOR}"
+
+
+def auth(user_id: uuid.UUID) -> dict:
+    token = create_jwt(ACCESS_TOKEN_TYPE, {"sub": str(user_id)})
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def test_not_modified_requires_access(ac: AsyncClient, monkeypatch):
+    monkeypatch.setattr(cache.pubsub, "connected", True)
+    cache.history_page_cache.clear()
+    response = await ac.get(URL, headers=auth(JOHN_ID))
+    assert response.status_code == 200
+    assert "immutable" not in response.headers["Cache-Control"]
+    assert response.json()["messages"]
+    assert all(isinstance(m["id"], str) for m in response.json()["messages"])
+    etag = response.headers["ETag"]
+    assert cache.history_page_cache.get((JOHN_ID, JANE_ID, CURSOR)) is not None
+
+    response = await ac.get(URL, headers={**auth(JOHN_ID), "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Без токена и после блокировки закэшированная страница не подтверждается
+    response = await ac.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code in (401, 403)
+    async with async_session_maker() as session:
+        await session.execute(
+            insert(Blocked).values(
+                # Тестовые данные заняли id=1 в обход последовательности
+                id=100,
+                blocked_user_id=JOHN_ID,
+                reason="test",
+                moderator_id=MODERATOR_ID,
+            )
+        )
+        await session.commit()
+    try:
+        response = await ac.get(URL, headers={**auth(JOHN_ID), "If-None-Match": etag})
+        assert response.status_code == 403
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(
+                delete(Blocked).where(Blocked.blocked_user_id == JOHN_ID)
+            )
+            await session.commit()
+        cache.history_page_cache.clear()
+
+
+def test_notification_clears_pages_and_discards_stale_fills(monkeypatch):
+    monkeypatch.setattr(cache.pubsub, "connected", True)
+    pages = cache.HistoryPageCache(1024, 60, 60)
+    pages.put("page", '"a"', b"body", pages.begin_fill())
+    assert pages.get("page").body == b"body"
+
+    # Страница, прочитанная до удаления сообщений, в кэш не попадает
+    generation = pages.begin_fill()
+    pages.handle_notification("")
+    assert pages.get("page") is None
+    pages.put("page", '"b"', b"stale", generation)
+    assert pages.get("page") is None
+
+
+def test_pages_not_cached_without_listener(monkeypatch):
+    monkeypatch.setattr(cache.pubsub, "connected", False)
+    pages = cache.HistoryPageCache(1024, 60, 60)
+    pages.put("page", '"a"', b"body", pages.begin_fill())
+    assert pages.get("page") is None
@@ -0,0 +1,23 @@
+from asyncpg.pgproto.pgproto import UUID as PgUUID
+
+from app.chat.shemas import SChats
+from app.core.responses import render_model
+
+
+def test_render_model_encodes_asyncpg_uuid():
+    partner_id = "2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2"
+    body = render_model(
+        SChats,
+        {
+            "chats": [
+                {
+                    "partner_id": PgUUID(partner_id),
+                    "partner_username": "jane_doe",
+                    "last_message_time": "2024-11-03T18:00:00",
+                    "unread_count": 0,
+                }
+            ],
+            "cursor_last_message_time": None,
+        },
+    )
+    assert f'"partner_id":"{partner_id}"'.encode() in body
@@ -0,0 +1,120 @@
+import re
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.chat import archive
+from app.chat.archive import ArchiveStore, conversation_key, purge_segments
+from app.chat.dao import MessageDAO, build_purge_batch_query
+from app.chat.models import Message
+from app.core.database import async_session_maker
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+JANE_ID = uuid.UUID("2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2")
+ALICE_ID = uuid.UUID("3c6e4ecb-bd84-5af0-c3c7-5e7f9b1e4df3")
+FIRST_ID = 950_000
+# Сообщения тестовых данных новее этой даты
+START = datetime(2019, 1, 1)
+
+
+async def add_messages(ids, sender_id, recipient_id):
+    async with async_session_maker() as session:
+        await session.execute(
+            insert(Message).values(
+                [
+                    {
+                        "id": message_id,
+                        "message_text": f"retention {message_id}",
+                        "sender_id": sender_id,
+                        "recipient_id": recipient_id,
+                        "created_at": START + timedelta(hours=message_id - FIRST_ID),
+                    }
+                    for message_id in ids
+                ]
+            )
+        )
+        await session.commit()
+
+
+async def count_messages(first, last):
+    async with async_session_maker() as session:
+        return await session.scalar(
+            select(func.count()).where(Message.id.between(first, last))
+        )
+
+
+async def test_purge_batches_are_bounded_and_resume_after_key():
+    ids = list(range(FIRST_ID, FIRST_ID + 25))
+    await add_messages(ids, JOHN_ID, JANE_ID)
+    cutoff = START + timedelta(hours=20)
+    conversation = tuple(sorted((JOHN_ID, JANE_ID)))
+
+    after, batches = None, []
+    while True:
+        count, after = await MessageDAO.purge_batch(
+            cutoff, 8, after=after, conversation=conversation
+        )
+        if not count:
+            break
+        batches.append(count)
+    assert batches == [8, 8, 4]
+    # Сообщения не старше границы остаются
+    assert await count_messages(ids[0], ids[-1]) == 5
+    await MessageDAO.purge_batch(
+        START + timedelta(days=2), 100, conversation=conversation
+    )
+
+
+async def test_purge_segments_applies_policies(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "BLOCK_MESSAGES", 4)
+    john_jane = list(range(FIRST_ID + 100, FIRST_ID + 110))
+    john_alice = list(range(FIRST_ID + 200, FIRST_ID + 210))
+    await add_messages(john_jane, JOHN_ID, JANE_ID)
+    await add_messages(john_alice, JOHN_ID, ALICE_ID)
+    index_path, index = await archive.export_segment(
+        START + timedelta(days=30), tmp_path
+    )
+    await archive.delete_exported(index_path, index)
+
+    # Переписка John и Jane: граница внутри второго блока
+    cutoffs = {
+        conversation_key(JOHN_ID, JANE_ID): START + timedelta(hours=105),
+    }
+    removed = purge_segments(tmp_path, None, cutoffs)
+    assert removed == 5
+
+    store = ArchiveStore(tmp_path, cache_bytes=1024 * 1024)
+    page = store.get_messages(JOHN_ID, JANE_ID, None, 50)
+    assert [message.id for message in page] == john_jane[::-1][:5]
+    # Переписка без политики при бессрочном глобальном сроке не меняется
+    page = store.get_messages(JOHN_ID, ALICE_ID, None, 50)
+    assert [message.id for message in page] == john_alice[::-1]
+    assert len(archive.read_indexes(tmp_path)) == 1
+
+    # Глобальный срок удаляет оставшееся, вместе с сегментом
+    assert purge_segments(tmp_path, START + timedelta(days=30), {}) == 15
+    assert archive.read_indexes(tmp_path) == []
+    assert not list(tmp_path.glob("*.seg"))
+
+
+async def test_conversation_purge_batch_uses_index():
+    # Срок истёк у всех сообщений: граница по created_at ничего не отсекает
+    query = build_purge_batch_query(
+        datetime(2100, 1, 1),
+        100,
+        conversation=tuple(sorted((JOHN_ID, JANE_ID), key=str)),
+    )
+    compiled = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    async with async_session_maker() as session:
+        # На маленькой тестовой таблице последовательный просмотр дешевле,
+        # а упорядоченный просмотр индекса created_at с фильтром не отличить
+        # от нужного плана; остаются только bitmap-просмотры индексов
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        plan = "\n".join((await session.execute(text(f"EXPLAIN {compiled}"))).scalars())
+    # Через least/greatest участников искать по индексу было нельзя
+    assert re.search(r"Index Cond: \(+(sender|recipient)_id = ", plan), plan
@@ -0,0 +1,129 @@
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.chat.models import Message
+from app.core import snowflake
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.snowflake import (
+    EPOCH_MS,
+    MessageId,
+    SnowflakeGenerator,
+    WorkerIdLease,
+    WorkerIdUnavailableError,
+    default_worker_id,
+    id_from_datetime,
+    timestamp_of,
+)
+
+JOHN_ID = uuid.UUID("1e5f2ecb-bc74-4df0-a2a7-3e9f9b9e2cf1")
+JANE_ID = uuid.UUID("2a5f3dcb-bc74-4af0-b3b7-4f8f9a0e3cf2")
+
+
+class FakeClock:
+    def __init__(self, ms: int):
+        self.ms = ms
+
+    def __call__(self) -> int:
+        return (EPOCH_MS + self.ms) * 1_000_000
+
+
+def test_ids_increase_with_clock_moving_backwards():
+    clock = FakeClock(1000)
+    generator = SnowflakeGenerator(1, clock=clock)
+    ids = [generator.next_id() for _ in range(5)]
+    clock.ms = 10
+    ids += [generator.next_id() for _ in range(5)]
+    clock.ms = 2000
+    ids.append(generator.next_id())
+    assert ids == sorted(set(ids))
+    assert timestamp_of(ids[-1]) > timestamp_of(ids[0])
+
+
+def test_sequence_overflow_takes_next_millisecond():
+    generator = SnowflakeGenerator(3, clock=FakeClock(500))
+    ids = [generator.next_id() for _ in range(snowflake.MAX_SEQUENCE + 2)]
+    assert ids == sorted(set(ids))
+    assert ids[-1] >> snowflake.TIMESTAMP_SHIFT == 501
+
+
+def test_ids_of_workers_ordered_by_time_and_unique():
+    clock = FakeClock(100)
+    generators = [SnowflakeGenerator(worker_id, clock=clock) for worker_id in (7, 2)]
+    early = [generator.next_id() for generator in generators]
+    clock.ms = 101
+    late = [generator.next_id() for generator in generators]
+    assert max(early) < min(late)
+
+    ids = []
+    lock = threading.Lock()
+
+    def issue(generator):
+        issued = [generator.next_id() for _ in range(5000)]
+        with lock:
+            ids.extend(issued)
+
+    threads = [
+        threading.Thread(target=issue, args=(generator,)) for generator in generators
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == len(ids) == 10000
+
+
+def test_id_from_datetime_round_trip():
+    moment = datetime(2026, 5, 17, 12, 30, 15, 250000)
+    assert timestamp_of(id_from_datetime(moment, low_bits=12345)) == moment
+
+
+def test_message_id_is_string_in_json():
+    adapter = TypeAdapter(MessageId)
+    value = 1 << 60
+    assert adapter.dump_python(value, mode="json") == str(value)
+    assert adapter.validate_python(str(value)) == value
+    assert adapter.validate_json(f'"{value}"') == value
+    assert adapter.validate_json(str(value)) == value
+
+
+def test_worker_id_requires_lease_in_prod(monkeypatch):
+    monkeypatch.setattr(settings, "MODE", "PROD")
+    with pytest.raises(WorkerIdUnavailableError):
+        default_worker_id()
+
+
+async def test_leases_take_distinct_worker_ids(monkeypatch):
+    monkeypatch.setattr(settings, "SNOWFLAKE_WORKER_ID", None)
+    first = WorkerIdLease(settings.TEST_DATABASE_URL)
+    second = WorkerIdLease(settings.TEST_DATABASE_URL)
+    try:
+        assert await first.acquire() != await second.acquire()
+        # Занятый номер, заданный явно, не подменяется другим
+        monkeypatch.setattr(settings, "SNOWFLAKE_WORKER_ID", first.worker_id)
+        with pytest.raises(WorkerIdUnavailableError):
+            await WorkerIdLease(settings.TEST_DATABASE_URL).acquire()
+        # После освобождения номер можно арендовать снова
+        worker_id = first.worker_id
+        first.release()
+        assert await first.acquire() == worker_id
+    finally:
+        first.release()
+        second.release()
+
+
+async def test_duplicate_id_rejected_by_primary_key():
+    message_id = snowflake.next_message_id()
+    row = {"id": message_id, "sender_id": JOHN_ID, "recipient_id": JANE_ID}
+    async with async_session_maker() as session:
+        await session.execute(insert(Message).values(message_text="first", **row))
+        await session.commit()
+    with pytest.raises(IntegrityError):
+        async with async_session_maker() as session:
+            await session.execute(insert(Message).values(message_text="again", **row))
@@ -0,0 +1,80 @@
+import uuid
+
+from app.moderation.flood import (
+    FLOOD_DUPLICATE_TEXT_RULE,
+    FLOOD_RECIPIENTS_RULE,
+    FloodDetector,
+)
+
+
+def make_detector() -> FloodDetector:
+    return FloodDetector(
+        window=60.0,
+        max_recipients=3,
+        duplicate_recipients=3,
+        throttle_seconds=300.0,
+        max_senders=100,
+    )
+
+
+def test_flood_allows_below_thresholds():
+    detector = make_detector()
+    sender = uuid.uuid4()
+    for number in range(3):
+        verdict = detector.check(sender, uuid.uuid4(), f"text {number}", now=0.0)
+        assert not verdict.throttled
+        assert verdict.flags == ()
+
+
+def test_flood_flags_too_many_recipients_and_throttles():
+    detector = make_detector()
+    sender = uuid.uuid4()
+    for number in range(3):
+        detector.check(sender, uuid.uuid4(), f"text {number}", now=float(number))
+
+    # Сообщение, на котором сработало ограничение, отправляется с пометкой
+    verdict = detector.check(sender, uuid.uuid4(), "text 3", now=3.0)
+    assert not verdict.throttled
+    assert verdict.flags == (FLOOD_RECIPIENTS_RULE,)
+
+    # Следующие отклоняются до конца ограничения
+    assert detector.check(sender, uuid.uuid4(), "text 4", now=4.0).throttled
+    assert detector.check(sender, uuid.uuid4(), "text 5", now=302.0).throttled
+    assert not detector.check(sender, uuid.uuid4(), "text 6", now=304.0).throttled
+    assert detector.stats()["throttled"] == 1
+    assert detector.stats()["rejected"] == 2
+
+
+def test_flood_flags_duplicate_text():
+    detector = make_detector()
+    sender = uuid.uuid4()
+    detector.check(sender, uuid.uuid4(), "Buy now!", now=0.0)
+    detector.check(sender, uuid.uuid4(), "buy   NOW", now=1.0)
+    verdict = detector.check(sender, uuid.uuid4(), "buy now.", now=2.0)
+    assert verdict.flags == (FLOOD_DUPLICATE_TEXT_RULE,)
+
+
+def test_flood_window_slides():
+    detector = make_detector()
+    sender = uuid.uuid4()
+    for number in range(3):
+        detector.check(sender, uuid.uuid4(), f"text {number}", now=float(number))
+    # Первые получатели вышли из окна
+    verdict = detector.check(sender, uuid.uuid4(), "text 3", now=61.5)
+    assert verdict.flags == ()
+
+
+def test_flood_same_recipient_is_not_flood():
+    detector = make_detector()
+    sender, recipient = uuid.uuid4(), uuid.uuid4()
+    for number in range(10):
+        verdict = detector.check(sender, recipient, "same text", now=float(number))
+        assert verdict.flags == ()
+
+
+def test_flood_senders_are_independent_and_bounded():
+    detector = FloodDetector(60.0, 3, 3, 300.0, max_senders=2)
+    senders = [uuid.uuid4() for _ in range(3)]
+    for sender in senders:
+        detector.check(sender, uuid.uuid4(), "text", now=0.0)
+    assert detector.stats()["senders"] == 2